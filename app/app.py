@@ -1,11 +1,25 @@
 from flask import Flask, render_template, redirect, url_for, request, jsonify, session, flash
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_sqlalchemy import SQLAlchemy
+from flask.json.provider import DefaultJSONProvider
+from flask_caching import Cache
+from flask_compress import Compress
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
+import re
+import math
 import secrets
+import functools
+import sqlite3
+import orjson
 from datetime import datetime, timedelta
-from mood_analyzer import MoodAnalyzer
+from urllib.parse import urlencode
+from mood_analyzer import MoodAnalyzer, filter_by_radius, radius_predicate
+
+# Регулярное выражение для поиска всех нецифровых символов (компилируется один раз при импорте)
+_NON_DIGITS_RE = re.compile(r'\D+')
 
 # Функция для нормализации телефонных номеров
 def normalize_phone_number(phone_number):
@@ -22,12 +36,26 @@ def normalize_phone_number(phone_number):
         return phone_number
     
     # Удаляем все нецифровые символы из номера телефона (включая скобки, тире, плюсы, пробелы и т.д.)
-    normalized = ''.join(char for char in phone_number if char.isdigit())
-    
-    return normalized
+    return _NON_DIGITS_RE.sub('', phone_number)
+
+# JSON-провайдер на основе orjson: сериализация ответов jsonify выполняется
+# в скомпилированном коде, а не в стандартном модуле json
+class OrjsonProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        # orjson всегда выдает UTF-8, поэтому русский текст не экранируется
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 # Инициализация приложения Flask
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 # Настройки приложения:
 # SECRET_KEY - секретный ключ для безопасности (нужен для работы с формами и сессиями)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(16))
@@ -35,8 +63,27 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(16))
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///moodmap.db'
 # Отключение отслеживания изменений в SQLAlchemy для экономии ресурсов
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Пул соединений с базой: по соединению на каждый поток воркера,
+# с проверкой соединения перед выдачей из пула
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 10, 'pool_pre_ping': True}
 # Поддержка русских символов в JSON-ответах
 app.config['JSON_AS_ASCII'] = False
+# Кэш ответов публичных API-эндпоинтов. SimpleCache хранится в памяти процесса и подходит
+# только для одного воркера: при нескольких воркерах сброс после записи затронул бы лишь
+# обработавший ее процесс, поэтому для них нужны CACHE_TYPE=RedisCache и CACHE_REDIS_URL
+# (и пакет redis)
+app.config['CACHE_TYPE'] = os.environ.get('CACHE_TYPE', 'SimpleCache')
+app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL')
+# Время жизни закэшированного ответа в секундах
+app.config['CACHE_DEFAULT_TIMEOUT'] = 30
+# Сжатие JSON-ответов: списки настроений и событий хорошо сжимаются gzip
+app.config['COMPRESS_ALGORITHM'] = ['gzip', 'deflate']
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/css', 'application/javascript']
+
+# Параметры хеширования паролей: число итераций задаем явно, чтобы стоимость
+# проверки пароля при входе была известной и не менялась вместе с версией Werkzeug
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256:260000'
+PASSWORD_SALT_LENGTH = 16
 
 # Инициализация дополнительных модулей
 db = SQLAlchemy(app)
@@ -45,6 +92,27 @@ login_manager = LoginManager(app)
 # Указываем, куда перенаправлять пользователя при попытке доступа к защищенным страницам
 login_manager.login_view = 'login'
 login_manager.login_message = 'Пожалуйста, войдите в систему'
+# Cache - кэширует ответы эндпоинтов, которые карта запрашивает с одинаковыми параметрами
+cache = Cache(app)
+# Compress - сжимает ответы, если клиент передал Accept-Encoding
+Compress(app)
+
+# Ключ с текущим поколением закэшированных ответов о настроениях. Поколение входит в ключи
+# этих ответов, поэтому его смена после записи делает устаревшими только их, не затрагивая
+# остальные записи кэша; старые ответы вытесняются по истечении времени жизни
+MOODS_CACHE_GENERATION_KEY = 'moods_generation'
+
+def moods_cache_key(*args, **kwargs):
+    """Ключ кэша ответа эндпоинта настроений: поколение, путь и параметры запроса."""
+    generation = cache.get(MOODS_CACHE_GENERATION_KEY) or '0'
+    query = urlencode(sorted(request.args.items(multi=True)))
+    return f"moods:{generation}:{request.path}?{query}"
+
+def invalidate_moods_cache():
+    """Сброс закэшированных ответов о настроениях во всех воркерах, использующих общий кэш."""
+    # Новое случайное значение (а не счетчик) не совпадет с поколением еще живых ответов,
+    # timeout=0 - поколение хранится без срока истечения
+    cache.set(MOODS_CACHE_GENERATION_KEY, secrets.token_hex(8), timeout=0)
 
 # Определение моделей (таблиц) базы данных
 # Модель User - хранит данные о пользователях
@@ -53,11 +121,13 @@ class User(UserMixin, db.Model):
     phone_number = db.Column(db.String(20), unique=True, nullable=False)  # Номер телефона (должен быть уникальным)
     password_hash = db.Column(db.String(128))  # Хеш пароля (не сам пароль, для безопасности)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # Дата регистрации
-    moods = db.relationship('Mood', backref='author', lazy='dynamic')  # Связь с моделью Mood (один ко многим)
+    moods = db.relationship('Mood', back_populates='author', lazy='select')  # Связь с моделью Mood (один ко многим)
     
     # Метод для установки пароля (хеширование для безопасности)
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(
+            password, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH
+        )
     
     # Метод для проверки пароля
     def check_password(self, password):
@@ -70,56 +140,156 @@ class Mood(db.Model):
     text = db.Column(db.String(280))  # Текстовое описание настроения (необязательно)
     latitude = db.Column(db.Float, nullable=False)  # Широта местоположения
     longitude = db.Column(db.Float, nullable=False)  # Долгота местоположения
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # Время создания записи
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Время создания записи
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # Связь с пользователем, создавшим запись
+    author = db.relationship('User', back_populates='moods')  # Пользователь, создавший запись
+    
+    # Составной индекс для выборок настроений пользователя с сортировкой по времени
+    # (он же покрывает поиск только по user_id)
+    __table_args__ = (db.Index('ix_mood_user_ts', 'user_id', 'timestamp'),)
+
+# Настройка SQLite при каждом новом подключении:
+# WAL позволяет читать базу параллельно с записью, а увеличенный кэш страниц
+# и memory-mapped I/O держат часто читаемые таблицы в памяти
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA cache_size=-20000')  # ~20 МБ
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')  # 256 МБ
+    cursor.close()
 
 # Функция для загрузки пользователя по ID (нужна для работы с сессиями)
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return db.session.get(User, int(user_id))
 
 # Вспомогательные функции
-# Функция для получения данных о настроениях из базы с возможностью фильтрации
-def get_mood_data_for_api(lat=None, lng=None, radius=None, hours=None, emojis=None):
-    """Получение данных о настроениях из базы с фильтрацией по разным параметрам
+# Функция для разбора параметра emojis из строки запроса
+def parse_emojis_param(emojis_param):
+    """Преобразование параметра emojis ("😊,😢") в множество эмодзи для фильтрации
+    
+    Аргументы:
+        emojis_param (str, необязательно): Эмодзи через запятую
+        
+    Возвращает:
+        frozenset эмодзи или None, если параметр не указан
+    """
+    if not emojis_param:
+        return None
+    return frozenset(emojis_param.split(','))
+
+# Шаг сетки (в градусах), до которого округляется центр ограничивающего прямоугольника:
+# близкие запросы (например, при небольшом сдвиге карты) используют один и тот же результат
+BBOX_GRID_DEG = 0.01
+# Градусов широты на километр (1° ≈ 111 км; значение с запасом в большую сторону)
+DEG_PER_KM = 1.0 / 111.0
+
+# Функция для расчета ограничивающего прямоугольника вокруг точки
+@functools.lru_cache(maxsize=4096)
+def bounding_box(lat_q, lng_q, radius):
+    """Расчет прямоугольника в градусах, гарантированно содержащего круг радиуса radius
+    
+    Центр передается уже округленным до BBOX_GRID_DEG, поэтому границы расширены
+    на половину шага сетки, чтобы прямоугольник покрывал любую точку исходной ячейки.
+    
+    Аргументы:
+        lat_q (float): Округленная широта центра
+        lng_q (float): Округленная долгота центра
+        radius (float): Радиус в км
+        
+    Возвращает:
+        Кортеж (lat_min, lat_max, lng_min, lng_max); lng_min и lng_max равны None,
+        если долготу ограничить нельзя (около полюсов или при пересечении 180-го меридиана)
+    """
+    half_cell = BBOX_GRID_DEG / 2
+    dlat = radius * DEG_PER_KM + half_cell
+    
+    # Для долготы берем край ячейки, ближайший к полюсу, где градус долготы короче всего
+    cos_lat = math.cos(math.radians(min(abs(lat_q) + half_cell, 90.0)))
+    if cos_lat <= 1e-6:
+        return lat_q - dlat, lat_q + dlat, None, None
+    
+    dlng = radius * DEG_PER_KM / cos_lat + half_cell
+    if lng_q - dlng < -180.0 or lng_q + dlng > 180.0:
+        return lat_q - dlat, lat_q + dlat, None, None
+    
+    return lat_q - dlat, lat_q + dlat, lng_q - dlng, lng_q + dlng
+
+# Функция для получения строк настроений из базы с возможностью фильтрации
+def get_mood_rows(lat=None, lng=None, radius=None, hours=None, emojis=None):
+    """Получение строк настроений из базы с фильтрацией по разным параметрам
+    
+    Возвращает генератор легковесных строк запроса (с атрибутами id, emoji, text,
+    latitude, longitude, timestamp, user_id) без преобразования в словари -
+    в таком виде их принимает MoodAnalyzer.
     
     Аргументы:
         lat (float, необязательно): Широта для фильтрации по местоположению
         lng (float, необязательно): Долгота для фильтрации по местоположению
         radius (float, необязательно): Радиус в км для фильтрации по местоположению
         hours (float, необязательно): Часы для фильтрации по времени (поддерживает дробные значения)
-        emojis (список, необязательно): Список эмодзи для фильтрации
+        emojis (множество, необязательно): Эмодзи для фильтрации
     """
-    # Получаем все настроения из базы данных
-    moods = Mood.query.all()
-    # Преобразуем данные из базы в формат для API
-    result = [{
-        'id': mood.id,
-        'emoji': mood.emoji,
-        'text': mood.text or '',
-        'latitude': mood.latitude,
-        'longitude': mood.longitude,
-        'timestamp': mood.timestamp.isoformat(),
-        'user_id': mood.user_id
-    } for mood in moods]
+    # Строим запрос к базе, чтобы фильтрация выполнялась на стороне SQL
+    query = Mood.query
     
     # Применяем фильтр по времени, если указан
     if hours is not None:
         # Поддержка дробных значений часов для минутных фильтров
-        cutoff_time = datetime.utcnow() - timedelta(hours=float(hours))
-        result = [mood for mood in result if datetime.fromisoformat(mood['timestamp']) > cutoff_time]
+        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
+        query = query.filter(Mood.timestamp > cutoff_time)
     
     # Применяем фильтр по эмодзи, если указан
-    if emojis and len(emojis) > 0:
-        result = [mood for mood in result if mood['emoji'] in emojis]
+    if emojis:
+        query = query.filter(Mood.emoji.in_(emojis))
     
-    # Применяем фильтр по местоположению, если указан
+    # Грубый предварительный фильтр по ограничивающему прямоугольнику вокруг точки:
+    # точное расстояние по формуле гаверсинусов проверяется ниже только для оставшихся записей
+    within_radius = None
     if lat is not None and lng is not None and radius is not None:
-        analyzer = MoodAnalyzer([])  # Создаем экземпляр только для использования функции расчета расстояния
-        result = [
-            mood for mood in result 
-            if analyzer._calculate_distance(lat, lng, mood['latitude'], mood['longitude']) <= radius
-        ]
+        lat_min, lat_max, lng_min, lng_max = bounding_box(
+            round(lat / BBOX_GRID_DEG) * BBOX_GRID_DEG,
+            round(lng / BBOX_GRID_DEG) * BBOX_GRID_DEG,
+            radius
+        )
+        query = query.filter(Mood.latitude.between(lat_min, lat_max))
+        if lng_min is not None:
+            query = query.filter(Mood.longitude.between(lng_min, lng_max))
+        
+        within_radius = radius_predicate(lat, lng, radius)
+    
+    # Загружаем только нужные столбцы (без создания ORM-объектов) порциями по 1000 строк
+    rows = query.with_entities(
+        Mood.id, Mood.emoji, Mood.text, Mood.latitude,
+        Mood.longitude, Mood.timestamp, Mood.user_id
+    ).yield_per(1000)
+    
+    # Отбрасываем записи за пределами радиуса
+    if within_radius is None:
+        return rows
+    return (mood for mood in rows if within_radius(mood.latitude, mood.longitude))
+
+# Функция для получения данных о настроениях в формате API
+def get_mood_data_for_api(lat=None, lng=None, radius=None, hours=None, emojis=None):
+    """Получение данных о настроениях из базы в виде списка словарей для API-ответа
+    
+    Аргументы такие же, как у get_mood_rows.
+    """
+    # Преобразуем данные из базы в формат для API за один проход
+    result = [{
+        'id': mood.id,
+        'emoji': mood.emoji,
+        'text': mood.text or '',
+        'latitude': mood.latitude,
+        'longitude': mood.longitude,
+        'timestamp': mood.timestamp.isoformat(),
+        'user_id': mood.user_id
+    } for mood in get_mood_rows(lat, lng, radius, hours, emojis)]
     
     return result
 
@@ -210,7 +380,7 @@ def api_login():
 @app.route('/api/user/<int:user_id>', methods=['GET'])
 def get_user(user_id):
     # Находим пользователя по ID или возвращаем 404, если не найден
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
     
     # Возвращаем данные пользователя
     return jsonify({
@@ -218,11 +388,47 @@ def get_user(user_id):
         'phone_number': user.phone_number
     }), 200
 
+# Получение информации о нескольких пользователях одним запросом
+@app.route('/api/users/batch', methods=['POST'])
+def get_users_batch():
+    # Получаем список ID из JSON-запроса
+    data = request.json
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list):
+        return jsonify({'error': 'Отсутствует список ids'}), 400
+    try:
+        ids = {int(user_id) for user_id in ids}
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Некорректный список ids'}), 400
+    
+    # Загружаем всех пользователей одним запросом к базе
+    users = User.query.with_entities(User.id, User.phone_number).filter(User.id.in_(ids)).all() if ids else []
+    
+    # Возвращаем словарь {id: данные пользователя}; отсутствующие ID не включаются
+    return jsonify({
+        user.id: {'id': user.id, 'phone_number': user.phone_number}
+        for user in users
+    }), 200
+
+# Проверка существования пользователя по номеру телефона
+@app.route('/api/users/exists', methods=['GET'])
+def user_exists():
+    # Нормализуем номер телефона из параметров запроса
+    phone_number = normalize_phone_number(request.args.get('phone_number', ''))
+    
+    # Проверка длины номера телефона (минимум 10 цифр)
+    if not phone_number or len(phone_number) < 10:
+        return jsonify({'error': 'Некорректный номер телефона. Номер должен содержать не менее 10 цифр.'}), 400
+    
+    # Запрашиваем только ID, без загрузки всей строки пользователя
+    exists = User.query.with_entities(User.id).filter_by(phone_number=phone_number).first() is not None
+    return jsonify({'exists': exists}), 200
+
 # Получение настроений пользователя через API
 @app.route('/api/user/<int:user_id>/moods', methods=['GET'])
 def get_user_moods_api(user_id):
     # Находим пользователя по ID или возвращаем 404, если не найден
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
     
     # Получаем параметры фильтрации из запроса
     lat = request.args.get('lat', type=float)
@@ -230,22 +436,36 @@ def get_user_moods_api(user_id):
     radius = request.args.get('radius', type=float)
     hours = request.args.get('hours', type=float)
     emojis_param = request.args.get('emojis')
+    # Необязательная постраничная выборка: при указании limit ответ имеет вид {'items': [...], 'total': N}
+    limit = request.args.get('limit', type=int)
+    offset = max(request.args.get('offset', default=0, type=int), 0)
     
     # Обработка списка эмодзи, если он предоставлен
-    emojis = None
-    if emojis_param:
-        emojis = emojis_param.split(',')
+    emojis = parse_emojis_param(emojis_param)
     
     # Получаем настроения пользователя из базы
     user_moods_query = Mood.query.filter_by(user_id=user.id)
     
     # Применяем фильтр по времени, если указан
     if hours:
-        cutoff_time = datetime.utcnow() - timedelta(hours=float(hours))
+        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
         user_moods_query = user_moods_query.filter(Mood.timestamp > cutoff_time)
     
+    # Применяем фильтр по эмодзи, если указан
+    if emojis:
+        user_moods_query = user_moods_query.filter(Mood.emoji.in_(emojis))
+    
+    has_radius_filter = lat is not None and lng is not None and radius is not None
+    
     # Сортируем по времени (сначала новые)
-    user_moods = user_moods_query.order_by(Mood.timestamp.desc()).all()
+    ordered_query = user_moods_query.order_by(Mood.timestamp.desc())
+    
+    # Без фильтра по радиусу страница выбирается в базе, и загружаются только ее строки
+    total = None
+    if limit is not None and not has_radius_filter:
+        total = user_moods_query.count()
+        ordered_query = ordered_query.offset(offset).limit(max(limit, 0))
+    user_moods = ordered_query.all()
     
     # Форматируем настроения для API-ответа
     result = [{
@@ -257,19 +477,18 @@ def get_user_moods_api(user_id):
         'timestamp': mood.timestamp.isoformat()
     } for mood in user_moods]
     
-    # Применяем фильтр по эмодзи, если указан
-    if emojis and len(emojis) > 0:
-        result = [mood for mood in result if mood['emoji'] in emojis]
-    
     # Применяем фильтр по местоположению, если указаны все необходимые параметры
-    if lat is not None and lng is not None and radius is not None:
-        analyzer = MoodAnalyzer([])  # Создаем экземпляр только для использования функции расчета расстояния
-        result = [
-            mood for mood in result 
-            if analyzer._calculate_distance(lat, lng, mood['latitude'], mood['longitude']) <= radius
-        ]
+    if has_radius_filter:
+        result = filter_by_radius(result, lat, lng, radius)
     
-    return jsonify(result)
+    if limit is None:
+        return jsonify(result)
+    
+    # Фильтр по радиусу применяется в Python, поэтому страница вырезается после него
+    if total is None:
+        total = len(result)
+        result = result[offset:offset + max(limit, 0)]
+    return jsonify({'items': result, 'total': total})
 
 @app.route('/api/moods', methods=['POST'])
 def create_mood():
@@ -279,44 +498,53 @@ def create_mood():
     if not data:
         return jsonify({'error': 'Отсутствуют данные настроения'}), 400
     
+    # Принимаем как одно настроение, так и список настроений для пакетного сохранения
+    is_batch = isinstance(data, list)
+    items = data if is_batch else [data]
+    
     # Проверяем обязательные поля
-    if not all(key in data for key in ['emoji', 'latitude', 'longitude']):
+    if not all(isinstance(item, dict) and all(key in item for key in ['emoji', 'latitude', 'longitude'])
+               for item in items):
         return jsonify({'error': 'Отсутствуют обязательные поля: emoji, latitude, longitude'}), 400
     
-    # Определяем пользователя
-    user_id = None
-    
+    # Определяем пользователя для каждой записи
     # Если пользователь аутентифицирован через flask-login
     if current_user.is_authenticated:
-        user_id = current_user.id
+        user_ids = [current_user.id] * len(items)
     # Если user_id передан в запросе (API запрос)
-    elif 'user_id' in data:
-        user_id = data['user_id']
-        # Проверяем, существует ли пользователь
-        user = User.query.get(user_id)
-        if not user:
+    elif all('user_id' in item for item in items):
+        try:
+            user_ids = [int(item['user_id']) for item in items]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Некорректный user_id'}), 400
+        # Проверяем одним запросом, что все пользователи существуют
+        requested_ids = set(user_ids)
+        found_ids = {row.id for row in db.session.query(User.id).filter(User.id.in_(requested_ids))}
+        if found_ids != requested_ids:
             return jsonify({'error': 'Пользователь не найден'}), 404
     else:
         # Если пользователь не аутентифицирован и user_id не передан,
         # возвращаем ошибку
         return jsonify({'error': 'Необходима аутентификация или указание user_id'}), 401
     
-    # Создаем запись настроения
-    mood = Mood(
-        emoji=data['emoji'],
-        text=data.get('text', ''),
-        latitude=data['latitude'],
-        longitude=data['longitude'],
+    # Создаем записи настроения (с общим временем создания для всего пакета)
+    timestamp = datetime.utcnow()
+    moods = [Mood(
+        emoji=item['emoji'],
+        text=item.get('text', ''),
+        latitude=item['latitude'],
+        longitude=item['longitude'],
         user_id=user_id,
-        timestamp=datetime.utcnow()
-    )
+        timestamp=timestamp
+    ) for item, user_id in zip(items, user_ids)]
     
-    # Сохраняем запись в базу данных
-    db.session.add(mood)
-    db.session.commit()
+    # Сохраняем все записи в базу данных; flush выдает им ID до коммита
+    db.session.add_all(moods)
+    db.session.flush()
     
-    # Возвращаем данные о созданной записи
-    return jsonify({
+    # Формируем ответ до коммита, пока атрибуты не сброшены (иначе после коммита
+    # каждая запись перечитывалась бы из базы отдельным запросом)
+    result = [{
         'id': mood.id,
         'emoji': mood.emoji,
         'text': mood.text,
@@ -324,12 +552,19 @@ def create_mood():
         'longitude': mood.longitude,
         'timestamp': mood.timestamp.isoformat(),
         'user_id': mood.user_id
-    }), 201
+    } for mood in moods]
+    
+    db.session.commit()
+    # Сбрасываем закэшированные ответы, чтобы новое настроение сразу появилось на карте
+    invalidate_moods_cache()
+    
+    # Возвращаем данные о созданных записях
+    return jsonify(result if is_batch else result[0]), 201
 
 @app.route('/api/moods/<int:mood_id>', methods=['DELETE'])
 def delete_mood(mood_id):
     # Находим запись настроения по ID или возвращаем 404, если не найдена
-    mood = Mood.query.get_or_404(mood_id)
+    mood = db.get_or_404(Mood, mood_id)
     
     # Проверка прав доступа
     if current_user.is_authenticated:
@@ -345,6 +580,8 @@ def delete_mood(mood_id):
     # Удаляем настроение
     db.session.delete(mood)
     db.session.commit()
+    # Сбрасываем закэшированные ответы, чтобы удаленное настроение исчезло с карты
+    invalidate_moods_cache()
     
     return jsonify({'success': True, 'message': 'Настроение удалено'}), 200
 
@@ -459,20 +696,22 @@ def profile():
     # чтобы их можно было преобразовать в локальное время на фронтенде
     formatted_moods = []
     for mood in user_moods:
+        timestamp = mood.timestamp.isoformat()
         formatted_moods.append({
             'id': mood.id,
             'emoji': mood.emoji,
             'text': mood.text or '',
             'latitude': mood.latitude,
             'longitude': mood.longitude,
-            'timestamp': mood.timestamp.isoformat(),
-            'formatted_time': mood.timestamp.isoformat()
+            'timestamp': timestamp,
+            'formatted_time': timestamp
         })
     
     # Отображаем страницу профиля с данными о настроениях
     return render_template('profile.html', moods=formatted_moods)
 
 @app.route('/api/moods', methods=['GET'])
+@cache.cached(make_cache_key=moods_cache_key)
 def get_moods():
     # Получаем параметры фильтрации из запроса
     lat = request.args.get('lat', type=float)
@@ -482,9 +721,7 @@ def get_moods():
     emojis_param = request.args.get('emojis')
     
     # Обработка списка эмодзи, если он предоставлен
-    emojis = None
-    if emojis_param:
-        emojis = emojis_param.split(',')
+    emojis = parse_emojis_param(emojis_param)
     
     # Получение всех настроений с учетом фильтров через вспомогательную функцию
     moods_data = get_mood_data_for_api(lat, lng, radius, hours, emojis)
@@ -493,6 +730,7 @@ def get_moods():
     return jsonify(moods_data)
 
 @app.route('/api/area-mood', methods=['GET'])
+@cache.cached(make_cache_key=moods_cache_key)
 def get_area_mood():
     # Получаем параметры запроса для анализа настроений в конкретной области
     lat = request.args.get('lat', type=float)
@@ -504,8 +742,8 @@ def get_area_mood():
     if lat is None or lng is None:
         return jsonify({'error': 'Необходимо указать параметры lat и lng'}), 400
     
-    # Фильтруем настроения по времени, если указан параметр hours
-    moods = get_mood_data_for_api(hours=hours)
+    # Фильтруем настроения по времени и заранее отбираем только записи в пределах радиуса
+    moods = get_mood_rows(lat, lng, radius, hours)
     
     # Создаем экземпляр анализатора настроений
     analyzer = MoodAnalyzer(moods)
@@ -517,6 +755,7 @@ def get_area_mood():
     return jsonify(area_mood)
 
 @app.route('/api/events', methods=['GET'])
+@cache.cached(make_cache_key=moods_cache_key)
 def get_events():
     # Получаем параметры запроса для обнаружения событий
     lat = request.args.get('lat', type=float)
@@ -526,7 +765,7 @@ def get_events():
     min_confidence = request.args.get('min_confidence', default=30, type=int)
     
     # Получаем настроения с учетом фильтров местоположения и времени
-    moods = get_mood_data_for_api(lat, lng, radius, hours)
+    moods = get_mood_rows(lat, lng, radius, hours)
     
     # Создаем экземпляр анализатора настроений
     analyzer = MoodAnalyzer(moods)
@@ -542,6 +781,7 @@ def get_events():
     return jsonify(events)
 
 @app.route('/api/trends', methods=['GET'])
+@cache.cached(make_cache_key=moods_cache_key)
 def get_trends():
     # Получаем параметры запроса для анализа трендов настроений
     hours = request.args.get('hours', default=24, type=int)
@@ -550,7 +790,7 @@ def get_trends():
     radius = request.args.get('radius', type=float)
     
     # Получаем настроения с учетом фильтров местоположения
-    moods = get_mood_data_for_api(lat, lng, radius)
+    moods = get_mood_rows(lat, lng, radius)
     
     # Создаем экземпляр анализатора настроений
     analyzer = MoodAnalyzer(moods)
@@ -559,7 +799,7 @@ def get_trends():
     trends = analyzer.get_mood_trends(hours)
     
     # Добавляем общее количество настроений в результат
-    trends['total_moods'] = len(moods)
+    trends['total_moods'] = len(analyzer.moods)
     
     # Возвращаем данные о трендах
     return jsonify(trends)
@@ -586,20 +826,22 @@ def get_user_moods():
     emojis_param = request.args.get('emojis')
     
     # Обработка списка эмодзи, если он предоставлен
-    emojis = None
-    if emojis_param:
-        emojis = emojis_param.split(',')
+    emojis = parse_emojis_param(emojis_param)
     
     # Получаем данные о пользователе или возвращаем 404, если не найден
-    user = User.query.get_or_404(user_id)
+    user = db.get_or_404(User, user_id)
     # Создаем запрос на получение настроений этого пользователя
     user_moods_query = Mood.query.filter_by(user_id=user.id)
     
     # Применяем фильтр по времени, если указан
     if hours:
-        cutoff_time = datetime.utcnow() - timedelta(hours=float(hours))
+        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
         user_moods_query = user_moods_query.filter(Mood.timestamp > cutoff_time)
     
+    # Применяем фильтр по эмодзи, если указан
+    if emojis:
+        user_moods_query = user_moods_query.filter(Mood.emoji.in_(emojis))
+    
     # Сортируем по времени (сначала новые)
     user_moods = user_moods_query.order_by(Mood.timestamp.desc()).all()
     
@@ -613,17 +855,9 @@ def get_user_moods():
         'timestamp': mood.timestamp.isoformat()
     } for mood in user_moods]
     
-    # Применяем фильтр по эмодзи, если указан
-    if emojis and len(emojis) > 0:
-        result = [mood for mood in result if mood['emoji'] in emojis]
-    
     # Применяем фильтр по местоположению, если указаны все необходимые параметры
     if lat is not None and lng is not None and radius is not None:
-        analyzer = MoodAnalyzer([])  # Создаем экземпляр только для использования функции расчета расстояния
-        result = [
-            mood for mood in result 
-            if analyzer._calculate_distance(lat, lng, mood['latitude'], mood['longitude']) <= radius
-        ]
+        result = filter_by_radius(result, lat, lng, radius)
     
     # Возвращаем отфильтрованные настроения пользователя
     return jsonify(result)
@@ -632,5 +866,10 @@ if __name__ == '__main__':
     # Создаем все таблицы в базе данных при запуске приложения
     with app.app_context():
         db.create_all()
-    # Запускаем приложение в режиме отладки, доступное со всех сетевых интерфейсов
-    app.run(debug=True, host='0.0.0.0') 
\ No newline at end of file
+        # create_all не добавляет индексы в уже существующие таблицы, создаем их отдельно
+        for index in Mood.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+    # Запускаем приложение в режиме отладки, доступное со всех сетевых интерфейсов.
+    # Для рабочего запуска используйте многопоточный WSGI-сервер с общим для воркеров кэшем, например:
+    #   CACHE_TYPE=RedisCache CACHE_REDIS_URL=redis://localhost:6379/0 gunicorn -k gthread -w 4 --threads 8 app:app
+    app.run(debug=True, host='0.0.0.0', threaded=True) 
\ No newline at end of file
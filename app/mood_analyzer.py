@@ -1,7 +1,123 @@
 import math
+import re
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta
 from collections import Counter
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, Callable, Iterable
+
+# Радиус Земли в километрах
+EARTH_RADIUS_KM = 6371.0
+
+# Начало отсчета для перевода временных меток в целые микросекунды
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+# Категории эмодзи
+POSITIVE_EMOJIS = frozenset({'😊', '😎', '🥰'})
+NEGATIVE_EMOJIS = frozenset({'😢', '😡', '😷'})
+NEUTRAL_EMOJIS = frozenset({'😐', '🤔', '😴'})
+
+# Ключевые слова для обнаружения событий
+EVENT_KEYWORDS = {
+    'concert': ['концерт', 'музыка', 'группа', 'шоу', 'выступление'],
+    'sports': ['игра', 'матч', 'спорт', 'команда', 'победа', 'проигрыш'],
+    'traffic': ['пробка', 'затор', 'авария', 'дорога', 'машина'],
+    'weather': ['дождь', 'снег', 'жара', 'холод', 'погода', 'гроза'],
+    'food': ['ресторан', 'еда', 'покушать', 'ужин', 'обед'],
+    'party': ['вечеринка', 'праздник', 'день рождения', 'юбилей']
+}
+
+
+def radius_predicate(lat: float, lng: float, radius_km: float) -> Callable[[float, float], bool]:
+    """Создание функции проверки, находится ли точка не дальше radius_km от заданной.
+    
+    Расстояние определяется по формуле гаверсинусов: точка лежит в радиусе,
+    если a = sin^2(dlat/2) + cos(lat1) * cos(lat2) * sin^2(dlon/2) не больше
+    sin^2(radius / 2R). Тригонометрия для центральной точки и порог вычисляются
+    один раз, поэтому на каждую проверку не нужны sqrt/atan2.
+    
+    Аргументы:
+        lat: Широта центральной точки
+        lng: Долгота центральной точки
+        radius_km: Радиус в километрах
+        
+    Возвращает:
+        Функцию (latitude, longitude) -> bool
+    """
+    sin = math.sin
+    cos = math.cos
+    deg_to_rad = math.pi / 180.0
+    half_deg_to_rad = deg_to_rad / 2
+    cos_lat0 = cos(lat * deg_to_rad)
+    
+    # distance <= radius эквивалентно a <= sin^2(radius / 2R)
+    a_max = sin(min(radius_km / (2 * EARTH_RADIUS_KM), math.pi / 2)) ** 2
+    # Расстояние не меньше разницы широт, поэтому точки с большей разницей
+    # отбрасываются без тригонометрии
+    max_dlat = radius_km / EARTH_RADIUS_KM / deg_to_rad
+    # Аналогичная граница по долготе: для точек в полосе широт cos(latitude) не меньше
+    # cos_edge, значит sin^2(dlon/2) не больше a_max / (cos_lat0 * cos_edge)
+    cos_edge = cos(min(abs(lat) + max_dlat, 90.0) * deg_to_rad)
+    max_dlon = 180.0
+    if cos_lat0 * cos_edge > 0:
+        ratio = math.sqrt(a_max / (cos_lat0 * cos_edge))
+        if ratio < 1.0:
+            max_dlon = 2 * math.asin(ratio) / deg_to_rad
+    
+    def within(latitude: float, longitude: float) -> bool:
+        dlat = latitude - lat
+        if dlat > max_dlat or dlat < -max_dlat:
+            return False
+        dlon = (longitude - lng + 180.0) % 360.0 - 180.0
+        if dlon > max_dlon or dlon < -max_dlon:
+            return False
+        sin_dlat = sin(dlat * half_deg_to_rad)
+        sin_dlon = sin((longitude - lng) * half_deg_to_rad)
+        a = sin_dlat * sin_dlat + cos_lat0 * cos(latitude * deg_to_rad) * sin_dlon * sin_dlon
+        return a <= a_max
+    
+    return within
+
+
+def filter_by_radius(moods: List[Dict[str, Any]], lat: float, lng: float,
+                     radius_km: float) -> List[Dict[str, Any]]:
+    """Отбор настроений, находящихся не дальше radius_km от заданной точки.
+    
+    Аргументы:
+        moods: Список словарей настроений с ключами latitude и longitude
+        lat: Широта центральной точки
+        lng: Долгота центральной точки
+        radius_km: Радиус в километрах
+        
+    Возвращает:
+        Список настроений в пределах радиуса (в исходном порядке)
+    """
+    within = radius_predicate(lat, lng, radius_km)
+    return [mood for mood in moods if within(mood['latitude'], mood['longitude'])]
+
+
+def _compile_keyword_pattern(event_keywords: Dict[str, List[str]]) -> Tuple[re.Pattern, Dict[str, List[str]]]:
+    """Построение регулярного выражения для поиска всех ключевых слов за один проход по тексту.
+    
+    Выражение находит вхождения, начинающиеся в каждой позиции текста (в том числе
+    пересекающиеся). В одной позиции находится только самое длинное ключевое слово,
+    поэтому для каждого слова заранее сохраняются другие ключевые слова, являющиеся
+    его началом.
+    
+    Аргументы:
+        event_keywords: Словарь {тип события: список ключевых слов}
+        
+    Возвращает:
+        Кортеж (скомпилированное выражение, словарь {ключевое слово: его ключевые слова-префиксы})
+    """
+    all_keywords = sorted({kw for keywords in event_keywords.values() for kw in keywords},
+                          key=len, reverse=True)
+    pattern = re.compile('(?=(' + '|'.join(re.escape(kw) for kw in all_keywords) + '))')
+    prefixes = {
+        kw: [other for other in all_keywords if other != kw and kw.startswith(other)]
+        for kw in all_keywords
+    }
+    return pattern, prefixes
 
 
 class MoodAnalyzer:
@@ -13,34 +129,53 @@ class MoodAnalyzer:
     MIN_CLUSTER_SIZE = 5     # Минимальное количество настроений для формирования кластера
     
     # Категории эмодзи
-    POSITIVE_EMOJIS = ['😊', '😎', '🥰']
-    NEGATIVE_EMOJIS = ['😢', '😡', '😷']
-    NEUTRAL_EMOJIS = ['😐', '🤔', '😴']
+    POSITIVE_EMOJIS = POSITIVE_EMOJIS
+    NEGATIVE_EMOJIS = NEGATIVE_EMOJIS
+    NEUTRAL_EMOJIS = NEUTRAL_EMOJIS
     
     # Ключевые слова для обнаружения событий
-    EVENT_KEYWORDS = {
-        'concert': ['концерт', 'музыка', 'группа', 'шоу', 'выступление'],
-        'sports': ['игра', 'матч', 'спорт', 'команда', 'победа', 'проигрыш'],
-        'traffic': ['пробка', 'затор', 'авария', 'дорога', 'машина'],
-        'weather': ['дождь', 'снег', 'жара', 'холод', 'погода', 'гроза'],
-        'food': ['ресторан', 'еда', 'покушать', 'ужин', 'обед'],
-        'party': ['вечеринка', 'праздник', 'день рождения', 'юбилей']
-    }
+    EVENT_KEYWORDS = EVENT_KEYWORDS
+    # Выражение для поиска всех ключевых слов за один проход
+    _KEYWORD_PATTERN, _KEYWORD_PREFIXES = _compile_keyword_pattern(EVENT_KEYWORDS)
     
-    def __init__(self, moods: List[Dict[str, Any]]):
+    # Анализатор создается на каждый запрос, поэтому атрибуты экземпляра фиксированы
+    __slots__ = ('moods', '_latitudes', '_longitudes', '_emojis', '_emoji_classes',
+                 '_timestamps_us', '_clusters_cache')
+    
+    def __init__(self, moods: Iterable[Any]):
         """Инициализация анализатора с данными о настроениях.
         
         Аргументы:
-            moods: Список словарей настроений с ключами:
+            moods: Последовательность записей настроений (например, строк запроса SQLAlchemy) с атрибутами:
                 - id: Уникальный идентификатор
                 - emoji: Эмодзи настроения
                 - text: Опциональное текстовое описание
                 - latitude: Географическая широта
                 - longitude: Географическая долгота
-                - timestamp: Время создания настроения
+                - timestamp: Время создания настроения (datetime)
                 - user_id: ID пользователя, создавшего настроение
         """
-        self.moods = moods
+        self.moods = list(moods)
+        self._invalidate()
+    
+    def _invalidate(self) -> None:
+        """Пересчет колонок данных и сброс кэшированных результатов после изменения списка настроений."""
+        # Поля настроений в виде параллельных списков (по позиции в self.moods),
+        # чтобы горячие циклы не обращались к атрибутам строк
+        self._latitudes = [m.latitude for m in self.moods]
+        self._longitudes = [m.longitude for m in self.moods]
+        self._emojis = [m.emoji for m in self.moods]
+        # Категория эмодзи каждого настроения: 0 - положительное, 1 - отрицательное,
+        # 2 - нейтральное, 3 - вне категорий
+        emoji_class = {}
+        for code, category in enumerate((self.POSITIVE_EMOJIS, self.NEGATIVE_EMOJIS, self.NEUTRAL_EMOJIS)):
+            emoji_class.update(dict.fromkeys(category, code))
+        self._emoji_classes = [emoji_class.get(emoji, 3) for emoji in self._emojis]
+        # Временные метки в микросекундах от начала эпохи, вычисляются один раз
+        # и используются для сортировки и сравнения без создания timedelta
+        self._timestamps_us = [(m.timestamp - _EPOCH) // _MICROSECOND for m in self.moods]
+        # Результат кластеризации, вычисляется при первом обращении
+        self._clusters_cache = None
     
     def cluster_moods(self) -> List[Dict[str, Any]]:
         """Группировка настроений по географической близости и временному окну.
@@ -55,68 +190,115 @@ class MoodAnalyzer:
                 - moods: Список настроений в кластере
                 - dominant_emoji: Самый частый эмодзи в кластере
                 - mood_percentage: Процент положительных настроений (0-100)
+            
+            Результат кэшируется и при повторных вызовах возвращается без пересчета.
         """
+        if self._clusters_cache is not None:
+            return self._clusters_cache
+        
         # Список для хранения найденных кластеров
         clusters = []
-        # Множество для отслеживания уже обработанных настроений
-        processed_ids = set()
         
         # Сортировка настроений по временной метке (сначала новые)
-        sorted_moods = sorted(
-            self.moods, 
-            key=lambda m: datetime.fromisoformat(m['timestamp']), 
-            reverse=True
-        )
+        timestamps = self._timestamps_us
+        order = sorted(range(len(self.moods)), key=timestamps.__getitem__, reverse=True)
+        sorted_moods = [self.moods[i] for i in order]
+        sorted_ts = [timestamps[i] for i in order]
+        # Временное окно в микросекундах
+        window_us = self.TIME_WINDOW_HOURS * 3600 * 1000000
+        
+        # Координаты в радианах и косинусы широт вычисляются один раз на настроение,
+        # а не для каждой пары при расчете расстояния
+        sin = math.sin
+        sorted_lats = [self._latitudes[i] for i in order]
+        sorted_lngs = [self._longitudes[i] for i in order]
+        lat_rad = [math.radians(x) for x in sorted_lats]
+        lng_rad = [math.radians(x) for x in sorted_lngs]
+        cos_lat = [math.cos(x) for x in lat_rad]
+        # distance <= CLUSTER_RADIUS_KM эквивалентно a <= sin^2(radius / 2R)
+        a_max = sin(min(self.CLUSTER_RADIUS_KM / (2 * EARTH_RADIUS_KM), math.pi / 2)) ** 2
+        # Расстояние не меньше разницы широт - дешевая проверка перед тригонометрией
+        max_dlat = self.CLUSTER_RADIUS_KM / EARTH_RADIUS_KM
+        # Флаги уже обработанных настроений (по позиции в sorted_moods)
+        processed = [False] * len(sorted_moods)
+        
+        # Пространственная сетка: кандидатов в кластер ищем только в соседних ячейках,
+        # а не среди всех настроений
+        grid, cells, n_cols = self._build_grid(sorted_lats, sorted_lngs)
         
         # Перебираем все настроения для формирования кластеров
-        for mood in sorted_moods:
+        for index, mood in enumerate(sorted_moods):
             # Пропускаем уже обработанные настроения
-            if mood['id'] in processed_ids:
+            if processed[index]:
                 continue
                 
             # Начинаем новый кластер с этого настроения
             cluster_moods = [mood]
-            processed_ids.add(mood['id'])
+            # Позиции настроений кластера в self.moods
+            cluster_indices = [order[index]]
+            processed[index] = True
             
             # Запоминаем время и местоположение первого настроения в кластере
-            mood_time = datetime.fromisoformat(mood['timestamp'])
-            mood_location = (mood['latitude'], mood['longitude'])
+            mood_time = sorted_ts[index]
+            mood_lat, mood_lng, mood_cos = lat_rad[index], lng_rad[index], cos_lat[index]
+            
+            # Собираем кандидатов из ячейки настроения и восьми соседних
+            row, col = cells[index]
+            if n_cols:
+                neighbor_cols = {(col + d) % n_cols for d in (-1, 0, 1)}
+            else:
+                neighbor_cols = (0,)
+            candidates = []
+            for r in (row - 1, row, row + 1):
+                for c in neighbor_cols:
+                    cell_indices = grid.get((r, c))
+                    if not cell_indices:
+                        continue
+                    # Отбрасываем уже обработанные настроения и сохраняем ячейку без них,
+                    # чтобы следующие кластеры не просматривали их повторно
+                    alive = [i for i in cell_indices if not processed[i]]
+                    grid[(r, c)] = alive
+                    candidates.extend(alive)
+            # Сохраняем порядок обхода по времени, как при полном переборе
+            candidates.sort()
             
             # Находим другие настроения, принадлежащие этому кластеру
-            for other_mood in sorted_moods:
-                # Пропускаем уже обработанные настроения
-                if other_mood['id'] in processed_ids:
+            # (все кандидаты еще не обработаны и встречаются по одному разу)
+            for other_index in candidates:
+                # Все настроения раньше текущего по списку уже обработаны, поэтому кандидаты
+                # идут после него и не новее его: как только разница во времени вышла
+                # за окно, дальше она только растет
+                time_diff = mood_time - sorted_ts[other_index]  # разница в микросекундах
+                if time_diff > window_us:
+                    break
+                
+                dlat = lat_rad[other_index] - mood_lat
+                if dlat > max_dlat or dlat < -max_dlat:
                     continue
-                    
-                # Получаем время и местоположение проверяемого настроения
-                other_time = datetime.fromisoformat(other_mood['timestamp'])
-                other_location = (other_mood['latitude'], other_mood['longitude'])
                 
-                # Проверяем, находится ли настроение в пределах временного окна и радиуса расстояния
-                time_diff = abs((mood_time - other_time).total_seconds() / 3600)  # разница в часах
-                distance = self._calculate_distance(
-                    mood_location[0], mood_location[1],
-                    other_location[0], other_location[1]
-                )
+                # Формула гаверсинусов без sqrt/atan2: сравниваем промежуточное значение с порогом
+                sin_dlat = sin(dlat * 0.5)
+                sin_dlon = sin((lng_rad[other_index] - mood_lng) * 0.5)
+                a = sin_dlat * sin_dlat + mood_cos * cos_lat[other_index] * sin_dlon * sin_dlon
                 
-                # Если настроение подходит по времени и расстоянию, добавляем его в кластер
-                if time_diff <= self.TIME_WINDOW_HOURS and distance <= self.CLUSTER_RADIUS_KM:
-                    cluster_moods.append(other_mood)
-                    processed_ids.add(other_mood['id'])
+                # Если настроение подходит по расстоянию, добавляем его в кластер
+                if a <= a_max:
+                    cluster_moods.append(sorted_moods[other_index])
+                    cluster_indices.append(order[other_index])
+                    processed[other_index] = True
             
             # Рассматриваем только кластеры с достаточным количеством настроений
             if len(cluster_moods) >= self.MIN_CLUSTER_SIZE:
                 # Вычисляем центр кластера (среднее местоположение всех настроений)
-                lat_sum = sum(m['latitude'] for m in cluster_moods)
-                lng_sum = sum(m['longitude'] for m in cluster_moods)
+                lat_sum = sum(m.latitude for m in cluster_moods)
+                lng_sum = sum(m.longitude for m in cluster_moods)
                 center = (lat_sum / len(cluster_moods), lng_sum / len(cluster_moods))
                 
                 # Находим самый популярный эмодзи в кластере
-                emoji_counter = Counter(m['emoji'] for m in cluster_moods)
-                dominant_emoji = emoji_counter.most_common(1)[0][0]
+                dominant_emoji = self._dominant_emoji([self._emojis[i] for i in cluster_indices])
                 
                 # Вычисляем процент положительного настроения в кластере
-                mood_percentage = self._calculate_mood_percentage(cluster_moods)
+                mood_percentage = self._percentage_for_indices(cluster_indices)
                 
                 # Добавляем кластер в результат
                 clusters.append({
@@ -126,6 +308,7 @@ class MoodAnalyzer:
                     'mood_percentage': mood_percentage
                 })
         
+        self._clusters_cache = clusters
         return clusters
     
     def detect_events(self) -> List[Dict[str, Any]]:
@@ -147,31 +330,44 @@ class MoodAnalyzer:
         """
         # Получаем кластеры настроений
         clusters = self.cluster_moods()
-        # Список для хранения обнаруженных событий
+        # Анализируем каждый кластер и оставляем только события с достаточной уверенностью
         events = []
-        
-        # Анализируем каждый кластер
         for cluster in clusters:
-            # Собираем весь текст из настроений в кластере в одну строку
-            all_text = ' '.join(m['text'].lower() for m in cluster['moods'] if m.get('text'))
-            
-            # Определяем тип события на основе ключевых слов в тексте
-            event_type, keywords, confidence = self._detect_event_type(all_text)
-            
-            # Включаем только события с достаточной уверенностью
-            if confidence >= 30:
-                events.append({
-                    'location': cluster['center'],
-                    'type': event_type,
-                    'confidence': confidence,
-                    'dominant_emoji': cluster['dominant_emoji'],
-                    'mood_percentage': cluster['mood_percentage'],
-                    'moods_count': len(cluster['moods']),
-                    'keywords': keywords
-                })
+            event = self._score_cluster(cluster)
+            if event is not None:
+                events.append(event)
         
         return events
     
+    def _score_cluster(self, cluster: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Определение события для одного кластера настроений.
+        
+        Аргументы:
+            cluster: Кластер из cluster_moods
+            
+        Возвращает:
+            Словарь события (см. detect_events) или None, если уверенность ниже 30
+        """
+        # Собираем весь текст из настроений в кластере в одну строку
+        # и приводим к нижнему регистру один раз
+        all_text = ' '.join([m.text for m in cluster['moods'] if m.text]).lower()
+        
+        # Определяем тип события на основе ключевых слов в тексте
+        event_type, keywords, confidence = self._detect_event_type(all_text)
+        
+        # Включаем только события с достаточной уверенностью
+        if confidence < 30:
+            return None
+        return {
+            'location': cluster['center'],
+            'type': event_type,
+            'confidence': confidence,
+            'dominant_emoji': cluster['dominant_emoji'],
+            'mood_percentage': cluster['mood_percentage'],
+            'moods_count': len(cluster['moods']),
+            'keywords': keywords
+        }
+    
     def get_area_mood(self, lat: float, lng: float, radius_km: float = 5.0) -> Dict[str, Any]:
         """Получение общего настроения для конкретной географической области.
         
@@ -190,18 +386,15 @@ class MoodAnalyzer:
                 - moods_count: Количество настроений в области
         """
         # Находим настроения в пределах указанного радиуса
-        area_moods = []
-        for mood in self.moods:
-            # Вычисляем расстояние между точкой и настроением
-            distance = self._calculate_distance(
-                lat, lng, mood['latitude'], mood['longitude']
-            )
-            # Добавляем настроение, если оно в пределах радиуса
-            if distance <= radius_km:
-                area_moods.append(mood)
+        # (тригонометрия для центра области вычисляется один раз)
+        within = radius_predicate(lat, lng, radius_km)
+        area_indices = [
+            i for i, (mood_lat, mood_lng) in enumerate(zip(self._latitudes, self._longitudes))
+            if within(mood_lat, mood_lng)
+        ]
         
         # Если в этой области нет настроений, возвращаем нейтральное
-        if not area_moods:
+        if not area_indices:
             return {
                 'dominant_emoji': '😐',
                 'mood_percentage': 50,
@@ -209,17 +402,16 @@ class MoodAnalyzer:
             }
         
         # Находим преобладающий эмодзи
-        emoji_counter = Counter(m['emoji'] for m in area_moods)
-        dominant_emoji = emoji_counter.most_common(1)[0][0] if emoji_counter else '😐'
+        dominant_emoji = self._dominant_emoji([self._emojis[i] for i in area_indices])
         
         # Вычисляем процент положительных настроений
-        mood_percentage = self._calculate_mood_percentage(area_moods)
+        mood_percentage = self._percentage_for_indices(area_indices)
         
         # Возвращаем информацию о настроении области
         return {
             'dominant_emoji': dominant_emoji,
             'mood_percentage': mood_percentage,
-            'moods_count': len(area_moods)
+            'moods_count': len(area_indices)
         }
     
     def get_mood_trends(self, hours: int = 24) -> Dict[str, Any]:
@@ -245,34 +437,48 @@ class MoodAnalyzer:
         time_periods = []
         mood_percentages = []
         
+        # Один проход по настроениям: сортируем по времени и строим префиксные суммы
+        # по категориям эмодзи, чтобы считать каждый интервал двумя бинарными поисками
+        order = sorted(range(len(self.moods)), key=self._timestamps_us.__getitem__)
+        sorted_ts = [self._timestamps_us[i] for i in order]
+        positive_prefix = [0]
+        negative_prefix = [0]
+        neutral_prefix = [0]
+        classes = self._emoji_classes
+        for i in order:
+            code = classes[i]
+            positive_prefix.append(positive_prefix[-1] + (code == 0))
+            negative_prefix.append(negative_prefix[-1] + (code == 1))
+            neutral_prefix.append(neutral_prefix[-1] + (code == 2))
+        
+        # Границы интервалов (от текущего момента в прошлое): 7 точек на 6 интервалов,
+        # соседние интервалы делят общую границу
+        edges = [now - timedelta(hours=k * period_hours) for k in range(7)]
+        edges_us = [(edge - _EPOCH) // _MICROSECOND for edge in edges]
+        labels = [edge.strftime('%H:%M') for edge in edges]
+        
         # Для каждого временного интервала собираем данные
         for i in range(6):
-            # Определяем границы временного интервала
-            period_end = now - timedelta(hours=i * period_hours)
-            period_start = now - timedelta(hours=(i + 1) * period_hours)
-            
-            # Фильтруем настроения, попадающие в этот интервал
-            period_moods = []
-            for mood in self.moods:
-                mood_time = datetime.fromisoformat(mood['timestamp'])
-                if period_start <= mood_time <= period_end:
-                    period_moods.append(mood)
+            # Находим настроения, попадающие в этот интервал (границы включительно)
+            lo = bisect_left(sorted_ts, edges_us[i + 1])
+            hi = bisect_right(sorted_ts, edges_us[i])
             
             # Если в интервале есть настроения, вычисляем процент положительных
-            if period_moods:
-                mood_percentage = self._calculate_mood_percentage(period_moods)
+            if hi > lo:
+                mood_percentage = self._percentage_from_counts(
+                    positive_prefix[hi] - positive_prefix[lo],
+                    negative_prefix[hi] - negative_prefix[lo],
+                    neutral_prefix[hi] - neutral_prefix[lo]
+                )
             else:
                 mood_percentage = 0
             
             # Форматируем временной интервал для отображения
-            time_periods.append(f"{period_start.strftime('%H:%M')} - {period_end.strftime('%H:%M')}")
+            time_periods.append(f"{labels[i + 1]} - {labels[i]}")
             mood_percentages.append(mood_percentage)
         
         # Подсчитываем количество каждого эмодзи
-        emoji_counts = {}
-        for mood in self.moods:
-            emoji = mood['emoji']
-            emoji_counts[emoji] = emoji_counts.get(emoji, 0) + 1
+        emoji_counts = dict(Counter(self._emojis))
         
         # Определяем направление тренда (растет, падает или стабилен)
         trend_direction = 'stable'  # по умолчанию стабильный
@@ -292,61 +498,102 @@ class MoodAnalyzer:
             'trend_direction': trend_direction
         }
     
-    def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Расчет расстояния между двумя географическими точками в километрах.
+    def _build_grid(self, latitudes: List[float],
+                    longitudes: List[float]) -> Tuple[Dict[Tuple[int, int], List[int]], List[Tuple[int, int]], int]:
+        """Разбиение настроений на ячейки сетки для поиска соседей.
         
-        Использует формулу гаверсинусов для вычисления расстояния 
-        между двумя точками на поверхности Земли.
+        Размер ячейки выбран так, что любые две точки на расстоянии не больше
+        CLUSTER_RADIUS_KM лежат в одной или в соседних ячейках. Ширина ячейки
+        по долготе рассчитана по самой удаленной от экватора точке, а столбцы
+        замкнуты по кругу, чтобы учесть переход через 180-й меридиан.
         
         Аргументы:
-            lat1: Широта первой точки
-            lon1: Долгота первой точки
-            lat2: Широта второй точки
-            lon2: Долгота второй точки
+            latitudes: Широты настроений
+            longitudes: Долготы настроений (в том же порядке)
             
         Возвращает:
-            Расстояние в километрах
+            Кортеж из трех элементов:
+                - Словарь {(строка, столбец): [индексы настроений]}
+                - Список ячеек (строка, столбец) для каждого настроения
+                - Количество столбцов (0, если разбиения по долготе нет)
         """
-        # Радиус Земли в километрах
-        R = 6371.0
-        
-        # Перевод координат из градусов в радианы
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
-        
-        # Разницы в координатах
-        dlon = lon2_rad - lon1_rad
-        dlat = lat2_rad - lat1_rad
+        if not latitudes:
+            return {}, [], 0
+        
+        # Высота ячейки по широте равна радиусу кластера в градусах
+        lat_step = math.degrees(self.CLUSTER_RADIUS_KM / EARTH_RADIUS_KM)
+        
+        # Из формулы гаверсинусов: sin(dlon/2) <= sin(r/2R) / cos(max|lat|)
+        max_abs_lat = max(abs(x) for x in latitudes)
+        cos_min = math.cos(math.radians(min(max_abs_lat, 90.0)))
+        ratio = math.sin(self.CLUSTER_RADIUS_KM / (2 * EARTH_RADIUS_KM)) / cos_min if cos_min > 0 else 2.0
+        n_cols = 0
+        if ratio < 1.0:
+            lng_step = math.degrees(2 * math.asin(ratio))
+            # Целое число одинаковых столбцов (каждый не уже lng_step)
+            n_cols = int(360.0 // lng_step)
+            if n_cols < 3:
+                n_cols = 0
+        
+        grid = {}
+        cells = []
+        for index, (latitude, longitude) in enumerate(zip(latitudes, longitudes)):
+            row = math.floor(latitude / lat_step)
+            if n_cols:
+                col = min(int((longitude + 180.0) % 360.0 / 360.0 * n_cols), n_cols - 1)
+            else:
+                col = 0
+            cell = (row, col)
+            cells.append(cell)
+            grid.setdefault(cell, []).append(index)
+        return grid, cells, n_cols
+    
+    @staticmethod
+    def _dominant_emoji(emojis: List[str]) -> str:
+        """Определение самого частого эмодзи в списке.
         
-        # Формула гаверсинусов
-        a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        distance = R * c
+        При равенстве количества выбирается эмодзи, встретившийся раньше
+        (как у Counter.most_common).
         
-        return distance
+        Аргументы:
+            emojis: Непустой список эмодзи
+            
+        Возвращает:
+            Самый частый эмодзи
+        """
+        counts = Counter(emojis)
+        return max(counts, key=counts.__getitem__)
     
-    def _calculate_mood_percentage(self, moods: List[Dict[str, Any]]) -> int:
-        """Вычисление процента положительных настроений в списке.
+    def _percentage_for_indices(self, indices: List[int]) -> int:
+        """Вычисление процента положительных настроений по позициям в self.moods.
         
-        Анализирует эмодзи в списке настроений и определяет,
-        какой процент из них считается "положительным".
+        Использует заранее вычисленные категории эмодзи, поэтому все три
+        категории подсчитываются за один проход без проверок по множествам.
         
         Аргументы:
-            moods: Список настроений для анализа
+            indices: Позиции настроений в self.moods
             
         Возвращает:
             Процент положительных настроений от 0 до 100
         """
-        if not moods:
-            return 50  # Нейтральное значение, если нет данных
-        
-        # Подсчет положительных, отрицательных и нейтральных эмодзи
-        positive_count = sum(1 for m in moods if m['emoji'] in self.POSITIVE_EMOJIS)
-        negative_count = sum(1 for m in moods if m['emoji'] in self.NEGATIVE_EMOJIS)
-        neutral_count = sum(1 for m in moods if m['emoji'] in self.NEUTRAL_EMOJIS)
+        counts = [0, 0, 0, 0]
+        classes = self._emoji_classes
+        for i in indices:
+            counts[classes[i]] += 1
+        return self._percentage_from_counts(counts[0], counts[1], counts[2])
+    
+    @staticmethod
+    def _percentage_from_counts(positive_count: int, negative_count: int, neutral_count: int) -> int:
+        """Вычисление процента положительных настроений по количеству эмодзи каждой категории.
         
+        Аргументы:
+            positive_count: Количество положительных эмодзи
+            negative_count: Количество отрицательных эмодзи
+            neutral_count: Количество нейтральных эмодзи
+            
+        Возвращает:
+            Процент положительных настроений от 0 до 100
+        """
         # Общее количество настроений
         total = positive_count + negative_count + neutral_count
         
@@ -377,17 +624,19 @@ class MoodAnalyzer:
         if not text:
             return 'unknown', [], 0
         
+        # Находим все ключевые слова, встречающиеся в тексте, за один проход
+        matched = set()
+        for keyword in self._KEYWORD_PATTERN.findall(text):
+            if keyword not in matched:
+                matched.add(keyword)
+                matched.update(self._KEYWORD_PREFIXES[keyword])
+        
         # Для каждого типа события подсчитываем количество найденных ключевых слов
         event_scores = {}
         found_keywords = {}
         
         for event_type, keywords in self.EVENT_KEYWORDS.items():
-            found_keywords[event_type] = []
-            
-            # Проверяем каждое ключевое слово
-            for keyword in keywords:
-                if keyword in text:
-                    found_keywords[event_type].append(keyword)
+            found_keywords[event_type] = [keyword for keyword in keywords if keyword in matched]
             
             # Вычисляем "балл" для этого типа события
             event_scores[event_type] = len(found_keywords[event_type])
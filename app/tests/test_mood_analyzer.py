@@ -0,0 +1,221 @@
+"""Сравнение кластеризации и трендов MoodAnalyzer с исходным полным перебором.
+
+Эталонные функции повторяют первоначальную реализацию (попарное сравнение всех
+настроений и отдельный проход по настроениям для каждого интервала трендов).
+"""
+import math
+import random
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+
+import mood_analyzer
+from mood_analyzer import MoodAnalyzer
+
+Mood = namedtuple('Mood', 'id emoji text latitude longitude timestamp user_id')
+
+EMOJIS = ['😊', '😎', '🥰', '😢', '😡', '😷', '😐', '🤔', '😴', '🙃']
+NOW = datetime(2024, 5, 17, 12, 30, 15, 123456)
+
+
+def _distance(lat1, lon1, lat2, lon2):
+    """Расстояние по формуле гаверсинусов, как в исходной реализации."""
+    lat1_rad, lon1_rad = math.radians(lat1), math.radians(lon1)
+    lat2_rad, lon2_rad = math.radians(lat2), math.radians(lon2)
+    dlon = lon2_rad - lon1_rad
+    dlat = lat2_rad - lat1_rad
+    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return 6371.0 * c
+
+
+def _percentage(moods):
+    if not moods:
+        return 50
+    positive = sum(1 for m in moods if m.emoji in MoodAnalyzer.POSITIVE_EMOJIS)
+    negative = sum(1 for m in moods if m.emoji in MoodAnalyzer.NEGATIVE_EMOJIS)
+    neutral = sum(1 for m in moods if m.emoji in MoodAnalyzer.NEUTRAL_EMOJIS)
+    total = positive + negative + neutral
+    if total == 0:
+        return 50
+    return int((positive + neutral / 2) / total * 100)
+
+
+def reference_clusters(moods):
+    """Кластеризация полным перебором пар настроений."""
+    clusters = []
+    processed_ids = set()
+    sorted_moods = sorted(moods, key=lambda m: m.timestamp, reverse=True)
+    for mood in sorted_moods:
+        if mood.id in processed_ids:
+            continue
+        cluster_moods = [mood]
+        processed_ids.add(mood.id)
+        for other in sorted_moods:
+            if other.id in processed_ids:
+                continue
+            time_diff = abs((mood.timestamp - other.timestamp).total_seconds() / 3600)
+            distance = _distance(mood.latitude, mood.longitude, other.latitude, other.longitude)
+            if time_diff <= MoodAnalyzer.TIME_WINDOW_HOURS and distance <= MoodAnalyzer.CLUSTER_RADIUS_KM:
+                cluster_moods.append(other)
+                processed_ids.add(other.id)
+        if len(cluster_moods) >= MoodAnalyzer.MIN_CLUSTER_SIZE:
+            center = (sum(m.latitude for m in cluster_moods) / len(cluster_moods),
+                      sum(m.longitude for m in cluster_moods) / len(cluster_moods))
+            clusters.append({
+                'center': center,
+                'moods': cluster_moods,
+                'dominant_emoji': Counter(m.emoji for m in cluster_moods).most_common(1)[0][0],
+                'mood_percentage': _percentage(cluster_moods)
+            })
+    return clusters
+
+
+def reference_trends(moods, now, hours):
+    """Тренды с отдельным проходом по настроениям для каждого интервала."""
+    period_hours = hours / 6
+    time_periods = []
+    mood_percentages = []
+    for i in range(6):
+        period_end = now - timedelta(hours=i * period_hours)
+        period_start = now - timedelta(hours=(i + 1) * period_hours)
+        period_moods = [m for m in moods if period_start <= m.timestamp <= period_end]
+        mood_percentages.append(_percentage(period_moods) if period_moods else 0)
+        time_periods.append(f"{period_start.strftime('%H:%M')} - {period_end.strftime('%H:%M')}")
+    trend_direction = 'stable'
+    if mood_percentages[0] > mood_percentages[1]:
+        trend_direction = 'up'
+    elif mood_percentages[0] < mood_percentages[1]:
+        trend_direction = 'down'
+    return {
+        'time_periods': time_periods,
+        'mood_percentages': mood_percentages,
+        'emoji_counts': dict(Counter(m.emoji for m in moods)),
+        'trend_direction': trend_direction
+    }
+
+
+def _summary(clusters):
+    """Сравниваемое представление кластеров: состав, эмодзи и процент, центр."""
+    return [
+        ([m.id for m in c['moods']], c['dominant_emoji'], c['mood_percentage'], c['center'])
+        for c in clusters
+    ]
+
+
+def assert_same_clusters(moods):
+    actual = _summary(MoodAnalyzer(moods).cluster_moods())
+    expected = _summary(reference_clusters(moods))
+    assert [c[:3] for c in actual] == [c[:3] for c in expected]
+    for (*_, actual_center), (*_, expected_center) in zip(actual, expected):
+        assert actual_center == pytest.approx(expected_center)
+
+
+def _random_moods(rng, count, lat, lng, spread_deg, hours):
+    return [
+        Mood(
+            id=i,
+            emoji=rng.choice(EMOJIS),
+            text='',
+            latitude=max(-90.0, min(90.0, lat + rng.uniform(-spread_deg, spread_deg))),
+            # Долготы приводятся к диапазону [-180, 180)
+            longitude=(lng + rng.uniform(-spread_deg, spread_deg) + 180.0) % 360.0 - 180.0,
+            timestamp=NOW - timedelta(seconds=rng.uniform(0, hours * 3600)),
+            user_id=1
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    """Фиксирует datetime.utcnow() в модуле анализатора."""
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return NOW
+    monkeypatch.setattr(mood_analyzer, 'datetime', FrozenDatetime)
+    return NOW
+
+
+def test_cluster_empty():
+    assert MoodAnalyzer([]).cluster_moods() == []
+
+
+@pytest.mark.parametrize('seed,lat,lng,spread', [
+    (1, 55.75, 37.62, 0.02),
+    (2, 55.75, 37.62, 0.05),
+    (3, -33.87, 151.21, 0.01),
+    (4, 0.0, 0.0, 0.015),
+])
+def test_cluster_matches_bruteforce(seed, lat, lng, spread):
+    rng = random.Random(seed)
+    assert_same_clusters(_random_moods(rng, 300, lat, lng, spread, hours=12))
+
+
+@pytest.mark.parametrize('seed,lat,lng,spread', [
+    # У 180-го меридиана: точки по обе стороны от него лежат рядом
+    (5, 10.0, 179.995, 0.01),
+    (6, -45.0, -179.995, 0.01),
+    # У полюсов ячейки по долготе становятся очень широкими или пропадают
+    (7, 89.995, 0.0, 0.01),
+    (8, -89.99, 120.0, 0.02),
+    (9, 89.9999, 0.0, 180.0),
+])
+def test_cluster_matches_bruteforce_near_meridian_and_poles(seed, lat, lng, spread):
+    rng = random.Random(seed)
+    assert_same_clusters(_random_moods(rng, 200, lat, lng, spread, hours=8))
+
+
+def test_cluster_pole_and_meridian_points():
+    # Точно на полюсе и на 180-м меридиане с разных сторон
+    points = [(90.0, 0.0), (90.0, 90.0), (90.0, -180.0), (89.9999, 45.0), (89.9995, -135.0),
+              (0.0, 180.0), (0.0, -180.0), (0.0, 179.999), (0.0, -179.999), (0.001, 179.9995)]
+    moods = [
+        Mood(i, EMOJIS[i % len(EMOJIS)], '', lat, lng, NOW - timedelta(minutes=i), 1)
+        for i, (lat, lng) in enumerate(points)
+    ]
+    clusters = MoodAnalyzer(moods).cluster_moods()
+    assert [sorted(m.id for m in c['moods']) for c in clusters] == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]]
+    assert_same_clusters(moods)
+
+
+def test_cluster_time_window_boundary():
+    window = timedelta(hours=MoodAnalyzer.TIME_WINDOW_HOURS)
+    first = NOW
+    # Настроения ровно на границе окна входят в кластер, на микросекунду дальше - нет
+    moods = [Mood(0, '😊', '', 55.0, 37.0, first, 1)]
+    moods += [Mood(i, '😊', '', 55.0, 37.0, first - window, 1) for i in range(1, 5)]
+    moods += [Mood(i, '😢', '', 55.0, 37.0, first - window - timedelta(microseconds=1), 1)
+              for i in range(5, 10)]
+    # Одинаковые временные метки сохраняют исходный порядок
+    moods += [Mood(i, '😐', '', 55.0, 37.0, first - timedelta(hours=1), 1) for i in range(10, 13)]
+    clusters = MoodAnalyzer(moods).cluster_moods()
+    assert sorted(m.id for m in clusters[0]['moods']) == [0, 1, 2, 3, 4, 10, 11, 12]
+    assert_same_clusters(moods)
+
+
+def test_trends_empty(frozen_now):
+    assert MoodAnalyzer([]).get_mood_trends(24) == reference_trends([], frozen_now, 24)
+
+
+@pytest.mark.parametrize('hours', [24, 6, 7, 1])
+def test_trends_match_bruteforce(frozen_now, hours):
+    rng = random.Random(hours)
+    moods = _random_moods(rng, 500, 55.75, 37.62, 0.1, hours=hours * 1.2)
+    # Будущие метки и метки точно на границах интервалов (входят в оба соседних интервала)
+    period = timedelta(hours=hours / 6)
+    for k in range(7):
+        edge = frozen_now - k * period
+        moods.append(Mood(1000 + k, rng.choice(EMOJIS), '', 55.0, 37.0, edge, 1))
+        moods.append(Mood(2000 + k, rng.choice(EMOJIS), '', 55.0, 37.0, edge + timedelta(microseconds=1), 1))
+        moods.append(Mood(3000 + k, rng.choice(EMOJIS), '', 55.0, 37.0, edge - timedelta(microseconds=1), 1))
+    assert MoodAnalyzer(moods).get_mood_trends(hours) == reference_trends(moods, frozen_now, hours)
+
+
+def test_trends_boundary_mood_counts_in_both_periods(frozen_now):
+    edge = frozen_now - timedelta(hours=4)
+    trends = MoodAnalyzer([Mood(1, '😊', '', 0.0, 0.0, edge, 1)]).get_mood_trends(24)
+    assert trends['mood_percentages'] == [100, 100, 0, 0, 0, 0]
+    assert trends == reference_trends([Mood(1, '😊', '', 0.0, 0.0, edge, 1)], frozen_now, 24)
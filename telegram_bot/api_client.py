@@ -1,5 +1,17 @@
+import re
+import threading
+import time
+import orjson
 import requests
-from typing import Dict, List, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, List, Any, Optional, Callable, Union
+
+# Регулярное выражение для удаления нецифровых символов из номера телефона
+_NON_DIGITS_RE = re.compile(r'\D+')
+# Все ASCII-символы, кроме цифр: удаляются из ASCII-номера через bytes.translate
+_ASCII_NON_DIGITS = bytes(code for code in range(128) if not 0x30 <= code <= 0x39)
 
 def normalize_phone_number(phone_number):
     """
@@ -14,10 +26,40 @@ def normalize_phone_number(phone_number):
     if not phone_number:
         return phone_number
     
-    # Удаляем все нецифровые символы из номера телефона (включая скобки, тире, плюсы, пробелы и т.д.)
-    normalized = ''.join(char for char in phone_number if char.isdigit())
+    # Удаляем все нецифровые символы из номера телефона (включая скобки, тире, плюсы, пробелы и т.д.).
+    # Обычно номер состоит из ASCII-символов, и тогда translate без регулярного выражения
+    # работает в несколько раз быстрее; остальные строки (например, с цифрами других
+    # алфавитов, которые \D считает цифрами) обрабатываются регулярным выражением
+    if phone_number.isascii():
+        return phone_number.encode('ascii').translate(None, _ASCII_NON_DIGITS).decode('ascii')
+    return _NON_DIGITS_RE.sub('', phone_number)
+
+# Допустимая длина номера телефона в цифрах: сервер требует не менее 10 цифр,
+# а по E.164 номер не длиннее 15 цифр
+PHONE_MIN_DIGITS = 10
+PHONE_MAX_DIGITS = 15
+INVALID_PHONE_ERROR = "Некорректный номер телефона. Номер должен содержать не менее 10 цифр."
+
+def _validate_phone(normalized_phone: Optional[str]) -> bool:
+    """
+    Проверка нормализованного номера телефона до отправки запроса на сервер.
+    
+    Аргументы:
+        normalized_phone: Номер телефона, содержащий только цифры
+        
+    Возвращает:
+        True, если длина номера допустима
+    """
+    return bool(normalized_phone) and PHONE_MIN_DIGITS <= len(normalized_phone) <= PHONE_MAX_DIGITS
+
+def _clean(**params) -> Optional[Dict[str, Any]]:
+    """
+    Формирование параметров запроса без незаданных (None) значений.
     
-    return normalized
+    Возвращает:
+        Словарь параметров или None, если ни один параметр не задан
+    """
+    return {key: value for key, value in params.items() if value is not None} or None
 
 class APIClient:
     """
@@ -25,14 +67,166 @@ class APIClient:
     Позволяет отправлять запросы к API и получать данные.
     """
     
-    def __init__(self, base_url: str):
+    # Время жизни записи в кэше пользователей (в секундах) и максимальный размер кэша
+    USER_CACHE_TTL = 300
+    USER_CACHE_MAXSIZE = 10000
+    
+    # Заголовок для тел запросов, сериализованных через orjson
+    _JSON_HEADERS = {'Content-Type': 'application/json'}
+    
+    def __init__(self, base_url: str, timeout: float = 10.0):
         """
         Инициализация клиента API с базовым URL.
         
         Аргументы:
             base_url: Базовый URL API (например, 'http://localhost:5000/api')
+            timeout: Таймаут запроса к API в секундах
         """
         self.base_url = base_url.rstrip('/')  # Удаляем слеш в конце URL, если он есть
+        self._timeout = timeout
+        
+        # URL конечных точек API собираются один раз
+        self._register_url = f"{self.base_url}/auth/register"
+        self._login_url = f"{self.base_url}/auth/login"
+        self._users_batch_url = f"{self.base_url}/users/batch"
+        self._users_exists_url = f"{self.base_url}/users/exists"
+        self._user_url_prefix = f"{self.base_url}/user/"
+        self._moods_url = f"{self.base_url}/moods"
+        self._area_mood_url = f"{self.base_url}/area-mood"
+        self._trends_url = f"{self.base_url}/trends"
+        self._events_url = f"{self.base_url}/events"
+        
+        # Общая сессия с пулом соединений: TCP-соединение с API переиспользуется
+        # между запросами вместо установки нового на каждый вызов
+        self._session = requests.Session()
+        # Повторяем запрос при ошибках соединения и временной недоступности сервера.
+        # Ошибки чтения и ответы 502/503/504 повторяются только для идемпотентных
+        # GET/DELETE, чтобы не выполнить регистрацию или создание настроения дважды
+        retry = Retry(
+            total=3, connect=3, read=2, status=2,
+            backoff_factor=0.3,
+            status_forcelist=frozenset({502, 503, 504}),
+            allowed_methods=frozenset({'GET', 'DELETE'}),
+            raise_on_status=False
+        )
+        # Запросы одновременно выполняют потоки обработчиков бота (16) и пул self._executor (16):
+        # при меньшем размере пула лишние соединения открывались бы заново и закрывались после ответа
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=32, max_retries=retry)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        # Явно запрашиваем сжатые ответы (requests распаковывает gzip/deflate сам,
+        # br не указываем, так как для него нужен дополнительный пакет brotli)
+        self._session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+        
+        # Кэш данных пользователей: {user_id: (время истечения, данные)}.
+        # Обработчики бота выполняются в нескольких потоках, поэтому доступ под блокировкой
+        self._user_cache = {}
+        self._user_cache_lock = threading.Lock()
+        
+        # Пул потоков для параллельного выполнения независимых запросов к API
+        # (число потоков не превышает размер пула соединений)
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='apiclient')
+    
+    def submit(self, fn: Union[str, Callable[..., Any]], *args, **kwargs) -> Future:
+        """
+        Асинхронный вызов метода клиента в пуле потоков.
+        
+        Аргументы:
+            fn: Имя метода клиента (например, 'get_area_mood') или сам метод
+            *args, **kwargs: Аргументы метода
+            
+        Возвращает:
+            Future с результатом метода
+        """
+        if isinstance(fn, str):
+            fn = getattr(self, fn)
+        return self._executor.submit(fn, *args, **kwargs)
+    
+    def close(self) -> None:
+        """Закрытие сессии, пула потоков и всех открытых соединений с API."""
+        self._executor.shutdown(wait=False)
+        self._session.close()
+    
+    def __enter__(self) -> 'APIClient':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+    
+    @staticmethod
+    def _json(response: requests.Response) -> Any:
+        """
+        Разбор JSON-ответа с помощью orjson.
+        
+        Ошибка разбора приводится к requests.exceptions.JSONDecodeError, чтобы
+        ее обрабатывали те же блоки except, что и ошибки response.json().
+        
+        Аргументы:
+            response: Ответ сервера
+            
+        Возвращает:
+            Разобранные данные ответа
+        """
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError as e:
+            raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos)
+    
+    def _send(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+              json_body: Any = None) -> requests.Response:
+        """
+        Отправка запроса через общую сессию.
+        
+        Аргументы:
+            method: HTTP-метод
+            url: URL запроса
+            params: Параметры строки запроса (необязательно)
+            json_body: Данные тела запроса, сериализуются через orjson (необязательно)
+            
+        Возвращает:
+            Ответ сервера
+        """
+        if json_body is None:
+            return self._session.request(method, url, params=params, timeout=self._timeout)
+        return self._session.request(method, url, params=params, data=orjson.dumps(json_body),
+                                     headers=self._JSON_HEADERS, timeout=self._timeout)
+    
+    def _request(self, method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                 json_body: Any = None, error_map: Optional[Dict[int, str]] = None,
+                 default: Any = None, error_prefix: str = "") -> Any:
+        """
+        Выполнение запроса к API с разбором ответа и обработкой ошибок.
+        
+        Аргументы:
+            method: HTTP-метод
+            url: URL запроса
+            params: Параметры строки запроса (необязательно)
+            json_body: Данные тела запроса (необязательно)
+            error_map: Сообщения об ошибках по статус-кодам для ответов не в формате JSON.
+                Если указан, неуспешный ответ без JSON превращается в {"error": ...}
+            default: Значение, возвращаемое при сетевой ошибке (по умолчанию - словарь с ошибкой)
+            error_prefix: Префикс сообщения о сетевой ошибке
+            
+        Возвращает:
+            Разобранный JSON-ответ, словарь с ошибкой или default
+        """
+        try:
+            response = self._send(method, url, params, json_body)
+            
+            # Неуспешный ответ: пытаемся получить JSON с ошибкой, иначе сообщение по статус-коду
+            if error_map is not None and not response.ok:
+                try:
+                    return self._json(response)
+                except requests.RequestException:
+                    message = error_map.get(response.status_code, f"Ошибка HTTP: {response.status_code}")
+                    return {"error": message}
+            
+            return self._json(response)
+        except requests.RequestException as e:
+            # Обрабатываем сетевые ошибки (нет соединения и т.п.)
+            if default is not None:
+                return default
+            return {"error": f"{error_prefix}{e}"}
     
     def register_user(self, phone_number: str, password: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -45,10 +239,13 @@ class APIClient:
         Возвращает:
             Словарь с информацией о пользователе или сообщением об ошибке
         """
-        url = f"{self.base_url}/auth/register"  # Полный URL для регистрации
+        url = self._register_url  # Полный URL для регистрации
         
         # Нормализуем номер телефона
         normalized_phone = normalize_phone_number(phone_number)
+        # Заведомо некорректный номер отклоняем без запроса к серверу
+        if not _validate_phone(normalized_phone):
+            return {"error": INVALID_PHONE_ERROR}
         
         data = {
             "phone_number": normalized_phone  # Данные для отправки на сервер
@@ -58,26 +255,33 @@ class APIClient:
         if password:
             data["password"] = password
         
-        try:
-            # Отправляем POST-запрос с JSON-данными
-            response = requests.post(url, json=data)
-            
-            # Проверяем успешность ответа (коды 200-299)
-            if not response.ok:
-                try:
-                    return response.json()  # Пытаемся получить JSON с ошибкой
-                except:
-                    # Если ответ не в формате JSON, создаем сообщение об ошибке на основе статус-кода
-                    if response.status_code == 409:
-                        return {"error": "Пользователь с таким номером телефона уже существует"}
-                    else:
-                        return {"error": f"Ошибка HTTP: {response.status_code}"}
+        # Отправляем POST-запрос с JSON-данными
+        return self._request(
+            'POST', url, json_body=data,
+            error_map={409: "Пользователь с таким номером телефона уже существует"},
+            error_prefix="Сетевая ошибка: "
+        )
+    
+    def user_exists(self, phone_number: str) -> Optional[bool]:
+        """
+        Проверка, зарегистрирован ли пользователь с указанным номером телефона.
+        
+        Аргументы:
+            phone_number: Номер телефона пользователя
             
-            # Возвращаем данные успешного ответа
-            return response.json()
-        except requests.RequestException as e:
-            # Обрабатываем сетевые ошибки (нет соединения и т.п.)
-            return {"error": f"Сетевая ошибка: {str(e)}"}
+        Возвращает:
+            True или False, либо None, если проверить не удалось
+        """
+        normalized_phone = normalize_phone_number(phone_number)
+        if not _validate_phone(normalized_phone):
+            return None
+        
+        result = self._request(
+            'GET', self._users_exists_url, params={'phone_number': normalized_phone},
+            error_map={}
+        )
+        exists = result.get('exists') if isinstance(result, dict) else None
+        return exists if isinstance(exists, bool) else None
     
     def login_user(self, phone_number: str, password: str) -> Dict[str, Any]:
         """
@@ -90,36 +294,25 @@ class APIClient:
         Возвращает:
             Словарь с информацией о пользователе или сообщением об ошибке
         """
-        url = f"{self.base_url}/auth/login"  # URL для авторизации
+        url = self._login_url  # URL для авторизации
         
         # Нормализуем номер телефона
         normalized_phone = normalize_phone_number(phone_number)
+        # Заведомо некорректный номер отклоняем без запроса к серверу
+        if not _validate_phone(normalized_phone):
+            return {"error": INVALID_PHONE_ERROR}
         
         data = {
             "phone_number": normalized_phone,
             "password": password
         }
         
-        try:
-            # Отправляем POST-запрос с данными для входа
-            response = requests.post(url, json=data)
-            
-            # Проверяем успешность ответа
-            if not response.ok:
-                try:
-                    return response.json()  # Получаем JSON с ошибкой
-                except:
-                    # Формируем понятное сообщение об ошибке
-                    if response.status_code == 401:
-                        return {"error": "Неверные учетные данные"}
-                    else:
-                        return {"error": f"Ошибка HTTP: {response.status_code}"}
-            
-            # Возвращаем данные об успешном входе
-            return response.json()
-        except requests.RequestException as e:
-            # Обрабатываем сетевые ошибки
-            return {"error": f"Сетевая ошибка: {str(e)}"}
+        # Отправляем POST-запрос с данными для входа
+        return self._request(
+            'POST', url, json_body=data,
+            error_map={401: "Неверные учетные данные"},
+            error_prefix="Сетевая ошибка: "
+        )
     
     def get_user(self, user_id: int) -> Dict[str, Any]:
         """
@@ -131,15 +324,98 @@ class APIClient:
         Возвращает:
             Словарь с информацией о пользователе или сообщением об ошибке
         """
-        url = f"{self.base_url}/user/{user_id}"  # URL для получения данных пользователя
+        # Сначала проверяем кэш: данные пользователя практически не меняются
+        now = time.monotonic()
+        with self._user_cache_lock:
+            cached = self._user_cache.get(user_id)
+            if cached is not None:
+                if cached[0] > now:
+                    return cached[1]
+                del self._user_cache[user_id]
+        
+        url = f"{self._user_url_prefix}{user_id}"  # URL для получения данных пользователя
+        
+        # Отправляем GET-запрос
+        data = self._request('GET', url)
+        
+        # Кэшируем только успешные ответы
+        if isinstance(data, dict) and 'error' not in data:
+            with self._user_cache_lock:
+                # При переполнении удаляем самую старую запись
+                if len(self._user_cache) >= self.USER_CACHE_MAXSIZE:
+                    self._user_cache.pop(next(iter(self._user_cache)))
+                self._user_cache[user_id] = (now + self.USER_CACHE_TTL, data)
+        return data
+    
+    def get_users(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Получение информации о нескольких пользователях за один запрос.
+        
+        Пользователи, уже находящиеся в кэше, не запрашиваются повторно.
+        Если сервер не поддерживает пакетный запрос, данные загружаются
+        параллельными запросами get_user.
+        
+        Аргументы:
+            user_ids: Список ID пользователей в API
+            
+        Возвращает:
+            Словарь {ID пользователя: данные пользователя}; не найденные пользователи отсутствуют
+        """
+        result = {}
+        missing = []
+        now = time.monotonic()
+        
+        # Берем из кэша всех, кого можно
+        with self._user_cache_lock:
+            for user_id in dict.fromkeys(user_ids):
+                cached = self._user_cache.get(user_id)
+                if cached is not None and cached[0] > now:
+                    result[user_id] = cached[1]
+                else:
+                    missing.append(user_id)
+        
+        if not missing:
+            return result
+        
+        url = self._users_batch_url  # URL для пакетного получения пользователей
         
         try:
-            # Отправляем GET-запрос
-            response = requests.get(url)
-            return response.json()  # Возвращаем полученные данные
-        except requests.RequestException as e:
-            # В случае ошибки формируем сообщение
-            return {"error": str(e)}
+            # Отправляем один POST-запрос со списком недостающих ID
+            response = self._send('POST', url, json_body={"ids": missing})
+            if response.status_code in (404, 405):
+                # Сервер без пакетного запроса: загружаем пользователей параллельно
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    for user_id, data in zip(missing, executor.map(self.get_user, missing)):
+                        if 'error' not in data:
+                            result[user_id] = data
+                return result
+            if not response.ok:
+                return result
+            users = self._json(response)
+        except requests.RequestException:
+            # При сетевой ошибке возвращаем только данные из кэша
+            return result
+        
+        # Ключи JSON-объекта - строки, приводим их к int и сохраняем в кэш
+        expires = time.monotonic() + self.USER_CACHE_TTL
+        with self._user_cache_lock:
+            for key, data in users.items():
+                user_id = int(key)
+                result[user_id] = data
+                if len(self._user_cache) >= self.USER_CACHE_MAXSIZE:
+                    self._user_cache.pop(next(iter(self._user_cache)))
+                self._user_cache[user_id] = (expires, data)
+        return result
+    
+    def invalidate_user(self, user_id: int) -> None:
+        """
+        Удаление данных пользователя из кэша (например, после их изменения).
+        
+        Аргументы:
+            user_id: ID пользователя в API
+        """
+        with self._user_cache_lock:
+            self._user_cache.pop(user_id, None)
     
     def get_user_moods(self, user_id: int, lat: Optional[float] = None, 
                       lng: Optional[float] = None, radius: Optional[float] = None,
@@ -157,26 +433,33 @@ class APIClient:
         Возвращает:
             Список словарей с данными о настроениях или пустой список при ошибке
         """
-        url = f"{self.base_url}/user/{user_id}/moods"  # URL для получения настроений
-        params = {}  # Параметры запроса
+        url = f"{self._user_url_prefix}{user_id}/moods"  # URL для получения настроений
+        # Параметры фильтрации (только указанные)
+        params = _clean(lat=lat, lng=lng, radius=radius, hours=hours)
         
-        # Добавляем параметры фильтрации, если они указаны
-        if lat is not None:
-            params['lat'] = lat
-        if lng is not None:
-            params['lng'] = lng
-        if radius is not None:
-            params['radius'] = radius
-        if hours is not None:
-            params['hours'] = hours
+        # Отправляем GET-запрос с параметрами (при ошибке - пустой список)
+        return self._request('GET', url, params=params, default=[])
+    
+    def get_user_moods_page(self, user_id: int, limit: int, offset: int = 0) -> Dict[str, Any]:
+        """
+        Получение одной страницы настроений пользователя (сначала новые).
         
-        try:
-            # Отправляем GET-запрос с параметрами
-            response = requests.get(url, params=params)
-            return response.json()  # Возвращаем список настроений
-        except requests.RequestException:
-            # При ошибке возвращаем пустой список
-            return []
+        Аргументы:
+            user_id: ID пользователя в API
+            limit: Количество настроений на странице
+            offset: Количество пропускаемых настроений
+            
+        Возвращает:
+            Словарь {'items': список настроений, 'total': общее количество} или словарь с ошибкой
+        """
+        url = f"{self._user_url_prefix}{user_id}/moods"
+        result = self._request('GET', url, params={'limit': limit, 'offset': offset},
+                               default={'items': [], 'total': 0})
+        
+        # Сервер без поддержки постраничной выборки возвращает полный список
+        if isinstance(result, list):
+            return {'items': result[offset:offset + limit], 'total': len(result)}
+        return result
     
     def create_mood(self, user_id: int, emoji: str, latitude: float, 
                    longitude: float, text: str = "") -> Dict[str, Any]:
@@ -193,7 +476,7 @@ class APIClient:
         Возвращает:
             Словарь с данными созданного настроения или сообщением об ошибке
         """
-        url = f"{self.base_url}/moods"  # URL для создания настроения
+        url = self._moods_url  # URL для создания настроения
         data = {
             "user_id": user_id,
             "emoji": emoji,
@@ -202,13 +485,8 @@ class APIClient:
             "text": text
         }
         
-        try:
-            # Отправляем POST-запрос с данными настроения
-            response = requests.post(url, json=data)
-            return response.json()  # Возвращаем результат операции
-        except requests.RequestException as e:
-            # Формируем сообщение об ошибке
-            return {"error": str(e)}
+        # Отправляем POST-запрос с данными настроения
+        return self._request('POST', url, json_body=data)
     
     def delete_mood(self, mood_id: int, user_id: int) -> bool:
         """
@@ -221,14 +499,14 @@ class APIClient:
         Возвращает:
             True, если удаление успешно, False в случае ошибки
         """
-        url = f"{self.base_url}/moods/{mood_id}"  # URL для удаления настроения
+        url = f"{self._moods_url}/{mood_id}"  # URL для удаления настроения
         params = {
             "user_id": user_id  # Параметры запроса
         }
         
         try:
             # Отправляем DELETE-запрос
-            response = requests.delete(url, params=params)
+            response = self._send('DELETE', url, params=params)
             # Проверяем успешность операции по коду ответа
             return response.status_code in (200, 204)
         except requests.RequestException:
@@ -249,24 +527,12 @@ class APIClient:
         Возвращает:
             Словарь с информацией о настроении области или сообщением об ошибке
         """
-        url = f"{self.base_url}/area-mood"  # URL для получения настроения области
-        params = {
-            "lat": latitude,
-            "lng": longitude,
-            "radius": radius
-        }
-        
-        # Добавляем фильтр по времени, если указан
-        if hours is not None:
-            params["hours"] = hours
+        url = self._area_mood_url  # URL для получения настроения области
+        # Параметры запроса (фильтр по времени - только если указан)
+        params = _clean(lat=latitude, lng=longitude, radius=radius, hours=hours)
         
-        try:
-            # Отправляем GET-запрос с параметрами
-            response = requests.get(url, params=params)
-            return response.json()  # Возвращаем данные о настроении
-        except requests.RequestException as e:
-            # Формируем сообщение об ошибке
-            return {"error": str(e)}
+        # Отправляем GET-запрос с параметрами
+        return self._request('GET', url, params=params)
     
     def get_trends(self, latitude: Optional[float] = None, longitude: Optional[float] = None,
                   radius: Optional[float] = None, hours: int = 24) -> Dict[str, Any]:
@@ -282,26 +548,12 @@ class APIClient:
         Возвращает:
             Словарь с информацией о трендах настроений или сообщением об ошибке
         """
-        url = f"{self.base_url}/trends"  # URL для получения трендов
-        params = {
-            "hours": hours
-        }
+        url = self._trends_url  # URL для получения трендов
+        # Параметры запроса (местоположение - только если указано)
+        params = _clean(hours=hours, lat=latitude, lng=longitude, radius=radius)
         
-        # Добавляем параметры местоположения, если они указаны
-        if latitude is not None:
-            params["lat"] = latitude
-        if longitude is not None:
-            params["lng"] = longitude
-        if radius is not None:
-            params["radius"] = radius
-        
-        try:
-            # Отправляем GET-запрос с параметрами
-            response = requests.get(url, params=params)
-            return response.json()  # Возвращаем данные о трендах
-        except requests.RequestException as e:
-            # Формируем сообщение об ошибке
-            return {"error": str(e)}
+        # Отправляем GET-запрос с параметрами
+        return self._request('GET', url, params=params)
     
     def get_events(self, latitude: Optional[float] = None, longitude: Optional[float] = None,
                   radius: Optional[float] = None, hours: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -317,23 +569,10 @@ class APIClient:
         Возвращает:
             Список словарей с информацией о событиях или пустой список при ошибке
         """
-        url = f"{self.base_url}/events"  # URL для получения событий
-        params = {}
-        
-        # Добавляем параметры запроса, если они указаны
-        if latitude is not None:
-            params["lat"] = latitude
-        if longitude is not None:
-            params["lng"] = longitude
-        if radius is not None:
-            params["radius"] = radius
-        if hours is not None:
-            params["hours"] = hours
+        url = self._events_url  # URL для получения событий
+        # Параметры запроса (только указанные)
+        params = _clean(lat=latitude, lng=longitude, radius=radius, hours=hours)
         
-        try:
-            # Отправляем GET-запрос с параметрами
-            response = requests.get(url, params=params)
-            return response.json()  # Возвращаем список событий
-        except requests.RequestException:
-            # При ошибке возвращаем пустой список
-            return [] 
\ No newline at end of file
+        # Отправляем GET-запрос с параметрами (при ошибке - пустой список)
+        return self._request('GET', url, params=params, default=[])
+ 
\ No newline at end of file
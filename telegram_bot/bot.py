@@ -1,19 +1,29 @@
 import os
 import logging
-from typing import Dict, Any, List, Tuple, Optional
+import functools
+import hashlib
+import threading
+import weakref
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple, Optional, NamedTuple
 from datetime import datetime
 from dotenv import load_dotenv
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
     Updater, CommandHandler, MessageHandler, Filters, 
-    ConversationHandler, CallbackContext, CallbackQueryHandler
+    ConversationHandler, CallbackContext, CallbackQueryHandler, Defaults, ExtBot
 )
-from telegram.error import TelegramError
+from telegram.error import TelegramError, RetryAfter
+from telegram.utils.request import Request
 from api_client import APIClient, normalize_phone_number
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 
-from models import UserRepository
+from models import UserRepository, GeocodeRepository, TTLCache
 
 # Загружаем переменные окружения из файла .env
 load_dotenv()
@@ -25,11 +35,62 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)  # Создаем объект логгера для текущего модуля
 
+class RepeatedErrorFilter(logging.Filter):
+    """
+    Ограничение числа одинаковых ошибок в журнале.
+    
+    Записи уровня ERROR и выше с одним шаблоном сообщения и типом исключения
+    пропускаются не чаще limit раз за period секунд, чтобы всплеск одинаковых
+    ошибок (например, при недоступности API) не забивал журнал трассировками.
+    Число пропущенных записей добавляется к первой записи следующего периода.
+    """
+    def __init__(self, limit: int = 10, period: float = 60.0):
+        super().__init__()
+        self.limit = limit
+        self.period = period
+        self._windows = {}  # {(шаблон, тип исключения): [начало периода, записано, пропущено]}
+        self._lock = threading.Lock()
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.ERROR:
+            return True
+        exc_type = record.exc_info[0] if record.exc_info else None
+        key = (record.msg, exc_type)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.period:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed and isinstance(record.args, tuple):
+                    record.msg = f"{record.msg} (пропущено таких же записей: %d)"
+                    record.args = record.args + (suppressed,)
+                return True
+            if window[1] < self.limit:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+logger.addFilter(RepeatedErrorFilter())
+
 # Получаем настройки из переменных окружения
 # TOKEN - ключ для доступа к API Telegram (получается у @BotFather)
 # API_BASE_URL - адрес, по которому доступен API нашего веб-приложения
 TOKEN = os.environ.get("TELEGRAM_TOKEN")  # Получаем токен из переменных окружения
 API_BASE_URL = os.environ.get("API_BASE_URL", "http://localhost:5000/api")  # URL API с дефолтным значением
+# WEBHOOK_URL - публичный HTTPS-адрес бота (например, https://bot.example.com). Если задан,
+# бот получает обновления через вебхук, иначе - через long polling
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "").rstrip('/')
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")  # Адрес, на котором слушает встроенный веб-сервер
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))  # Порт встроенного веб-сервера
+# Время (в секундах), которое сервер Telegram держит запрос getUpdates открытым в режиме
+# long polling: пока новых обновлений нет, бот не отправляет новых запросов
+POLLING_TIMEOUT = int(os.environ.get("POLLING_TIMEOUT", "50"))
+
+# Типы обновлений, которые обрабатывает бот (контакты и геолокация приходят внутри message).
+# Остальные типы (edited_message, channel_post, poll и т.д.) Telegram не присылает
+ALLOWED_UPDATES = ["message", "callback_query"]
 
 # Инициализируем API-клиент для взаимодействия с нашим веб-сервером
 # API-клиент позволяет обмениваться данными между ботом и основным приложением
@@ -58,15 +119,84 @@ api_client = APIClient(API_BASE_URL)
 
 # Список доступных эмодзи для выбора настроения
 # Пользователь выбирает один из этих эмодзи для обозначения своего настроения
-EMOJI_OPTIONS = ["😊", "😎", "🥰", "😐", "🤔", "😴", "😢", "😡", "😷"]
+EMOJI_OPTIONS = ("😊", "😎", "🥰", "😐", "🤔", "😴", "😢", "😡", "😷")
+EMOJI_SET = frozenset(EMOJI_OPTIONS)  # Для быстрой проверки выбранного эмодзи
+
+# Тексты кнопок: используются и при построении клавиатур, и при разборе ответов пользователя
+BTN_CANCEL = "❌ Отмена"
+BTN_LAST_LOCATION = "🔄 Последняя геолокация"
+BTN_SEND_LOCATION = "📍 Отправить геолокацию"
+BTN_SEND_PHONE = "📱 Отправить номер телефона"
+BTN_SKIP = "⏩ Пропустить"
+
+# Фильтры нажатий на кнопки создаются один раз и используются в нескольких состояниях диалога.
+# Точное сравнение текста с надписью кнопки не требует регулярных выражений
+CANCEL_FILTER = Filters.text([BTN_CANCEL])
+LAST_LOCATION_FILTER = Filters.text([BTN_LAST_LOCATION])
+SKIP_FILTER = Filters.text([BTN_SKIP])
+MOOD_TEXT_FILTER = Filters.text & ~Filters.text([BTN_CANCEL, BTN_SKIP])
+
+# Повторяющиеся тексты ответов
+MSG_NO_LAST_LOCATION = "Не удалось найти вашу последнюю геолокацию. Пожалуйста, отправьте геолокацию."
+MSG_OPERATION_CANCELLED = "Операция отменена."
+MSG_PLEASE_WAIT = "Подождите, предыдущий запрос еще обрабатывается."
+ERR_NOT_AUTHORIZED = "Вы не авторизованы. Пожалуйста, начните с /start"
+ERR_NO_PHONE = "Отсутствует номер телефона. Пожалуйста, начните с /start"
+ERR_AUTH_REQUIRED = "Для этого действия требуется авторизация. Пожалуйста, перезапустите бота командой /start и введите пароль."
 
 # Глобальная переменная для хранения экземпляра notifier
 event_notifier = None
 
 # Вспомогательные функции для создания клавиатур
+def _build_emoji_rows():
+    """
+    Формирование сетки кнопок с эмодзи (по 3 в ряд) и кнопкой отмены внизу.
+    
+    Возвращает:
+        Список рядов кнопок
+    """
+    keyboard = []
+    row = []
+    for i, emoji in enumerate(EMOJI_OPTIONS):
+        row.append(KeyboardButton(emoji))
+        if (i + 1) % 3 == 0:  # Формируем по 3 эмодзи в ряд
+            keyboard.append(row)
+            row = []
+    if row:  # Если остались непомещенные кнопки
+        keyboard.append(row)
+    keyboard.append([KeyboardButton(BTN_CANCEL)])  # Добавляем кнопку отмены внизу
+    return keyboard
+
+# Клавиатуры не зависят от пользователя, поэтому создаются один раз при загрузке модуля
+# (resize_keyboard делает кнопки меньше по размеру)
+_MAIN_MENU_MARKUP = ReplyKeyboardMarkup([
+    [KeyboardButton("📝 Создать метку настроения")],  # Первый ряд с одной кнопкой
+    [KeyboardButton("👤 Профиль"), KeyboardButton("🔍 Настроение вокруг меня")],  # Второй ряд с двумя кнопками
+    [KeyboardButton("📊 Тренды"), KeyboardButton("🎭 События")]  # Третий ряд с двумя кнопками
+], resize_keyboard=True)
+
+_EMOJI_MARKUP = ReplyKeyboardMarkup(_build_emoji_rows(), resize_keyboard=True)
+
+# Клавиатура с кнопкой запроса контакта (номера телефона)
+_PHONE_MARKUP = ReplyKeyboardMarkup(
+    [[KeyboardButton(BTN_SEND_PHONE, request_contact=True)]],
+    resize_keyboard=True, one_time_keyboard=True
+)
+
+_LOCATION_MARKUP_NO_LAST = ReplyKeyboardMarkup([
+    [KeyboardButton(BTN_SEND_LOCATION, request_location=True)],  # Кнопка запроса местоположения
+    [KeyboardButton(BTN_CANCEL)]  # Кнопка отмены
+], resize_keyboard=True)
+
+_LOCATION_MARKUP_WITH_LAST = ReplyKeyboardMarkup([
+    [KeyboardButton(BTN_LAST_LOCATION)],
+    [KeyboardButton(BTN_SEND_LOCATION, request_location=True)],
+    [KeyboardButton(BTN_CANCEL)]
+], resize_keyboard=True)
+
 def get_main_menu_keyboard():
     """
-    Создание клавиатуры главного меню.
+    Клавиатура главного меню.
     
     Клавиатура в Telegram - это набор кнопок, которые отображаются у пользователя
     и позволяют ему взаимодействовать с ботом без ввода текста.
@@ -74,42 +204,26 @@ def get_main_menu_keyboard():
     Возвращает:
         Объект ReplyKeyboardMarkup с кнопками главного меню
     """
-    keyboard = [
-        [KeyboardButton("📝 Создать метку настроения")],  # Первый ряд с одной кнопкой
-        [KeyboardButton("👤 Профиль"), KeyboardButton("🔍 Настроение вокруг меня")],  # Второй ряд с двумя кнопками
-        [KeyboardButton("📊 Тренды"), KeyboardButton("🎭 События")]  # Третий ряд с двумя кнопками
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)  # resize_keyboard делает кнопки меньше по размеру
+    return _MAIN_MENU_MARKUP
 
 def get_emoji_keyboard():
     """
-    Создание клавиатуры с эмодзи для выбора настроения.
+    Клавиатура с эмодзи для выбора настроения.
     
-    Эта функция создает клавиатуру, на которой пользователь может выбрать эмодзи,
+    На этой клавиатуре пользователь может выбрать эмодзи,
     соответствующий его текущему настроению.
     
     Возвращает:
         Объект ReplyKeyboardMarkup с кнопками-эмодзи
     """
-    keyboard = []
-    row = []
-    # Формируем сетку кнопок с эмодзи (по 3 в ряд)
-    for i, emoji in enumerate(EMOJI_OPTIONS):
-        row.append(KeyboardButton(emoji))
-        if (i + 1) % 3 == 0:  # Формируем по 3 эмодзи в ряд
-            keyboard.append(row)
-            row = []
-    if row:  # Если остались непомещенные кнопки
-        keyboard.append(row)
-    keyboard.append([KeyboardButton("❌ Отмена")])  # Добавляем кнопку отмены внизу
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    return _EMOJI_MARKUP
 
 def get_location_keyboard(telegram_id=None):
     """
-    Создание клавиатуры с кнопкой отправки геолокации.
+    Клавиатура с кнопкой отправки геолокации.
     
     Telegram позволяет запрашивать геолокацию пользователя через специальную кнопку.
-    Эта функция создает клавиатуру с такой кнопкой.
+    Если у пользователя есть недавняя метка, добавляется кнопка последней геолокации.
     
     Аргументы:
         telegram_id: ID пользователя в Telegram (для проверки наличия последней метки)
@@ -117,18 +231,48 @@ def get_location_keyboard(telegram_id=None):
     Возвращает:
         Объект ReplyKeyboardMarkup с кнопкой запроса местоположения
     """
-    keyboard = [
-        [KeyboardButton("📍 Отправить геолокацию", request_location=True)],  # Кнопка запроса местоположения
-    ]
-    
-    # Если указан ID пользователя, проверяем наличие последней метки
     if telegram_id and UserRepository.is_last_location_valid(telegram_id):
-        keyboard.insert(0, [KeyboardButton("🔄 Последняя геолокация")])
-        
-    keyboard.append([KeyboardButton("❌ Отмена")])  # Кнопка отмены
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+        return _LOCATION_MARKUP_WITH_LAST
+    return _LOCATION_MARKUP_NO_LAST
+
+# Время жизни строки пользователя, сохраненной в context.user_data (в секундах)
+USER_ROW_TTL = 60
+
+# Кэш отрицательных результатов: Telegram ID пользователей без учетных данных API.
+# Сообщения неавторизованных пользователей не обращаются к базе в течение NO_CREDENTIALS_TTL секунд
+NO_CREDENTIALS_TTL = 30
+_no_credentials_cache = TTLCache(NO_CREDENTIALS_TTL, 10000)
+
+def get_user_row(telegram_id: int, context=None) -> Optional[Dict[str, Any]]:
+    """
+    Получение строки пользователя с кэшированием в данных диалога.
+    
+    В течение одного обновления строка пользователя нужна нескольким функциям,
+    поэтому она сохраняется в context.user_data['_user_cache'] на USER_ROW_TTL секунд.
+    
+    Аргументы:
+        telegram_id: ID пользователя в Telegram
+        context: Контекст диалога (необязательно)
+    
+    Возвращает:
+        Словарь с данными пользователя или None, если пользователь не найден
+        или недавно проверялся и не имеет учетных данных API
+    """
+    if _no_credentials_cache.get(telegram_id):
+        return None
+    
+    user_data = context.user_data if context else None
+    if user_data is not None:
+        cached = user_data.get('_user_cache')
+        if cached and cached[0] > time.monotonic() and cached[1].get('telegram_id') == telegram_id:
+            return cached[1]
+    
+    user = UserRepository.get_user_by_telegram_id(telegram_id)
+    if user and user_data is not None:
+        user_data['_user_cache'] = (time.monotonic() + USER_ROW_TTL, user)
+    return user
 
-def get_user_api_credentials(telegram_id: int) -> Tuple[Optional[int], Optional[str]]:
+def get_user_api_credentials(telegram_id: int, user: Optional[Dict[str, Any]] = None) -> Tuple[Optional[int], Optional[str]]:
     """
     Получение учетных данных пользователя для доступа к API.
     
@@ -136,22 +280,92 @@ def get_user_api_credentials(telegram_id: int) -> Tuple[Optional[int], Optional[
     
     Аргументы:
         telegram_id: ID пользователя в Telegram
+        user: Уже полученная строка пользователя (необязательно, чтобы не обращаться к базе повторно)
     
     Возвращает:
         Кортеж из ID пользователя в API и пароля (если сохранен в контексте)
     """
     try:
         # Получаем информацию о пользователе из базы данных
-        user = UserRepository.get_user_by_telegram_id(telegram_id)
-        if not user:
-            return None, None
+        if user is None:
+            if _no_credentials_cache.get(telegram_id):
+                return None, None
+            user = UserRepository.get_user_by_telegram_id(telegram_id)
         
         # Возвращаем ID пользователя в API
-        return user.get('api_user_id'), None
-    except Exception as e:
-        logger.error(f"Ошибка при получении учетных данных: {e}")
+        api_user_id = user.get('api_user_id') if user else None
+        if api_user_id is None:
+            _no_credentials_cache.put(telegram_id, True)
+        return api_user_id, None
+    except Exception:
+        logger.exception("Ошибка при получении учетных данных")
         return None, None
 
+# Кэш успешных входов в API: {telegram_id: (время истечения, телефон, хеш пароля)}.
+# Пока запись действительна, повторная проверка пароля на сервере не выполняется
+LOGIN_CACHE_TTL = 15 * 60
+_login_cache: Dict[int, Tuple[float, str, bytes]] = {}
+_login_cache_lock = threading.Lock()
+
+def _password_digest(password: str) -> bytes:
+    """Хеш пароля для сравнения с кэшем (сам пароль в кэше не хранится)."""
+    return hashlib.sha256(password.encode('utf-8')).digest()
+
+def is_api_login_cached(telegram_id: int, phone_number: str, password: str) -> bool:
+    """
+    Проверка, выполнялся ли недавно успешный вход с этими учетными данными.
+    
+    Аргументы:
+        telegram_id: ID пользователя в Telegram
+        phone_number: Номер телефона пользователя
+        password: Пароль пользователя
+    
+    Возвращает:
+        True, если есть действительная запись об успешном входе
+    """
+    with _login_cache_lock:
+        cached = _login_cache.get(telegram_id)
+        if cached is None:
+            return False
+        expires_at, cached_phone, cached_digest = cached
+        if expires_at <= time.monotonic():
+            del _login_cache[telegram_id]
+            return False
+    return cached_phone == phone_number and cached_digest == _password_digest(password)
+
+def remember_api_login(telegram_id: int, phone_number: str, password: str) -> None:
+    """
+    Сохранение записи об успешном входе в API.
+    
+    Аргументы:
+        telegram_id: ID пользователя в Telegram
+        phone_number: Номер телефона пользователя
+        password: Пароль пользователя
+    """
+    entry = (time.monotonic() + LOGIN_CACHE_TTL, phone_number, _password_digest(password))
+    with _login_cache_lock:
+        _login_cache[telegram_id] = entry
+
+def api_login(telegram_id: int, phone_number: str, password: str) -> Dict[str, Any]:
+    """
+    Вход в API с использованием кэша успешных входов.
+    
+    Аргументы:
+        telegram_id: ID пользователя в Telegram
+        phone_number: Номер телефона пользователя
+        password: Пароль пользователя
+    
+    Возвращает:
+        Пустой словарь при успешном входе или словарь с ключом 'error'
+    """
+    if is_api_login_cached(telegram_id, phone_number, password):
+        return {}
+    login_response = api_client.login_user(phone_number, password)
+    if 'error' in login_response:
+        return login_response
+    remember_api_login(telegram_id, phone_number, password)
+    return {}
+
 def update_user_location(telegram_id: int, latitude: float, longitude: float):
     """
     Обновление местоположения пользователя.
@@ -166,10 +380,30 @@ def update_user_location(telegram_id: int, latitude: float, longitude: float):
     try:
         # Обновляем местоположение пользователя в базе данных
         UserRepository.update_user_location(telegram_id, latitude, longitude)
-    except Exception as e:
-        logger.error(f"Ошибка при обновлении местоположения пользователя {telegram_id}: {e}")
+    except Exception:
+        logger.exception("Ошибка при обновлении местоположения пользователя %s", telegram_id)
+
+# Пул потоков для записей в локальную базу, которые можно выполнять параллельно с запросами к API
+db_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='db')
+
+def save_mood_location(telegram_id: int, latitude: float, longitude: float) -> None:
+    """
+    Сохранение местоположения и времени последней метки настроения пользователя.
+    
+    Обе записи относятся к одной строке UserLocation, поэтому выполняются последовательно.
+    
+    Аргументы:
+        telegram_id: ID пользователя в Telegram
+        latitude: Широта местоположения
+        longitude: Долгота местоположения
+    """
+    # Обновляем местоположение пользователя в базе данных
+    update_user_location(telegram_id, latitude, longitude)
+    
+    # Обновляем время последней метки настроения
+    UserRepository.update_mood_location_time(telegram_id, latitude, longitude)
 
-def create_mood_with_api(telegram_id: int, emoji: str, latitude: float, longitude: float, text: str = "", context=None) -> Dict[str, Any]:
+def create_mood_with_api(telegram_id: int, emoji: str, latitude: float, longitude: float, text: str = "", context=None, user: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
     Создание новой метки настроения через API.
     
@@ -182,41 +416,47 @@ def create_mood_with_api(telegram_id: int, emoji: str, latitude: float, longitud
         longitude: Долгота местоположения
         text: Текстовое описание настроения (необязательно)
         context: Контекст диалога с паролем
+        user: Уже полученная строка пользователя (необязательно)
     
     Возвращает:
         Словарь с данными созданного настроения или сообщением об ошибке
     """
-    # Получаем ID пользователя в API
-    api_user_id, _ = get_user_api_credentials(telegram_id)
+    # Получаем строку пользователя один раз на обновление и ID пользователя в API
+    if user is None:
+        user = get_user_row(telegram_id, context)
+    api_user_id, _ = get_user_api_credentials(telegram_id, user)
     
     if not api_user_id:
-        return {"error": "Вы не авторизованы. Пожалуйста, начните с /start"}
+        return {"error": ERR_NOT_AUTHORIZED}
     
     # Сначала авторизуемся с сохраненными данными
-    user = UserRepository.get_user_by_telegram_id(telegram_id)
     if not user or not user.get('phone_number'):
-        return {"error": "Отсутствует номер телефона. Пожалуйста, начните с /start"}
+        return {"error": ERR_NO_PHONE}
     
     # Получаем пароль из контекста пользователя (временный пароль для текущей сессии)
     password = context.user_data.get('api_password') if context else None
     if not password:
-        return {"error": "Для этого действия требуется авторизация. Пожалуйста, перезапустите бота командой /start и введите пароль."}
+        return {"error": ERR_AUTH_REQUIRED}
         
-    # Логинимся для получения актуальной информации о пользователе
-    login_response = api_client.login_user(user['phone_number'], password)
+    # Проверяем учетные данные (повторный вход в течение LOGIN_CACHE_TTL берется из кэша)
+    login_response = api_login(telegram_id, user['phone_number'], password)
     if 'error' in login_response:
         return login_response
     
-    # Обновляем местоположение пользователя в базе данных
-    update_user_location(telegram_id, latitude, longitude)
-    
-    # Обновляем время последней метки настроения
-    UserRepository.update_mood_location_time(telegram_id, latitude, longitude)
-    
-    # Создаем настроение через API
-    return api_client.create_mood(api_user_id, emoji, latitude, longitude, text)
+    # Записи в локальную базу не зависят от ответа API, поэтому выполняются
+    # в пуле потоков, пока создается настроение
+    location_future = db_executor.submit(save_mood_location, telegram_id, latitude, longitude)
+    try:
+        # Создаем настроение через API; сохраненная страница профиля больше не актуальна
+        _profile_page_cache.pop(telegram_id)
+        if context:
+            context.user_data.pop('_profile_prefetch', None)
+        return api_client.create_mood(api_user_id, emoji, latitude, longitude, text)
+    finally:
+        # Дожидаемся записи, чтобы следующий шаг диалога видел новое местоположение
+        location_future.result()
 
-def delete_mood_with_api(telegram_id: int, mood_id: int, context=None) -> bool:
+def delete_mood_with_api(telegram_id: int, mood_id: int, context=None, user: Optional[Dict[str, Any]] = None) -> bool:
     """
     Удаление метки настроения через API.
     
@@ -226,18 +466,20 @@ def delete_mood_with_api(telegram_id: int, mood_id: int, context=None) -> bool:
         telegram_id: ID пользователя в Telegram
         mood_id: ID настроения для удаления
         context: Контекст диалога с паролем
+        user: Уже полученная строка пользователя (необязательно)
     
     Возвращает:
         True, если удаление выполнено успешно, иначе False
     """
-    # Получаем ID пользователя в API
-    api_user_id, _ = get_user_api_credentials(telegram_id)
+    # Получаем строку пользователя один раз на обновление и ID пользователя в API
+    if user is None:
+        user = get_user_row(telegram_id, context)
+    api_user_id, _ = get_user_api_credentials(telegram_id, user)
     
     if not api_user_id:
         return False
     
     # Сначала авторизуемся с сохраненными данными
-    user = UserRepository.get_user_by_telegram_id(telegram_id)
     if not user or not user.get('phone_number'):
         return False
     
@@ -246,8 +488,8 @@ def delete_mood_with_api(telegram_id: int, mood_id: int, context=None) -> bool:
     if not password:
         return False
     
-    # Логинимся для получения актуальной информации о пользователе
-    login_response = api_client.login_user(user['phone_number'], password)
+    # Проверяем учетные данные (повторный вход в течение LOGIN_CACHE_TTL берется из кэша)
+    login_response = api_login(telegram_id, user['phone_number'], password)
     if 'error' in login_response:
         return False
     
@@ -255,7 +497,21 @@ def delete_mood_with_api(telegram_id: int, mood_id: int, context=None) -> bool:
     return api_client.delete_mood(mood_id, api_user_id)
 
 # Функция для аутентификации и получения данных от API
-def get_api_data_with_auth(telegram_id: int, api_method, context=None, **params):
+class APIResult(NamedTuple):
+    """
+    Результат запроса к API: данные или текст ошибки (ровно одно из двух не None).
+    """
+    data: Any
+    error: Optional[str]
+    
+    @classmethod
+    def from_response(cls, response: Any) -> 'APIResult':
+        """Преобразование ответа метода APIClient (данные или словарь с ключом 'error')."""
+        if isinstance(response, dict) and 'error' in response:
+            return cls(None, response['error'])
+        return cls(response, None)
+
+def get_api_data_with_auth(telegram_id: int, api_method, context=None, user: Optional[Dict[str, Any]] = None, **params):
     """
     Вызов метода API с авторизацией.
     
@@ -267,39 +523,168 @@ def get_api_data_with_auth(telegram_id: int, api_method, context=None, **params)
         telegram_id: ID пользователя в Telegram
         api_method: Функция API-клиента для вызова
         context: Контекст диалога с паролем
+        user: Уже полученная строка пользователя (необязательно)
         **params: Дополнительные параметры для метода API
     
     Возвращает:
-        Данные, полученные от API, или сообщение об ошибке
+        APIResult с данными от API или текстом ошибки
     """
-    # Получаем ID пользователя в API
-    api_user_id, _ = get_user_api_credentials(telegram_id)
+    # Получаем строку пользователя один раз на обновление и ID пользователя в API
+    if user is None:
+        user = get_user_row(telegram_id, context)
+    api_user_id, _ = get_user_api_credentials(telegram_id, user)
     
     if not api_user_id:
-        return {"error": "Вы не авторизованы. Пожалуйста, начните с /start"}
+        return APIResult(None, ERR_NOT_AUTHORIZED)
     
     # Логинимся с сохраненными данными
-    user = UserRepository.get_user_by_telegram_id(telegram_id)
     if not user or not user.get('phone_number'):
-        return {"error": "Отсутствует номер телефона. Пожалуйста, начните с /start"}
+        return APIResult(None, ERR_NO_PHONE)
     
     # Получаем пароль из контекста пользователя
     password = context.user_data.get('api_password') if context else None
     if not password:
-        return {"error": "Для этого действия требуется авторизация. Пожалуйста, перезапустите бота командой /start и введите пароль."}
+        return APIResult(None, ERR_AUTH_REQUIRED)
     
-    # Выполняем логин для проверки актуальности учетных данных
+    # Если учетные данные недавно проверялись, сразу вызываем метод API
+    if is_api_login_cached(telegram_id, user['phone_number'], password):
+        return APIResult.from_response(api_method(**params))
+    
+    # Проверка учетных данных и запрос данных независимы, поэтому выполняем их параллельно:
+    # данные запрашиваются в пуле потоков клиента, пока выполняется логин
+    data_future = api_client.submit(api_method, **params)
     login_response = api_client.login_user(user['phone_number'], password)
     if 'error' in login_response:
-        return login_response
+        data_future.cancel()
+        return APIResult(None, login_response['error'])
+    remember_api_login(telegram_id, user['phone_number'], password)
+    
+    # Возвращаем результат вызова метода API
+    return APIResult.from_response(data_future.result())
+
+# URL сервиса обратного геокодирования OpenStreetMap Nominatim
+NOMINATIM_REVERSE_URL = "https://nominatim.openstreetmap.org/reverse"
+
+# Общая сессия для запросов к Nominatim: TLS-соединение переиспользуется между запросами.
+# User-Agent обязателен по правилам использования Nominatim API
+nominatim_session = requests.Session()
+nominatim_session.mount('https://', HTTPAdapter(
+    pool_connections=4, pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5)
+))
+nominatim_session.headers.update({"User-Agent": "MoodMapBot/1.0"})
+
+# Ограничение частоты запросов к Nominatim (не чаще 1 запроса в секунду) для всех потоков бота
+NOMINATIM_MIN_INTERVAL = 1.0
+_nominatim_lock = threading.Lock()
+_nominatim_last_request = 0.0
+
+def _wait_for_nominatim_slot() -> None:
+    """
+    Ожидание, пока с предыдущего запроса к Nominatim не пройдет NOMINATIM_MIN_INTERVAL.
+    
+    В отличие от безусловной паузы, поток ждет только оставшуюся часть интервала,
+    а если запросов давно не было - не ждет вовсе.
+    """
+    global _nominatim_last_request
+    with _nominatim_lock:
+        wait = NOMINATIM_MIN_INTERVAL - (time.monotonic() - _nominatim_last_request)
+        if wait > 0:
+            time.sleep(wait)
+        _nominatim_last_request = time.monotonic()
+
+# Точность округления координат для кэша адресов: 4 знака после запятой - около 11 м.
+# Повторно отправленная из того же места геолокация отличается на несколько метров
+# и попадает в кэш, а адрес (улица и дом) на таком расстоянии обычно не меняется
+GEOCODE_CACHE_PRECISION = 4
+
+# Компоненты адреса Nominatim в порядке от более конкретного к более общему
+ADDRESS_KEYS = ("road", "house_number", "suburb", "city_district", "city")
+
+# Срок хранения адресов в базе (адреса меняются редко, но иногда уточняются в OSM)
+GEOCODE_CACHE_MAX_AGE_DAYS = 30
+
+# Кэш адресов в памяти: записи истекают через сутки, поэтому долго работающий бот
+# не отдает адреса намного старше срока хранения в базе
+GEOCODE_MEMORY_CACHE_TTL = 24 * 60 * 60
+_address_cache = TTLCache(GEOCODE_MEMORY_CACHE_TTL, 4096)
+
+def _reverse_geocode_cached(latitude: float, longitude: float) -> str:
+    """
+    Получение адреса по округленным координатам с кэшированием в памяти и в базе данных.
+    
+    Кэш в базе сохраняется между перезапусками бота. Неудачные запросы завершаются
+    исключением и поэтому не попадают ни в один из кэшей.
+    
+    Аргументы:
+        latitude: Широта (округленная)
+        longitude: Долгота (округленная)
+        
+    Возвращает:
+        Строку с адресом (пустую, если адрес не найден)
+    """
+    key = (latitude, longitude)
+    address = _address_cache.get(key)
+    if address is not None:
+        return address
+    
+    address = GeocodeRepository.get_address(latitude, longitude, GEOCODE_CACHE_MAX_AGE_DAYS)
+    if address is None:
+        address = _fetch_address(latitude, longitude)
+        GeocodeRepository.save_address(latitude, longitude, address)
+    _address_cache.put(key, address)
+    return address
+
+def _fetch_address(latitude: float, longitude: float) -> str:
+    """
+    Запрос адреса у Nominatim API.
+    
+    Аргументы:
+        latitude: Широта
+        longitude: Долгота
+        
+    Возвращает:
+        Строку с адресом (пустую, если адрес не найден)
+    """
+    # Соблюдаем лимит запросов к API (1 запрос в секунду)
+    _wait_for_nominatim_slot()
+    
+    # Параметры запроса к Nominatim API
+    params = {
+        "format": "json",
+        "lat": latitude,
+        "lon": longitude,
+        "zoom": 18,
+        "addressdetails": 1
+    }
+    
+    # Отправляем запрос через общую сессию (с таймаутами на соединение и чтение)
+    response = nominatim_session.get(NOMINATIM_REVERSE_URL, params=params, timeout=(3.05, 10))
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+    
+    # Получаем адрес из ответа
+    if "display_name" not in data:
+        return ""
     
-    # Вызываем нужный метод API с переданными параметрами
-    return api_method(**params)
+    # Полный адрес может быть слишком длинным, поэтому возьмем только основную информацию
+    address = data.get("address") or {}
+    address_parts = [value for value in map(address.get, ADDRESS_KEYS) if value]
+    
+    # Если не удалось получить детальный адрес, используем общее название
+    if not address_parts:
+        return data["display_name"]
+    
+    # Формируем строку адреса
+    return ", ".join(address_parts)
 
 def get_address_from_coordinates(latitude: float, longitude: float) -> str:
     """
     Получение адреса по координатам с использованием OpenStreetMap Nominatim API.
     
+    Адреса кэшируются по координатам, округленным до GEOCODE_CACHE_PRECISION знаков,
+    поэтому повторный запрос той же точки не ждет паузу и не обращается к сети.
+    
     Аргументы:
         latitude: Широта
         longitude: Долгота
@@ -308,54 +693,139 @@ def get_address_from_coordinates(latitude: float, longitude: float) -> str:
         Строку с адресом или пустую строку в случае ошибки
     """
     try:
-        # Добавляем задержку, чтобы не превысить лимит запросов к API (1 запрос в секунду)
-        time.sleep(1)
-        
-        # Формируем URL для запроса к Nominatim API
-        url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={latitude}&lon={longitude}&zoom=18&addressdetails=1"
-        
-        # Добавляем User-Agent, чтобы соответствовать требованиям Nominatim API
-        headers = {
-            "User-Agent": "MoodMapBot/1.0"
-        }
-        
-        # Отправляем запрос
-        response = requests.get(url, headers=headers)
-        
-        # Проверяем успешность запроса
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Получаем адрес из ответа
-            if "display_name" in data:
-                # Полный адрес может быть слишком длинным, поэтому возьмем только основную информацию
-                address_parts = []
-                address = data.get("address", {})
-                
-                # Собираем компоненты адреса в порядке от более конкретного к более общему
-                if "road" in address:
-                    address_parts.append(address["road"])
-                if "house_number" in address:
-                    address_parts.append(address["house_number"])
-                if "suburb" in address:
-                    address_parts.append(address["suburb"])
-                if "city_district" in address:
-                    address_parts.append(address["city_district"])
-                if "city" in address:
-                    address_parts.append(address["city"])
-                
-                # Если не удалось получить детальный адрес, используем общее название
-                if not address_parts and "display_name" in data:
-                    return data["display_name"]
-                
-                # Формируем строку адреса
-                return ", ".join(address_parts)
-        
-        return ""
-    except Exception as e:
-        logger.error(f"Ошибка при получении адреса: {e}")
+        return _reverse_geocode_cached(
+            round(latitude, GEOCODE_CACHE_PRECISION),
+            round(longitude, GEOCODE_CACHE_PRECISION)
+        )
+    except Exception:
+        logger.exception("Ошибка при получении адреса")
         return ""
 
+# Пул потоков для получения адреса параллельно с запросом к API
+# (запросы к самому Nominatim все равно выполняются не чаще NOMINATIM_MIN_INTERVAL)
+geocode_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='geocode')
+
+# Блокировки обработчиков по Telegram ID пользователя. Обработчики выполняются параллельно
+# в пуле потоков, но обновления одного пользователя (в том числе нажатия inline-кнопок вне
+# диалога) должны обрабатываться по порядку. Блокировка удаляется из словаря автоматически,
+# когда ее не удерживает ни один обработчик
+_user_locks = weakref.WeakValueDictionary()
+_user_locks_guard = threading.Lock()
+
+def serialized_per_user(handler):
+    """
+    Декоратор, выполняющий обработчик под блокировкой пользователя.
+    
+    Обработчики разных пользователей выполняются параллельно, а одного пользователя -
+    последовательно. Блокировка повторно входимая, поэтому обработчик может вызывать
+    другой обработчик с тем же декоратором.
+    
+    Аргументы:
+        handler: Функция-обработчик (update, context)
+    
+    Возвращает:
+        Обернутый обработчик
+    """
+    @functools.wraps(handler)
+    def wrapper(update: Update, context: CallbackContext):
+        user = update.effective_user
+        if user is None:
+            return handler(update, context)
+        with _user_locks_guard:
+            lock = _user_locks.get(user.id)
+            if lock is None:
+                lock = threading.RLock()
+                _user_locks[user.id] = lock
+        with lock:
+            return handler(update, context)
+    return wrapper
+
+def delete_message_in_background(context: CallbackContext, message, warning: str) -> None:
+    """
+    Удаление сообщения в пуле потоков диспетчера, не задерживая ответ пользователю.
+    
+    Аргументы:
+        context: Контекст диалога
+        message: Сообщение для удаления
+        warning: Текст предупреждения в журнале, если удалить сообщение не удалось
+    """
+    def delete():
+        try:
+            message.delete()
+        except TelegramError:
+            # Сообщение могло быть уже удалено или слишком старым
+            logger.warning(warning)
+    
+    context.dispatcher.run_async(delete)
+
+def answer_callback_query(query) -> None:
+    """
+    Подтверждение нажатия inline-кнопки до начала обработки.
+    
+    Telegram показывает на кнопке индикатор загрузки, пока бот не ответит на запрос,
+    поэтому отвечаем сразу, а не после запросов к API и базе данных.
+    
+    Аргументы:
+        query: Callback-запрос от Telegram
+    """
+    try:
+        query.answer()
+    except TelegramError as e:
+        # Слишком старый запрос подтвердить нельзя, но обработать его все равно нужно
+        logger.warning("Не удалось подтвердить callback-запрос: %s", e)
+
+# Задержка (в секундах), после которой пользователю показывается сообщение о ходе обработки
+PROCESSING_MESSAGE_DELAY = 0.7
+
+class DelayedStatusMessage:
+    """
+    Сообщение о ходе обработки, которое отправляется только при долгой обработке.
+    
+    Если finish() вызван до истечения задержки, сообщение не отправляется вовсе,
+    иначе отправленное сообщение удаляется.
+    """
+    def __init__(self, message, text: str, delay: float = PROCESSING_MESSAGE_DELAY):
+        """
+        Запуск таймера отправки сообщения.
+        
+        Аргументы:
+            message: Сообщение пользователя, в чат которого отправляется статус
+            text: Текст сообщения о ходе обработки
+            delay: Задержка перед отправкой в секундах
+        """
+        self._message = message
+        self._text = text
+        self._lock = threading.Lock()
+        self._sent_message = None
+        self._finished = False
+        self._timer = threading.Timer(delay, self._send)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def _send(self) -> None:
+        """Отправка сообщения о ходе обработки (вызывается таймером)."""
+        with self._lock:
+            if self._finished:
+                return
+            try:
+                self._sent_message = self._message.reply_text(self._text, reply_markup=ReplyKeyboardRemove())
+            except TelegramError as e:
+                logger.warning("Не удалось отправить сообщение о ходе обработки: %s", e)
+    
+    def finish(self) -> None:
+        """Отмена отправки или удаление уже отправленного сообщения. Повторные вызовы ничего не делают."""
+        self._timer.cancel()
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            sent_message = self._sent_message
+        if sent_message is not None:
+            try:
+                sent_message.delete()
+            except TelegramError:
+                logger.warning("Не удалось удалить сообщение о ходе обработки")
+
 # Обработчики команд
 def start(update: Update, context: CallbackContext) -> int:
     """
@@ -411,12 +881,8 @@ def start(update: Update, context: CallbackContext) -> int:
                 last_name=user.last_name
             )
         
-        # Запрашиваем номер телефона с помощью специальной клавиатуры
-        keyboard = [
-            [KeyboardButton("📱 Отправить номер телефона", request_contact=True)]  # Кнопка запроса контакта
-        ]
-        # Создаем клавиатуру с кнопкой запроса контакта
-        reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
+        # Запрашиваем номер телефона с помощью специальной клавиатуры с кнопкой запроса контакта
+        reply_markup = _PHONE_MARKUP
         
         # Отправляем приветственное сообщение и запрашиваем номер телефона
         update.message.reply_text(
@@ -427,9 +893,9 @@ def start(update: Update, context: CallbackContext) -> int:
         
         # Возвращаем следующее состояние диалога - PHONE_NUMBER
         return PHONE_NUMBER
-    except Exception as e:
+    except Exception:
         # Обрабатываем возможные ошибки
-        logger.error(f"Ошибка в обработчике start: {e}")
+        logger.exception("Ошибка в обработчике start")
         update.message.reply_text(
             "Произошла ошибка при запуске бота. Пожалуйста, попробуйте позже или свяжитесь с администратором.",
             reply_markup=ReplyKeyboardRemove()  # Удаляем клавиатуру
@@ -454,7 +920,7 @@ def phone_number(update: Update, context: CallbackContext) -> int:
         user = update.effective_user  # Получаем информацию о пользователе
         
         # Проверяем, есть ли в сообщении контакт или текст (но не кнопка "Отправить номер телефона")
-        if update.message.contact or (update.message.text and update.message.text != "📱 Отправить номер телефона"):
+        if update.message.contact or (update.message.text and update.message.text != BTN_SEND_PHONE):
             # Получаем номер телефона из контакта или текста сообщения
             if update.message.contact:
                 phone_number = update.message.contact.phone_number  # Из объекта контакта
@@ -464,10 +930,7 @@ def phone_number(update: Update, context: CallbackContext) -> int:
                 
             # Пытаемся удалить сообщение с контактом для безопасности
             # (чтобы номер телефона не оставался в истории чата)
-            try:
-                update.message.delete()
-            except:
-                logger.warning("Не удалось удалить сообщение с номером телефона")
+            delete_message_in_background(context, update.message, "Не удалось удалить сообщение с номером телефона")
             
             # Нормализуем номер телефона (убираем все лишние символы: скобки, дефисы, пробелы)
             phone_number = normalize_phone_number(phone_number)
@@ -477,8 +940,7 @@ def phone_number(update: Update, context: CallbackContext) -> int:
                 # Если номер некорректный, запрашиваем его снова
                 update.message.reply_text(
                     "Пожалуйста, введите корректный номер телефона. Он должен содержать не менее 10 цифр.",
-                    reply_markup=ReplyKeyboardMarkup([[KeyboardButton("📱 Отправить номер телефона", request_contact=True)]],
-                                                   resize_keyboard=True, one_time_keyboard=True)
+                    reply_markup=_PHONE_MARKUP
                 )
                 return PHONE_NUMBER  # Возвращаемся в состояние ожидания ввода номера телефона
             
@@ -491,11 +953,10 @@ def phone_number(update: Update, context: CallbackContext) -> int:
                 phone_number=phone_number
             )
             
-            # Проверяем, существует ли пользователь в API
-            # Отправляем запрос на регистрацию без пароля и проверяем код ответа
-            # Если ответ содержит ошибку "уже существует", значит пользователь существует
-            response = api_client.register_user(phone_number)
-            user_exists = isinstance(response, dict) and 'error' in response and 'уже существует' in response.get('error', '')
+            # Проверяем, существует ли пользователь в API.
+            # Если проверить не удалось, считаем пользователя новым: при регистрации
+            # существующего номера обработчик password сам попробует войти с паролем
+            user_exists = api_client.user_exists(phone_number)
             
             if user_exists:
                 # Если пользователь существует, запрашиваем пароль для входа
@@ -521,13 +982,12 @@ def phone_number(update: Update, context: CallbackContext) -> int:
             # Если пользователь не отправил контакт или ввел текст кнопки, запрашиваем снова
             update.message.reply_text(
                 "Пожалуйста, поделитесь своим номером телефона, используя кнопку ниже или введите его вручную.",
-                reply_markup=ReplyKeyboardMarkup([[KeyboardButton("📱 Отправить номер телефона", request_contact=True)]],
-                                                resize_keyboard=True, one_time_keyboard=True)
+                reply_markup=_PHONE_MARKUP
             )
             return PHONE_NUMBER  # Остаемся в состоянии ожидания ввода номера телефона
-    except Exception as e:
+    except Exception:
         # Обрабатываем возможные ошибки
-        logger.error(f"Ошибка в обработчике phone_number: {e}")
+        logger.exception("Ошибка в обработчике phone_number")
         update.message.reply_text(
             "Произошла ошибка при обработке номера телефона. Пожалуйста, попробуйте позже.",
             reply_markup=ReplyKeyboardRemove()  # Удаляем клавиатуру
@@ -541,11 +1001,8 @@ def password(update: Update, context: CallbackContext) -> int:
         entered_password = update.message.text
         phone_number = context.user_data.get('phone_number')
         
-        # Delete message with password for security
-        try:
-            update.message.delete()
-        except:
-            logger.warning("Could not delete password message")
+        # Delete message with password for security (in background, the reply does not wait for it)
+        delete_message_in_background(context, update.message, "Could not delete password message")
         
         if not phone_number:
             update.message.reply_text(
@@ -557,71 +1014,71 @@ def password(update: Update, context: CallbackContext) -> int:
         # Check if this is a new user registration or login
         is_new_user = context.user_data.get('is_new_user', False)
         
-        # Информируем пользователя о процессе
-        processing_message = update.message.reply_text(
-            "Обрабатываю ваш запрос...",
-            reply_markup=ReplyKeyboardRemove()
-        )
+        # Информируем пользователя о процессе, только если запрос к API затянулся:
+        # обычно вход занимает доли секунды, и достаточно одного итогового ответа
+        processing_message = DelayedStatusMessage(update.message, "Обрабатываю ваш запрос...")
+        success_text = "Спасибо! Вы успешно авторизованы."
         
-        if is_new_user:
-            # Register new user
-            response = api_client.register_user(phone_number, entered_password)
-            
-            if 'error' in response:
-                # Если при регистрации произошла ошибка
-                if 'уже существует' in response.get('error', ''):
-                    # Если пользователь существует, попробуем войти с введенным паролем
-                    login_response = api_client.login_user(phone_number, entered_password)
+        try:
+            if is_new_user:
+                # Register new user
+                response = api_client.register_user(phone_number, entered_password)
+                
+                if 'error' in response:
+                    # Если при регистрации произошла ошибка
+                    if 'уже существует' in response.get('error', ''):
+                        # Если пользователь существует, попробуем войти с введенным паролем
+                        login_response = api_client.login_user(phone_number, entered_password)
+                        
+                        if 'error' not in login_response:
+                            # Если вход удался, обрабатываем как успешный вход и уведомляем пользователя
+                            response = login_response
+                            success_text = (
+                                "Пользователь с таким номером уже существует, вход выполнен с указанным паролем. "
+                                + success_text
+                            )
+                        else:
+                            # Если и вход не удался
+                            processing_message.finish()
+                            update.message.reply_text(
+                                f"Пользователь с таким номером телефона уже существует, но указанный пароль неверный. "
+                                f"Пожалуйста, введите правильный пароль или начните сначала с /start",
+                                reply_markup=ReplyKeyboardRemove()
+                            )
+                            return PASSWORD
+                    else:
+                        # Другие ошибки регистрации
+                        processing_message.finish()
+                        update.message.reply_text(
+                            f"Ошибка при регистрации: {response['error']}. Пожалуйста, попробуйте снова или начните сначала с /start",
+                            reply_markup=ReplyKeyboardRemove()
+                        )
+                        return PASSWORD
+            else:
+                # Login existing user
+                response = api_client.login_user(phone_number, entered_password)
+                
+                if 'error' in response:
+                    # Если при входе произошла ошибка
+                    processing_message.finish()
                     
-                    if 'error' not in login_response:
-                        # Если вход удался, обрабатываем как успешный вход
-                        response = login_response
-                        # Уведомляем пользователя
-                        processing_message.edit_text(
-                            "Пользователь с таким номером уже существует. Пробую войти с указанным паролем..."
+                    if 'Неверные учетные данные' in response.get('error', ''):
+                        # Если неверный пароль
+                        update.message.reply_text(
+                            "Неверный пароль. Пожалуйста, попробуйте еще раз:",
+                            reply_markup=ReplyKeyboardRemove()
                         )
+                        return PASSWORD
                     else:
-                        # Если и вход не удался
-                        processing_message.delete()
+                        # Другие ошибки входа
                         update.message.reply_text(
-                            f"Пользователь с таким номером телефона уже существует, но указанный пароль неверный. "
-                            f"Пожалуйста, введите правильный пароль или начните сначала с /start",
+                            f"Ошибка при входе: {response['error']}. Пожалуйста, попробуйте снова или начните сначала с /start",
                             reply_markup=ReplyKeyboardRemove()
                         )
                         return PASSWORD
-                else:
-                    # Другие ошибки регистрации
-                    processing_message.delete()
-                    update.message.reply_text(
-                        f"Ошибка при регистрации: {response['error']}. Пожалуйста, попробуйте снова или начните сначала с /start",
-                        reply_markup=ReplyKeyboardRemove()
-                    )
-                    return PASSWORD
-        else:
-            # Login existing user
-            response = api_client.login_user(phone_number, entered_password)
-            
-            if 'error' in response:
-                # Если при входе произошла ошибка
-                processing_message.delete()
-                
-                if 'Неверные учетные данные' in response.get('error', ''):
-                    # Если неверный пароль
-                    update.message.reply_text(
-                        "Неверный пароль. Пожалуйста, попробуйте еще раз:",
-                        reply_markup=ReplyKeyboardRemove()
-                    )
-                    return PASSWORD
-                else:
-                    # Другие ошибки входа
-                    update.message.reply_text(
-                        f"Ошибка при входе: {response['error']}. Пожалуйста, попробуйте снова или начните сначала с /start",
-                        reply_markup=ReplyKeyboardRemove()
-                    )
-                    return PASSWORD
-        
-        # Если все прошло успешно, сохраняем данные пользователя
-        processing_message.delete()
+        finally:
+            # Если сообщение о процессе было отправлено, удаляем его
+            processing_message.finish()
         
         # Save API user ID in local database
         UserRepository.update_user(
@@ -634,6 +1091,9 @@ def password(update: Update, context: CallbackContext) -> int:
         
         # Сохраняем пароль для API-запросов в контексте сессии
         context.user_data['api_password'] = entered_password
+        # Учетные данные только что подтверждены сервером, повторный вход не нужен
+        remember_api_login(user.id, phone_number, entered_password)
+        _no_credentials_cache.pop(user.id)
         
         # Clear user_data except for API password
         api_password = context.user_data.get('api_password')
@@ -641,79 +1101,104 @@ def password(update: Update, context: CallbackContext) -> int:
         context.user_data['api_password'] = api_password
         
         update.message.reply_text(
-            "Спасибо! Вы успешно авторизованы.",
+            success_text,
             reply_markup=get_main_menu_keyboard()
         )
         return MAIN_MENU
     except Exception as e:
-        logger.error(f"Error in password handler: {e}")
+        logger.exception("Error in password handler")
         update.message.reply_text(
             f"Произошла ошибка при обработке пароля: {str(e)}. Пожалуйста, попробуйте позже.",
             reply_markup=ReplyKeyboardRemove()
         )
         return ConversationHandler.END
 
+# Пункты главного меню, после которых бот задает вопрос и переходит в новое состояние:
+# текст кнопки -> (текст ответа, функция клавиатуры от telegram_id, следующее состояние)
+_MAIN_MENU_ROUTES = {
+    "📝 Создать метку настроения": (
+        "Выберите эмодзи, который отражает ваше настроение:",
+        lambda telegram_id: get_emoji_keyboard(), MOOD_EMOJI
+    ),
+    "🔍 Настроение вокруг меня": (
+        "Отправьте свою геолокацию, чтобы узнать настроение вокруг вас:",
+        get_location_keyboard, AREA_MOOD
+    ),
+    "📊 Тренды": (
+        "Отправьте свою геолокацию, чтобы узнать тренды настроений в вашем районе:",
+        get_location_keyboard, TRENDS
+    ),
+    "🎭 События": (
+        "Отправьте свою геолокацию, чтобы узнать о событиях в вашем районе:",
+        get_location_keyboard, EVENTS
+    ),
+}
+
 def main_menu(update: Update, context: CallbackContext) -> int:
     """Handle main menu selection."""
     try:
         text = update.message.text
         user = update.effective_user
         
-        if text == "📝 Создать метку настроения":
-            update.message.reply_text(
-                "Выберите эмодзи, который отражает ваше настроение:",
-                reply_markup=get_emoji_keyboard()
-            )
-            return MOOD_EMOJI
-        elif text == "👤 Профиль":
+        if text == "👤 Профиль":
             return profile(update, context)
-        elif text == "🔍 Настроение вокруг меня":
-            update.message.reply_text(
-                "Отправьте свою геолокацию, чтобы узнать настроение вокруг вас:",
-                reply_markup=get_location_keyboard(user.id)
-            )
-            return AREA_MOOD
-        elif text == "📊 Тренды":
-            update.message.reply_text(
-                "Отправьте свою геолокацию, чтобы узнать тренды настроений в вашем районе:",
-                reply_markup=get_location_keyboard(user.id)
-            )
-            return TRENDS
-        elif text == "🎭 События":
-            update.message.reply_text(
-                "Отправьте свою геолокацию, чтобы узнать о событиях в вашем районе:",
-                reply_markup=get_location_keyboard(user.id)
-            )
-            return EVENTS
-        else:
+        
+        route = _MAIN_MENU_ROUTES.get(text)
+        if route is None:
             update.message.reply_text(
                 "Пожалуйста, выберите опцию из меню:",
                 reply_markup=get_main_menu_keyboard()
             )
             return MAIN_MENU
-    except Exception as e:
-        logger.error(f"Error in main_menu handler: {e}")
+        
+        reply_text, keyboard_factory, next_state = route
+        update.message.reply_text(reply_text, reply_markup=keyboard_factory(user.id))
+        return next_state
+    except Exception:
+        logger.exception("Error in main_menu handler")
         update.message.reply_text(
             "Произошла ошибка при обработке выбора меню. Пожалуйста, попробуйте позже или свяжитесь с администратором.",
             reply_markup=get_main_menu_keyboard()
         )
         return MAIN_MENU
 
+class MoodDraft:
+    """
+    Создаваемая метка настроения, хранится в context.user_data под одним ключом.
+    """
+    __slots__ = ('emoji', 'text')
+    
+    def __init__(self, emoji: str = '😐', text: str = ''):
+        """
+        Аргументы:
+            emoji: Выбранный эмодзи
+            text: Комментарий к настроению
+        """
+        self.emoji = emoji
+        self.text = text
+
+def get_mood_draft(context: CallbackContext) -> MoodDraft:
+    """Получение черновика метки из контекста (создается, если его еще нет)."""
+    draft = context.user_data.get('mood_draft')
+    if draft is None:
+        draft = context.user_data['mood_draft'] = MoodDraft()
+    return draft
+
 def mood_emoji(update: Update, context: CallbackContext) -> int:
     """Handle emoji selection for mood."""
     try:
         text = update.message.text
         
-        if text == "❌ Отмена":
+        if text == BTN_CANCEL:
             update.message.reply_text(
                 "Создание метки настроения отменено.",
                 reply_markup=get_main_menu_keyboard()
             )
             return MAIN_MENU
         
-        if text in EMOJI_OPTIONS:
+        if text in EMOJI_SET:
             # Save selected emoji
-            context.user_data['mood_emoji'] = text
+            context.user_data['mood_draft'] = MoodDraft(emoji=text)
             
             update.message.reply_text(
                 "Отлично! Теперь добавьте комментарий к вашему настроению (или отправьте /skip, чтобы пропустить):",
@@ -726,8 +1211,8 @@ def mood_emoji(update: Update, context: CallbackContext) -> int:
                 reply_markup=get_emoji_keyboard()
             )
             return MOOD_EMOJI
-    except Exception as e:
-        logger.error(f"Error in mood_emoji handler: {e}")
+    except Exception:
+        logger.exception("Error in mood_emoji handler")
         update.message.reply_text(
             "Произошла ошибка при обработке выбора эмодзи. Пожалуйста, попробуйте позже или свяжитесь с администратором.",
             reply_markup=get_emoji_keyboard()
@@ -738,15 +1223,15 @@ def skip_mood_text(update: Update, context: CallbackContext) -> int:
     """Skip adding text to mood."""
     try:
         user = update.effective_user
-        context.user_data['mood_text'] = ""
+        get_mood_draft(context).text = ""
         
         update.message.reply_text(
             "Отправьте свою геолокацию, чтобы привязать метку настроения к месту:",
             reply_markup=get_location_keyboard(user.id)
         )
         return MOOD_LOCATION
-    except Exception as e:
-        logger.error(f"Error in skip_mood_text handler: {e}")
+    except Exception:
+        logger.exception("Error in skip_mood_text handler")
         update.message.reply_text(
             "Произошла ошибка при обработке команды /skip. Пожалуйста, попробуйте позже или свяжитесь с администратором.",
             reply_markup=get_location_keyboard(update.effective_user.id)
@@ -763,122 +1248,321 @@ def mood_text(update: Update, context: CallbackContext) -> int:
             return skip_mood_text(update, context)
         
         # Save mood text
-        context.user_data['mood_text'] = text
+        get_mood_draft(context).text = text
         
         update.message.reply_text(
             "Отлично! Теперь отправьте свою геолокацию, чтобы привязать метку настроения к месту:",
             reply_markup=get_location_keyboard(user.id)
         )
         return MOOD_LOCATION
-    except Exception as e:
-        logger.error(f"Error in mood_text handler: {e}")
+    except Exception:
+        logger.exception("Error in mood_text handler")
         update.message.reply_text(
             "Произошла ошибка при обработке текста настроения. Пожалуйста, попробуйте позже или свяжитесь с администратором.",
             reply_markup=get_location_keyboard(update.effective_user.id)
         )
         return MOOD_LOCATION
 
-def mood_location(update: Update, context: CallbackContext) -> int:
-    """Store location and create a new mood."""
-    try:
-        user = update.effective_user
-        emoji = context.user_data.get('mood_emoji', '😐')
-        text = context.user_data.get('mood_text', '')
-        
-        # Используем обновленный метод для создания настроения
-        if update.message.location:
-            # Если пользователь отправил геолокацию
-            latitude = update.message.location.latitude
-            longitude = update.message.location.longitude
-            
-            # Обновляем местоположение пользователя и время последней метки
-            UserRepository.update_mood_location_time(user.id, latitude, longitude)
-            
-            response = create_mood_with_api(user.id, emoji, latitude, longitude, text, context)
-            
-            if 'error' in response:
-                update.message.reply_text(
-                    f"Ошибка при создании настроения: {response['error']}",
-                    reply_markup=get_main_menu_keyboard()
-                )
-            else:
-                update.message.reply_text(
-                    "Ваше настроение успешно записано! 👍",
-                    reply_markup=get_main_menu_keyboard()
-                )
-                
-            # Очищаем данные настроения
-            context.user_data.pop('mood_emoji', None)
-            context.user_data.pop('mood_text', None)
-            
-            return MAIN_MENU
-        elif update.message.text == "🔄 Последняя геолокация":
-            # Если пользователь выбрал использовать последнюю геолокацию
-            location = UserRepository.get_user_location(user.id)
-            
-            if not location:
-                update.message.reply_text(
-                    "Не удалось найти вашу последнюю геолокацию. Пожалуйста, отправьте геолокацию.",
-                    reply_markup=get_location_keyboard(user.id)
-                )
-                return MOOD_LOCATION
-                
-            latitude = location['latitude']
-            longitude = location['longitude']
-            
-            # Обновляем только время последней метки, координаты оставляем те же
-            UserRepository.update_mood_location_time(user.id)
-            
-            response = create_mood_with_api(user.id, emoji, latitude, longitude, text, context)
-            
-            if 'error' in response:
-                update.message.reply_text(
-                    f"Ошибка при создании настроения: {response['error']}",
-                    reply_markup=get_main_menu_keyboard()
-                )
-            else:
-                update.message.reply_text(
-                    "Ваше настроение успешно записано с использованием последней метки! 👍",
-                    reply_markup=get_main_menu_keyboard()
-                )
-                
-            # Очищаем данные настроения
-            context.user_data.pop('mood_emoji', None)
-            context.user_data.pop('mood_text', None)
-            
-            return MAIN_MENU
-        elif update.message.text == "❌ Отмена":
-            update.message.reply_text(
-                "Создание метки настроения отменено.",
-                reply_markup=get_main_menu_keyboard()
-            )
-            # Очищаем данные настроения
-            context.user_data.pop('mood_emoji', None)
-            context.user_data.pop('mood_text', None)
-            return MAIN_MENU
-        else:
-            update.message.reply_text(
-                "Пожалуйста, отправьте свое местоположение, используя кнопку ниже.",
-                reply_markup=get_location_keyboard(user.id)
-            )
-            return MOOD_LOCATION
-    except Exception as e:
-        logger.error(f"Error in mood_location handler: {e}")
+def resolve_request_location(update: Update, telegram_id: int,
+                             refresh_last_location: bool = True) -> Optional[Tuple[float, float, bool]]:
+    """
+    Определение координат запроса по присланной геолокации или последней сохраненной метке.
+    
+    Присланные координаты сохраняются вместе со временем метки, а при выборе
+    последней геолокации обновляется только время метки.
+    
+    Аргументы:
+        update: Объект с данными от Telegram
+        telegram_id: ID пользователя в Telegram
+        refresh_last_location: Обновлять ли время метки при выборе последней геолокации
+    
+    Возвращает:
+        Кортеж (широта, долгота, признак последней геолокации) или None,
+        если последняя геолокация не найдена
+    """
+    if update.message.location:
+        latitude = update.message.location.latitude
+        longitude = update.message.location.longitude
+        
+        # Обновляем местоположение пользователя для отслеживания событий
+        UserRepository.update_mood_location_time(telegram_id, latitude, longitude)
+        return latitude, longitude, False
+    
+    # Если пользователь выбрал использовать последнюю геолокацию
+    location = UserRepository.get_user_location(telegram_id)
+    if not location:
+        return None
+    
+    if refresh_last_location:
+        # Обновляем время последней метки, координаты оставляем те же
+        UserRepository.update_mood_location_time(telegram_id)
+    return location['latitude'], location['longitude'], True
+
+def _create_mood_at_request_location(update: Update, context: CallbackContext) -> int:
+    """Создание метки настроения по присланной геолокации или последней сохраненной метке."""
+    user = update.effective_user
+    request_location = resolve_request_location(update, user.id)
+    if request_location is None:
+        update.message.reply_text(
+            MSG_NO_LAST_LOCATION,
+            reply_markup=get_location_keyboard(user.id)
+        )
+        return MOOD_LOCATION
+    latitude, longitude, from_last_location = request_location
+    
+    draft = context.user_data.get('mood_draft') or MoodDraft()
+    response = create_mood_with_api(user.id, draft.emoji, latitude, longitude, draft.text, context)
+    
+    if 'error' in response:
+        update.message.reply_text(
+            f"Ошибка при создании настроения: {response['error']}",
+            reply_markup=get_main_menu_keyboard()
+        )
+    else:
+        update.message.reply_text(
+            "Ваше настроение успешно записано с использованием последней метки! 👍" if from_last_location
+            else "Ваше настроение успешно записано! 👍",
+            reply_markup=get_main_menu_keyboard()
+        )
+        
+    # Очищаем данные настроения
+    context.user_data.pop('mood_draft', None)
+    
+    return MAIN_MENU
+
+def _cancel_mood_creation(update: Update, context: CallbackContext) -> int:
+    """Отмена создания метки настроения."""
+    update.message.reply_text(
+        "Создание метки настроения отменено.",
+        reply_markup=get_main_menu_keyboard()
+    )
+    # Очищаем данные настроения
+    context.user_data.pop('mood_draft', None)
+    return MAIN_MENU
+
+# Действия для кнопок в состоянии MOOD_LOCATION (геолокация обрабатывается отдельно)
+_MOOD_LOCATION_ACTIONS = {
+    BTN_LAST_LOCATION: _create_mood_at_request_location,
+    BTN_CANCEL: _cancel_mood_creation,
+}
+
+@serialized_per_user
+def mood_location(update: Update, context: CallbackContext) -> int:
+    """Store location and create a new mood."""
+    try:
+        if update.message.location:
+            return _create_mood_at_request_location(update, context)
+        
+        action = _MOOD_LOCATION_ACTIONS.get(update.message.text)
+        if action is not None:
+            return action(update, context)
+        
+        update.message.reply_text(
+            "Пожалуйста, отправьте свое местоположение, используя кнопку ниже.",
+            reply_markup=get_location_keyboard(update.effective_user.id)
+        )
+        return MOOD_LOCATION
+    except Exception:
+        logger.exception("Error in mood_location handler")
         update.message.reply_text(
             "Произошла ошибка при создании настроения. Пожалуйста, попробуйте позже.",
             reply_markup=get_main_menu_keyboard()
         )
         return MAIN_MENU
 
+# Количество меток настроения на одной странице профиля
+PROFILE_PAGE_SIZE = 5
+
+# Префиксы callback_data кнопок профиля (Telegram ограничивает callback_data 64 байтами):
+# удаление метки - "d" и ID метки в шестнадцатеричном виде, навигация - номер нужной страницы
+CB_DELETE_MOOD = "d"
+CB_PROFILE_PAGE = "profile_page_"
+
+# Последняя показанная страница профиля: {telegram_id: (номер страницы, метки, общее количество)}.
+# Обработчики сохраняют страницу после показа, а после удаления метки она перерисовывается
+# из кэша без повторного запроса к API
+PROFILE_PAGE_CACHE_TTL = 60
+_profile_page_cache = TTLCache(PROFILE_PAGE_CACHE_TTL, 10000)
+
+def fetch_profile_page(telegram_id: int, api_user_id: int, page: int, context=None):
+    """
+    Получение одной страницы меток настроения пользователя через API.
+    
+    Если запрошенная страница больше последней (например, после удаления меток),
+    возвращается последняя страница.
+    
+    Аргументы:
+        telegram_id: ID пользователя в Telegram
+        api_user_id: ID пользователя в API
+        page: Номер страницы (начиная с 1)
+        context: Контекст диалога с паролем
+    
+    Возвращает:
+        APIResult с кортежем (метки страницы, общее количество меток, номер страницы) или ошибкой
+    """
+    page = max(page, 1)
+    response = get_api_data_with_auth(
+        telegram_id,
+        api_client.get_user_moods_page,
+        context,
+        user_id=api_user_id,
+        limit=PROFILE_PAGE_SIZE,
+        offset=(page - 1) * PROFILE_PAGE_SIZE
+    )
+    if response.error:
+        return response
+    
+    result = response.data
+    total = result['total']
+    last_page = max((total + PROFILE_PAGE_SIZE - 1) // PROFILE_PAGE_SIZE, 1)
+    if page > last_page and total:
+        return fetch_profile_page(telegram_id, api_user_id, last_page, context)
+    return APIResult((result['items'], total, page), None)
+
+# Пул потоков для фоновой загрузки следующей страницы профиля
+prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='prefetch')
+
+def prefetch_profile_page(telegram_id: int, api_user_id: int, page: int, context: CallbackContext) -> None:
+    """
+    Фоновая загрузка страницы профиля, которую пользователь, скорее всего, откроет следующей.
+    
+    Аргументы:
+        telegram_id: ID пользователя в Telegram
+        api_user_id: ID пользователя в API
+        page: Номер загружаемой страницы
+        context: Контекст диалога с паролем
+    """
+    future = prefetch_executor.submit(fetch_profile_page, telegram_id, api_user_id, page, context)
+    context.user_data['_profile_prefetch'] = (page, time.monotonic(), future)
+
+def take_prefetched_profile_page(context: CallbackContext, page: int) -> Optional[APIResult]:
+    """
+    Получение заранее загруженной страницы профиля.
+    
+    Аргументы:
+        context: Контекст диалога
+        page: Номер нужной страницы
+    
+    Возвращает:
+        APIResult со страницей или None, если нужной страницы нет, она устарела
+        или загрузилась с ошибкой (тогда страницу нужно запросить заново)
+    """
+    prefetched = context.user_data.pop('_profile_prefetch', None)
+    if prefetched is None:
+        return None
+    
+    prefetched_page, started_at, future = prefetched
+    if prefetched_page != page or time.monotonic() - started_at > PROFILE_PAGE_CACHE_TTL:
+        future.cancel()
+        return None
+    
+    try:
+        result = future.result()
+    except Exception:
+        logger.exception("Ошибка при фоновой загрузке страницы профиля")
+        return None
+    return None if result.error else result
+
+def remove_mood_from_cached_page(telegram_id: int, mood_id: int, page: int):
+    """
+    Удаление метки из сохраненной страницы профиля.
+    
+    Аргументы:
+        telegram_id: ID пользователя в Telegram
+        mood_id: ID удаленной метки
+        page: Номер страницы, с которой удалена метка
+    
+    Возвращает:
+        Кортеж (метки страницы, общее количество меток, номер страницы) или None,
+        если страницу нужно заново получить через API
+    """
+    cached = _profile_page_cache.get(telegram_id)
+    if cached is None or cached[0] != page:
+        return None
+    
+    _, items, total = cached
+    remaining = [mood for mood in items if mood['id'] != mood_id]
+    if len(remaining) == len(items) or (not remaining and total > 1):
+        # Метки не было на странице или страница опустела - показываем актуальные данные
+        _profile_page_cache.pop(telegram_id)
+        return None
+    
+    _profile_page_cache.put(telegram_id, (page, remaining, total - 1))
+    return remaining, total - 1, page
+
+@functools.lru_cache(maxsize=4096)
+def format_mood_timestamp(timestamp: str) -> str:
+    """
+    Преобразование времени метки из ISO-формата API в вид ДД.ММ.ГГГГ ЧЧ:ММ.
+    
+    Аргументы:
+        timestamp: Время метки в ISO-формате (с суффиксом Z или смещением)
+    
+    Возвращает:
+        Отформатированное время
+    """
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).strftime("%d.%m.%Y %H:%M")
+
+def build_profile_page(page_moods: List[Dict[str, Any]], total_moods: int, current_page: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """
+    Формирование текста и клавиатуры страницы профиля.
+    
+    Аргументы:
+        page_moods: Метки настроения текущей страницы
+        total_moods: Общее количество меток пользователя
+        current_page: Номер текущей страницы (с 1)
+    
+    Возвращает:
+        Кортеж (текст сообщения в формате HTML, клавиатура страницы)
+    """
+    # Рассчитываем общее количество страниц
+    total_pages = (total_moods + PROFILE_PAGE_SIZE - 1) // PROFILE_PAGE_SIZE
+    
+    # Номер первой метки на текущей странице
+    start_idx = (current_page - 1) * PROFILE_PAGE_SIZE
+    
+    # Создаем сообщение с настроениями текущей страницы и кнопки для их удаления за один проход
+    parts = [f"📊 <b>Ваши метки настроения (страница {current_page}/{total_pages}):</b>\n\n"]
+    keyboard = []
+    
+    for i, mood in enumerate(page_moods, start_idx + 1):
+        emoji = mood['emoji']
+        text = mood['text'] if mood['text'] else "[без комментария]"
+        formatted_time = format_mood_timestamp(mood['timestamp'])
+        
+        parts.append(f"{i}. {emoji} {text}\n   {formatted_time}\n\n")
+        keyboard.append([
+            InlineKeyboardButton(
+                f"Удалить {emoji} от {formatted_time}",
+                callback_data=f"{CB_DELETE_MOOD}{mood['id']:x}"
+            )
+        ])
+    
+    # Кнопки навигации по страницам
+    nav_buttons = []
+    
+    if current_page > 1:
+        nav_buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"{CB_PROFILE_PAGE}{current_page - 1}"))
+    
+    if current_page < total_pages:
+        nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"{CB_PROFILE_PAGE}{current_page + 1}"))
+        
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+        
+    keyboard.append([InlineKeyboardButton("Назад в меню", callback_data="profile_back")])
+    
+    return "".join(parts), InlineKeyboardMarkup(keyboard)
+
+@serialized_per_user
 def profile(update: Update, context: CallbackContext) -> int:
     """Show user profile and moods."""
     try:
         user = update.effective_user
-        api_user_id, _ = get_user_api_credentials(user.id)
+        api_user_id, _ = get_user_api_credentials(user.id, get_user_row(user.id, context))
         
         # Получаем текущую страницу из контекста или устанавливаем 1 по умолчанию
         current_page = context.user_data.get('profile_page', 1)
-        items_per_page = 5  # Количество меток на одной странице
         
         if not api_user_id:
             update.message.reply_text(
@@ -887,108 +1571,60 @@ def profile(update: Update, context: CallbackContext) -> int:
             )
             return MAIN_MENU
         
-        # Получаем все настроения пользователя через API (без ограничения по времени)
-        moods = get_api_data_with_auth(
-            user.id, 
-            api_client.get_user_moods,
-            context,
-            user_id=api_user_id
-        )
+        # Получаем через API только метки текущей страницы и их общее количество
+        page_result = fetch_profile_page(user.id, api_user_id, current_page, context)
         
-        if isinstance(moods, dict) and 'error' in moods:
+        if page_result.error:
             update.message.reply_text(
-                f"Ошибка при получении настроений: {moods['error']}",
+                f"Ошибка при получении настроений: {page_result.error}",
                 reply_markup=get_main_menu_keyboard()
             )
             return MAIN_MENU
         
-        if not moods:
+        page_moods, total_moods, current_page = page_result.data
+        if not total_moods:
             update.message.reply_text(
                 "У вас пока нет меток настроения. Создайте первую метку в главном меню!",
                 reply_markup=get_main_menu_keyboard()
             )
             return MAIN_MENU
         
-        # Рассчитываем общее количество страниц
-        total_pages = (len(moods) + items_per_page - 1) // items_per_page
-        
-        # Проверяем корректность текущей страницы
-        if current_page < 1:
-            current_page = 1
-        elif current_page > total_pages:
-            current_page = total_pages
-            
         # Сохраняем текущую страницу в контексте
         context.user_data['profile_page'] = current_page
         
-        # Вычисляем индексы для текущей страницы
-        start_idx = (current_page - 1) * items_per_page
-        end_idx = min(start_idx + items_per_page, len(moods))
-        
-        # Создаем сообщение с настроениями текущей страницы
-        message = f"📊 <b>Ваши метки настроения (страница {current_page}/{total_pages}):</b>\n\n"
-        
-        for i, mood in enumerate(moods[start_idx:end_idx], start_idx + 1):
-            emoji = mood['emoji']
-            text = mood['text'] if mood['text'] else "[без комментария]"
-            timestamp = datetime.fromisoformat(mood['timestamp'].replace('Z', '+00:00'))
-            formatted_time = timestamp.strftime("%d.%m.%Y %H:%M")
-            
-            message += f"{i}. {emoji} {text}\n   {formatted_time}\n\n"
-        
-        # Добавляем кнопки для управления настроениями
-        keyboard = []
-        
-        # Кнопки для удаления настроений на текущей странице
-        for mood in moods[start_idx:end_idx]:
-            mood_id = mood['id']
-            emoji = mood['emoji']
-            timestamp = datetime.fromisoformat(mood['timestamp'].replace('Z', '+00:00'))
-            formatted_time = timestamp.strftime("%d.%m.%Y %H:%M")
-            
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"Удалить {emoji} от {formatted_time}",
-                    callback_data=f"delete_mood_{mood_id}"
-                )
-            ])
-        
-        # Кнопки навигации по страницам
-        nav_buttons = []
-        
-        if current_page > 1:
-            nav_buttons.append(InlineKeyboardButton("◀️ Назад", callback_data="profile_prev"))
-        
-        if current_page < total_pages:
-            nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data="profile_next"))
-            
-        if nav_buttons:
-            keyboard.append(nav_buttons)
-            
-        keyboard.append([InlineKeyboardButton("Назад в меню", callback_data="profile_back")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message, reply_markup = build_profile_page(page_moods, total_moods, current_page)
         
         update.message.reply_html(
             message,
             reply_markup=reply_markup
         )
         
+        # Запоминаем показанную страницу и заранее загружаем следующую
+        _profile_page_cache.put(user.id, (current_page, page_moods, total_moods))
+        if current_page * PROFILE_PAGE_SIZE < total_moods:
+            prefetch_profile_page(user.id, api_user_id, current_page + 1, context)
+        
         return MAIN_MENU
-    except Exception as e:
-        logger.error(f"Error in profile handler: {e}")
+    except Exception:
+        logger.exception("Error in profile handler")
         update.message.reply_text(
             "Произошла ошибка при загрузке профиля. Пожалуйста, попробуйте позже.",
             reply_markup=get_main_menu_keyboard()
         )
         return MAIN_MENU
 
+@serialized_per_user
 def profile_action(update: Update, context: CallbackContext) -> int:
     """Handle profile actions."""
     try:
         query = update.callback_query
+        answer_callback_query(query)
         user = query.from_user
         
         if query.data == "profile_back":
+            # Номер страницы больше не нужен до следующего открытия профиля
+            context.user_data.pop('profile_page', None)
+            
             # Удаляем сообщение с профилем и возвращаемся в главное меню
             query.edit_message_text(
                 text="Возврат в главное меню...",
@@ -998,37 +1634,38 @@ def profile_action(update: Update, context: CallbackContext) -> int:
                 reply_markup=get_main_menu_keyboard()
             )
             return MAIN_MENU
-        elif query.data == "profile_prev":
-            # Переход на предыдущую страницу
-            current_page = context.user_data.get('profile_page', 1)
-            context.user_data['profile_page'] = max(1, current_page - 1)
+        elif query.data.startswith(CB_PROFILE_PAGE):
+            # Переход на страницу, номер которой передан в кнопке навигации
+            context.user_data['profile_page'] = max(1, int(query.data[len(CB_PROFILE_PAGE):]))
             
             # Получаем обновленный профиль
             return show_profile_page(update, context)
-        elif query.data == "profile_next":
-            # Переход на следующую страницу
+        elif query.data in ("profile_prev", "profile_next"):
+            # Кнопки из сообщений, отправленных до перехода на номера страниц
             current_page = context.user_data.get('profile_page', 1)
-            context.user_data['profile_page'] = current_page + 1
-            
-            # Получаем обновленный профиль
+            context.user_data['profile_page'] = max(1, current_page + (1 if query.data == "profile_next" else -1))
             return show_profile_page(update, context)
         else:
             return MAIN_MENU
-    except Exception as e:
-        logger.error(f"Error in profile_action handler: {e}")
+    except Exception:
+        logger.exception("Error in profile_action handler")
         query.edit_message_text(
             text="Произошла ошибка при обработке действия профиля. Пожалуйста, попробуйте позже."
         )
         return MAIN_MENU
 
+@serialized_per_user
 def delete_mood_callback(update: Update, context: CallbackContext) -> int:
     """Handle deletion of a mood."""
     try:
         query = update.callback_query
-        query.answer()
+        answer_callback_query(query)
         
-        # Получаем ID настроения из callback data
-        mood_id = int(query.data.split('_')[2])
+        # Получаем ID настроения из callback data (старые кнопки содержат его в десятичном виде)
+        if query.data.startswith("delete_mood_"):
+            mood_id = int(query.data[len("delete_mood_"):])
+        else:
+            mood_id = int(query.data[len(CB_DELETE_MOOD):], 16)
         user = query.from_user
         
         # Удаляем настроение через API
@@ -1036,7 +1673,11 @@ def delete_mood_callback(update: Update, context: CallbackContext) -> int:
         
         if success:
             # Вместо простого сообщения об удалении, обновляем профиль
-            return show_profile_page(update, context)
+            # (по возможности без повторного запроса меток к API)
+            # Загруженная заранее следующая страница после удаления сдвинулась на одну метку
+            context.user_data.pop('_profile_prefetch', None)
+            page_data = remove_mood_from_cached_page(user.id, mood_id, context.user_data.get('profile_page', 1))
+            return show_profile_page(update, context, page_data)
         else:
             query.edit_message_text(
                 text="Не удалось удалить настроение. Пожалуйста, попробуйте позже.",
@@ -1046,8 +1687,8 @@ def delete_mood_callback(update: Update, context: CallbackContext) -> int:
             )
         
         return MAIN_MENU
-    except Exception as e:
-        logger.error(f"Error in delete_mood_callback handler: {e}")
+    except Exception:
+        logger.exception("Error in delete_mood_callback handler")
         query.edit_message_text(
             text="Произошла ошибка при удалении настроения.",
             reply_markup=InlineKeyboardMarkup([[
@@ -1056,484 +1697,377 @@ def delete_mood_callback(update: Update, context: CallbackContext) -> int:
         )
         return MAIN_MENU
 
+def format_area_mood_message(area_mood_data: Dict[str, Any], address: str, from_last_location: bool) -> str:
+    """
+    Формирование сообщения о настроении области.
+    
+    Аргументы:
+        area_mood_data: Данные о настроении области от API
+        address: Адрес точки (может быть пустым)
+        from_last_location: Запрос выполнен по последней метке
+    
+    Возвращает:
+        Текст сообщения в формате HTML
+    """
+    if not area_mood_data:
+        return "В этой области пока нет меток настроения."
+    
+    parts = ["🗺 <b>Настроение вокруг последней метки</b>" if from_last_location else "🗺 <b>Настроение вокруг вас</b>"]
+    if address:
+        parts.append(f" <b>рядом с</b> {address}")
+    parts.append(" <b>(радиус 5 км):</b>\n\n")
+    
+    # Используем правильные ключи из ответа API
+    if 'dominant_emoji' in area_mood_data:
+        parts.append(f"Преобладающее настроение: {area_mood_data['dominant_emoji']}\n")
+    
+    if 'moods_count' in area_mood_data:
+        parts.append(f"Всего меток настроения: {area_mood_data['moods_count']}\n")
+    
+    mood_counts = area_mood_data.get('mood_counts')
+    if mood_counts:
+        parts.append("\n<b>Распределение настроений:</b>\n")
+        # Общее число меток берем из ответа, а если его нет - считаем по распределению
+        total_moods = area_mood_data.get('moods_count') or sum(mood_counts.values())
+        for emoji, count in mood_counts.items():
+            percentage = count / total_moods * 100 if total_moods else 0.0
+            parts.append(f"{emoji}: {count} ({percentage:.1f}%)\n")
+    
+    if 'mood_percentage' in area_mood_data:
+        parts.append(f"\nПроцент положительных настроений: {area_mood_data['mood_percentage']}%\n")
+    
+    return "".join(parts)
+
+def _cancel_location_request(update: Update, context: CallbackContext) -> int:
+    """Отмена запроса настроения области или трендов и возврат в главное меню."""
+    update.message.reply_text(
+        MSG_OPERATION_CANCELLED,
+        reply_markup=get_main_menu_keyboard()
+    )
+    return MAIN_MENU
+
+def _send_area_mood(update: Update, context: CallbackContext) -> int:
+    """Отправка настроения области вокруг присланной геолокации или последней метки."""
+    user = update.effective_user
+    request_location = resolve_request_location(update, user.id)
+    if request_location is None:
+        update.message.reply_text(
+            MSG_NO_LAST_LOCATION,
+            reply_markup=get_location_keyboard(user.id)
+        )
+        return AREA_MOOD
+    latitude, longitude, from_last_location = request_location
+    
+    # Адрес не зависит от ответа API, поэтому определяется параллельно с запросом
+    address_future = geocode_executor.submit(get_address_from_coordinates, latitude, longitude)
+    
+    # Получаем настроение области через API
+    result = get_api_data_with_auth(
+        user.id,
+        api_client.get_area_mood,
+        context,
+        latitude=latitude,
+        longitude=longitude,
+        radius=5.0,  # По умолчанию радиус 5 км
+        hours=24  # За последние 24 часа
+    )
+    
+    if result.error:
+        update.message.reply_text(
+            f"Ошибка при получении настроения области: {result.error}",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return MAIN_MENU
+    area_mood_data = result.data
+    
+    address = address_future.result()
+    
+    update.message.reply_html(
+        format_area_mood_message(area_mood_data, address, from_last_location),
+        reply_markup=get_main_menu_keyboard()
+    )
+    return MAIN_MENU
+
+# Действия для кнопок в состоянии AREA_MOOD (геолокация обрабатывается отдельно)
+_AREA_MOOD_ACTIONS = {
+    BTN_LAST_LOCATION: _send_area_mood,
+    BTN_CANCEL: _cancel_location_request,
+}
+
+@serialized_per_user
 def area_mood(update: Update, context: CallbackContext) -> int:
     """Show mood in the area around the user."""
     try:
-        user = update.effective_user
-        
         if update.message.location:
-            latitude = update.message.location.latitude
-            longitude = update.message.location.longitude
-            
-            # Обновляем местоположение пользователя для отслеживания событий
-            UserRepository.update_mood_location_time(user.id, latitude, longitude)
-            
-            # Получаем настроение области через API
-            area_mood_data = get_api_data_with_auth(
-                user.id,
-                api_client.get_area_mood,
-                context,
-                latitude=latitude,
-                longitude=longitude,
-                radius=5.0,  # По умолчанию радиус 5 км
-                hours=24  # За последние 24 часа
-            )
-            
-            if isinstance(area_mood_data, dict) and 'error' in area_mood_data:
-                update.message.reply_text(
-                    f"Ошибка при получении настроения области: {area_mood_data['error']}",
-                    reply_markup=get_main_menu_keyboard()
-                )
-                return MAIN_MENU
-            
-            # Получаем адрес по координатам
-            address = get_address_from_coordinates(latitude, longitude)
-            
-            # Формируем сообщение о настроении области
-            if area_mood_data:
-                message = f"🗺 <b>Настроение вокруг вас</b>"
-                if address:
-                    message += f" <b>рядом с</b> {address}"
-                message += f" <b>(радиус 5 км):</b>\n\n"
-                
-                # Используем правильные ключи из ответа API
-                if 'dominant_emoji' in area_mood_data:
-                    message += f"Преобладающее настроение: {area_mood_data['dominant_emoji']}\n"
-                
-                if 'moods_count' in area_mood_data:
-                    message += f"Всего меток настроения: {area_mood_data['moods_count']}\n"
-                
-                if 'mood_counts' in area_mood_data:
-                    message += "\n<b>Распределение настроений:</b>\n"
-                    total_moods = area_mood_data['moods_count']
-                    for emoji, count in area_mood_data['mood_counts'].items():
-                        percentage = count / total_moods * 100
-                        message += f"{emoji}: {count} ({percentage:.1f}%)\n"
-                
-                if 'mood_percentage' in area_mood_data:
-                    message += f"\nПроцент положительных настроений: {area_mood_data['mood_percentage']}%\n"
-            else:
-                message = "В этой области пока нет меток настроения."
-            
-            update.message.reply_html(
-                message,
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-        elif update.message.text == "🔄 Последняя геолокация":
-            # Если пользователь выбрал использовать последнюю геолокацию
-            location = UserRepository.get_user_location(user.id)
-            
-            if not location:
-                update.message.reply_text(
-                    "Не удалось найти вашу последнюю геолокацию. Пожалуйста, отправьте геолокацию.",
-                    reply_markup=get_location_keyboard(user.id)
-                )
-                return AREA_MOOD
-                
-            latitude = location['latitude']
-            longitude = location['longitude']
-            
-            # Обновляем время последней метки, координаты оставляем те же
-            UserRepository.update_mood_location_time(user.id)
-            
-            # Получаем настроение области через API
-            area_mood_data = get_api_data_with_auth(
-                user.id,
-                api_client.get_area_mood,
-                context,
-                latitude=latitude,
-                longitude=longitude,
-                radius=5.0,  # По умолчанию радиус 5 км
-                hours=24  # За последние 24 часа
-            )
-            
-            if isinstance(area_mood_data, dict) and 'error' in area_mood_data:
-                update.message.reply_text(
-                    f"Ошибка при получении настроения области: {area_mood_data['error']}",
-                    reply_markup=get_main_menu_keyboard()
-                )
-                return MAIN_MENU
-            
-            # Получаем адрес по координатам
-            address = get_address_from_coordinates(latitude, longitude)
-            
-            # Формируем сообщение о настроении области
-            if area_mood_data:
-                message = f"🗺 <b>Настроение вокруг последней метки</b>"
-                if address:
-                    message += f" <b>рядом с</b> {address}"
-                message += f" <b>(радиус 5 км):</b>\n\n"
-                
-                # Используем правильные ключи из ответа API
-                if 'dominant_emoji' in area_mood_data:
-                    message += f"Преобладающее настроение: {area_mood_data['dominant_emoji']}\n"
-                
-                if 'moods_count' in area_mood_data:
-                    message += f"Всего меток настроения: {area_mood_data['moods_count']}\n"
-                
-                if 'mood_counts' in area_mood_data:
-                    message += "\n<b>Распределение настроений:</b>\n"
-                    total_moods = area_mood_data['moods_count']
-                    for emoji, count in area_mood_data['mood_counts'].items():
-                        percentage = count / total_moods * 100
-                        message += f"{emoji}: {count} ({percentage:.1f}%)\n"
-                
-                if 'mood_percentage' in area_mood_data:
-                    message += f"\nПроцент положительных настроений: {area_mood_data['mood_percentage']}%\n"
-            else:
-                message = "В этой области пока нет меток настроения."
-            
-            update.message.reply_html(
-                message,
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-        elif update.message.text == "❌ Отмена":
-            update.message.reply_text(
-                "Операция отменена.",
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-        else:
-            update.message.reply_text(
-                "Пожалуйста, отправьте своё местоположение, чтобы узнать преобладающее настроение в вашем районе.",
-                reply_markup=get_location_keyboard(user.id)
-            )
-            return AREA_MOOD
-    except Exception as e:
-        logger.error(f"Error in area_mood handler: {e}")
+            return _send_area_mood(update, context)
+        
+        action = _AREA_MOOD_ACTIONS.get(update.message.text)
+        if action is not None:
+            return action(update, context)
+        
+        update.message.reply_text(
+            "Пожалуйста, отправьте своё местоположение, чтобы узнать преобладающее настроение в вашем районе.",
+            reply_markup=get_location_keyboard(update.effective_user.id)
+        )
+        return AREA_MOOD
+    except Exception:
+        logger.exception("Error in area_mood handler")
         update.message.reply_text(
             "Произошла ошибка при анализе настроения области. Пожалуйста, попробуйте позже.",
             reply_markup=get_main_menu_keyboard()
         )
         return MAIN_MENU
 
+def format_emoji_counts(emoji_counts: Dict[str, int]) -> str:
+    """
+    Форматирование блока популярных настроений для сообщения о трендах.
+    
+    Аргументы:
+        emoji_counts: Словарь {эмодзи: количество меток}
+    
+    Возвращает:
+        Текст блока со списком эмодзи (от большего количества к меньшему) и общим числом меток
+    """
+    total_count = sum(emoji_counts.values())
+    lines = ["<b>Популярные настроения:</b>"]
+    if total_count > 0:
+        # Сортируем эмодзи по количеству (от большего к меньшему)
+        lines.extend(
+            f"{emoji}: {count} ({count / total_count * 100:.1f}%)"
+            for emoji, count in sorted(emoji_counts.items(), key=itemgetter(1), reverse=True)
+        )
+    lines.append("")
+    lines.append(f"Всего меток настроения: {total_count}")
+    return "\n".join(lines)
+
+def format_trends_message(trends_data: Dict[str, Any], address: str, from_last_location: bool) -> str:
+    """
+    Формирование сообщения о трендах настроения.
+    
+    Аргументы:
+        trends_data: Данные о трендах от API
+        address: Адрес точки (может быть пустым)
+        from_last_location: Запрос выполнен по последней метке
+    
+    Возвращает:
+        Текст сообщения в формате HTML
+    """
+    if not trends_data:
+        return "Недостаточно данных для анализа трендов настроения."
+    
+    parts = [
+        "📊 <b>Тренды настроений за последние 24 часа (последняя метка)</b>" if from_last_location
+        else "📊 <b>Тренды настроений за последние 24 часа</b>"
+    ]
+    if address:
+        parts.append(f" <b>рядом с</b> {address}")
+    parts.append(":\n\n")
+    
+    if 'trend_direction' in trends_data:
+        trend_direction = trends_data['trend_direction']
+        trend_text = "стабильное" if trend_direction == 'stable' else ("улучшается" if trend_direction == 'up' else "ухудшается")
+        parts.append(f"Общий тренд: настроение {trend_text}\n\n")
+    
+    if 'emoji_counts' in trends_data:
+        parts.append(format_emoji_counts(trends_data['emoji_counts']))
+    
+    # Добавляем информацию о временных периодах, если она есть
+    if 'time_periods' in trends_data and 'mood_percentages' in trends_data:
+        parts.append("\n\n<b>Изменение настроения по времени:</b>\n")
+        periods = trends_data['time_periods']
+        percentages = trends_data['mood_percentages']
+        
+        parts.extend(f"{period}: {percentage}%\n" for period, percentage in zip(periods, percentages))
+    
+    return "".join(parts)
+
+def _send_trends(update: Update, context: CallbackContext) -> int:
+    """Отправка трендов настроения вокруг присланной геолокации или последней метки."""
+    user = update.effective_user
+    request_location = resolve_request_location(update, user.id)
+    if request_location is None:
+        update.message.reply_text(
+            MSG_NO_LAST_LOCATION,
+            reply_markup=get_location_keyboard(user.id)
+        )
+        return TRENDS
+    latitude, longitude, from_last_location = request_location
+    
+    # Адрес не зависит от ответа API, поэтому определяется параллельно с запросом
+    address_future = geocode_executor.submit(get_address_from_coordinates, latitude, longitude)
+    
+    # Получаем тренды настроения через API
+    result = get_api_data_with_auth(
+        user.id,
+        api_client.get_trends,
+        context,
+        latitude=latitude,
+        longitude=longitude,
+        radius=5.0,  # По умолчанию радиус 5 км
+        hours=24  # За последние 24 часа
+    )
+    
+    if result.error:
+        update.message.reply_text(
+            f"Ошибка при получении трендов: {result.error}",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return MAIN_MENU
+    trends_data = result.data
+    
+    address = address_future.result()
+    
+    update.message.reply_html(
+        format_trends_message(trends_data, address, from_last_location),
+        reply_markup=get_main_menu_keyboard()
+    )
+    return MAIN_MENU
+
+# Действия для кнопок в состоянии TRENDS (геолокация обрабатывается отдельно)
+_TRENDS_ACTIONS = {
+    BTN_LAST_LOCATION: _send_trends,
+    BTN_CANCEL: _cancel_location_request,
+}
+
+@serialized_per_user
 def trends(update: Update, context: CallbackContext) -> int:
     """Show mood trends."""
     try:
-        user = update.effective_user
-        
         if update.message.location:
-            latitude = update.message.location.latitude
-            longitude = update.message.location.longitude
-            
-            # Обновляем местоположение пользователя для отслеживания событий
-            UserRepository.update_mood_location_time(user.id, latitude, longitude)
-            
-            # Получаем тренды настроения через API
-            trends_data = get_api_data_with_auth(
-                user.id,
-                api_client.get_trends,
-                context,
-                latitude=latitude,
-                longitude=longitude,
-                radius=5.0,  # По умолчанию радиус 5 км
-                hours=24  # За последние 24 часа
-            )
-            
-            if isinstance(trends_data, dict) and 'error' in trends_data:
-                update.message.reply_text(
-                    f"Ошибка при получении трендов: {trends_data['error']}",
-                    reply_markup=get_main_menu_keyboard()
-                )
-                return MAIN_MENU
-            
-            # Получаем адрес по координатам
-            address = get_address_from_coordinates(latitude, longitude)
-            
-            # Формируем сообщение о трендах
-            if trends_data:
-                message = f"📊 <b>Тренды настроений за последние 24 часа</b>"
-                if address:
-                    message += f" <b>рядом с</b> {address}"
-                message += ":\n\n"
-                
-                if 'trend_direction' in trends_data:
-                    trend_direction = trends_data['trend_direction']
-                    trend_text = "стабильное" if trend_direction == 'stable' else ("улучшается" if trend_direction == 'up' else "ухудшается")
-                    message += f"Общий тренд: настроение {trend_text}\n\n"
-                
-                if 'emoji_counts' in trends_data:
-                    message += "<b>Популярные настроения:</b>\n"
-                    total_count = sum(trends_data['emoji_counts'].values())
-                    
-                    # Сортируем эмодзи по количеству (от большего к меньшему)
-                    sorted_emojis = sorted(
-                        trends_data['emoji_counts'].items(),
-                        key=lambda x: x[1],
-                        reverse=True
-                    )
-                    
-                    for emoji, count in sorted_emojis:
-                        if total_count > 0:
-                            percentage = (count / total_count) * 100
-                            message += f"{emoji}: {count} ({percentage:.1f}%)\n"
-                    
-                    message += f"\nВсего меток настроения: {total_count}"
-                
-                # Добавляем информацию о временных периодах, если она есть
-                if 'time_periods' in trends_data and 'mood_percentages' in trends_data:
-                    message += "\n\n<b>Изменение настроения по времени:</b>\n"
-                    periods = trends_data['time_periods']
-                    percentages = trends_data['mood_percentages']
-                    
-                    for i in range(min(len(periods), len(percentages))):
-                        message += f"{periods[i]}: {percentages[i]}%\n"
-            else:
-                message = "Недостаточно данных для анализа трендов настроения."
-            
-            update.message.reply_html(
-                message,
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-        elif update.message.text == "🔄 Последняя геолокация":
-            # Если пользователь выбрал использовать последнюю геолокацию
-            location = UserRepository.get_user_location(user.id)
-            
-            if not location:
-                update.message.reply_text(
-                    "Не удалось найти вашу последнюю геолокацию. Пожалуйста, отправьте геолокацию.",
-                    reply_markup=get_location_keyboard(user.id)
-                )
-                return TRENDS
-                
-            latitude = location['latitude']
-            longitude = location['longitude']
-            
-            # Обновляем время последней метки, координаты оставляем те же
-            UserRepository.update_mood_location_time(user.id)
-            
-            # Получаем тренды настроения через API
-            trends_data = get_api_data_with_auth(
-                user.id,
-                api_client.get_trends,
-                context,
-                latitude=latitude,
-                longitude=longitude,
-                radius=5.0,  # По умолчанию радиус 5 км
-                hours=24  # За последние 24 часа
-            )
-            
-            if isinstance(trends_data, dict) and 'error' in trends_data:
-                update.message.reply_text(
-                    f"Ошибка при получении трендов: {trends_data['error']}",
-                    reply_markup=get_main_menu_keyboard()
-                )
-                return MAIN_MENU
-            
-            # Получаем адрес по координатам
-            address = get_address_from_coordinates(latitude, longitude)
-            
-            # Формируем сообщение о трендах
-            if trends_data:
-                message = f"📊 <b>Тренды настроений за последние 24 часа (последняя метка)</b>"
-                if address:
-                    message += f" <b>рядом с</b> {address}"
-                message += ":\n\n"
-                
-                if 'trend_direction' in trends_data:
-                    trend_direction = trends_data['trend_direction']
-                    trend_text = "стабильное" if trend_direction == 'stable' else ("улучшается" if trend_direction == 'up' else "ухудшается")
-                    message += f"Общий тренд: настроение {trend_text}\n\n"
-                
-                if 'emoji_counts' in trends_data:
-                    message += "<b>Популярные настроения:</b>\n"
-                    total_count = sum(trends_data['emoji_counts'].values())
-                    
-                    # Сортируем эмодзи по количеству (от большего к меньшему)
-                    sorted_emojis = sorted(
-                        trends_data['emoji_counts'].items(),
-                        key=lambda x: x[1],
-                        reverse=True
-                    )
-                    
-                    for emoji, count in sorted_emojis:
-                        if total_count > 0:
-                            percentage = (count / total_count) * 100
-                            message += f"{emoji}: {count} ({percentage:.1f}%)\n"
-                    
-                    message += f"\nВсего меток настроения: {total_count}"
-                
-                # Добавляем информацию о временных периодах, если она есть
-                if 'time_periods' in trends_data and 'mood_percentages' in trends_data:
-                    message += "\n\n<b>Изменение настроения по времени:</b>\n"
-                    periods = trends_data['time_periods']
-                    percentages = trends_data['mood_percentages']
-                    
-                    for i in range(min(len(periods), len(percentages))):
-                        message += f"{periods[i]}: {percentages[i]}%\n"
-            else:
-                message = "Недостаточно данных для анализа трендов настроения."
-            
-            update.message.reply_html(
-                message,
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-        elif update.message.text == "❌ Отмена":
-            update.message.reply_text(
-                "Операция отменена.",
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-        else:
-            update.message.reply_text(
-                "Пожалуйста, отправьте своё местоположение, чтобы узнать тренды настроений в вашем районе:",
-                reply_markup=get_location_keyboard(user.id)
-            )
-            return TRENDS
-    except Exception as e:
-        logger.error(f"Error in trends handler: {e}")
+            return _send_trends(update, context)
+        
+        action = _TRENDS_ACTIONS.get(update.message.text)
+        if action is not None:
+            return action(update, context)
+        
+        update.message.reply_text(
+            "Пожалуйста, отправьте своё местоположение, чтобы узнать тренды настроений в вашем районе:",
+            reply_markup=get_location_keyboard(update.effective_user.id)
+        )
+        return TRENDS
+    except Exception:
+        logger.exception("Error in trends handler")
         update.message.reply_text(
             "Произошла ошибка при анализе трендов настроения. Пожалуйста, попробуйте позже.",
             reply_markup=get_main_menu_keyboard()
         )
         return MAIN_MENU
 
+# Сколько самых значимых событий показывается в сообщении
+EVENTS_SHOWN = 5
+
+def format_events_message(events_data, address: str, from_last_location: bool) -> str:
+    """
+    Формирование сообщения о событиях.
+    
+    Аргументы:
+        events_data: Список событий от API
+        address: Адрес точки (может быть пустым)
+        from_last_location: Запрос выполнен по последней метке
+    
+    Возвращает:
+        Текст сообщения в формате HTML
+    """
+    # APIClient.get_events() всегда возвращает список, а ошибки отсекает APIResult
+    if not events_data:
+        return "За последние 24 часа не обнаружено значимых событий."
+    
+    parts = [
+        "🎭 <b>События за последние 24 часа (последняя метка)</b>" if from_last_location
+        else "🎭 <b>События за последние 24 часа</b>"
+    ]
+    if address:
+        parts.append(f" <b>рядом с</b> {address}")
+    parts.append(":\n\n")
+    
+    # Показываем только самые важные события, об остальных сообщаем их количеством
+    shown_events = events_data[:EVENTS_SHOWN]
+    hidden_count = len(events_data) - len(shown_events)
+    
+    for i, event in enumerate(shown_events, 1):
+        title = event.get('type', 'Неизвестное событие')
+        description = event.get('description', '')
+        if not description and 'keywords' in event:
+            description = f"Ключевые слова: {', '.join(event['keywords'])}"
+        confidence = event.get('confidence', 0)
+        emoji = event.get('dominant_emoji', '')
+        
+        parts.append(f"{i}. <b>{title}</b> {emoji}\n")
+        if description:
+            parts.append(f"{description}\n")
+        parts.append(f"Достоверность: {confidence}%\n\n")
+        
+    if hidden_count:
+        parts.append(f"...и еще {hidden_count} событий")
+    
+    return "".join(parts)
+
+def _send_events(update: Update, context: CallbackContext) -> int:
+    """Отправка событий вокруг присланной геолокации или последней метки."""
+    user = update.effective_user
+    # Просмотр событий по последней метке не продлевает ее срок действия
+    request_location = resolve_request_location(update, user.id, refresh_last_location=False)
+    if request_location is None:
+        update.message.reply_text(
+            MSG_NO_LAST_LOCATION,
+            reply_markup=get_location_keyboard(user.id)
+        )
+        return EVENTS
+    latitude, longitude, from_last_location = request_location
+    
+    # Адрес не зависит от ответа API, поэтому определяется параллельно с запросом
+    address_future = geocode_executor.submit(get_address_from_coordinates, latitude, longitude)
+    
+    # Получаем события через API
+    result = get_api_data_with_auth(
+        user.id,
+        api_client.get_events,
+        context,
+        latitude=latitude,
+        longitude=longitude,
+        radius=5.0,  # По умолчанию радиус 5 км
+        hours=24  # За последние 24 часа
+    )
+    
+    if result.error:
+        update.message.reply_text(
+            f"Ошибка при получении событий: {result.error}",
+            reply_markup=get_main_menu_keyboard()
+        )
+        return MAIN_MENU
+    
+    address = address_future.result()
+    
+    update.message.reply_html(
+        format_events_message(result.data, address, from_last_location),
+        reply_markup=get_main_menu_keyboard()
+    )
+    return MAIN_MENU
+
+# Действия для кнопок в состоянии EVENTS (геолокация обрабатывается отдельно)
+_EVENTS_ACTIONS = {
+    BTN_LAST_LOCATION: _send_events,
+    BTN_CANCEL: _cancel_location_request,
+}
+
+@serialized_per_user
 def events(update: Update, context: CallbackContext) -> int:
     """Show mood-based events."""
     try:
-        user = update.effective_user
-        
         if update.message.location:
-            latitude = update.message.location.latitude
-            longitude = update.message.location.longitude
-            
-            # Обновляем местоположение пользователя для отслеживания событий
-            UserRepository.update_mood_location_time(user.id, latitude, longitude)
-            
-            # Получаем события через API
-            events_data = get_api_data_with_auth(
-                user.id,
-                api_client.get_events,
-                context,
-                latitude=latitude,
-                longitude=longitude,
-                radius=5.0,  # По умолчанию радиус 5 км
-                hours=24  # За последние 24 часа
-            )
-            
-            if isinstance(events_data, dict) and 'error' in events_data:
-                update.message.reply_text(
-                    f"Ошибка при получении событий: {events_data['error']}",
-                    reply_markup=get_main_menu_keyboard()
-                )
-                return MAIN_MENU
-            
-            # Получаем адрес по координатам
-            address = get_address_from_coordinates(latitude, longitude)
-            
-            # Формируем сообщение о событиях
-            if events_data and isinstance(events_data, list) and len(events_data) > 0:
-                message = f"🎭 <b>События за последние 24 часа</b>"
-                if address:
-                    message += f" <b>рядом с</b> {address}"
-                message += ":\n\n"
-                
-                for i, event in enumerate(events_data[:5], 1):  # Показываем только 5 важнейших событий
-                    title = event.get('type', 'Неизвестное событие')
-                    description = event.get('description', '')
-                    if not description and 'keywords' in event:
-                        description = f"Ключевые слова: {', '.join(event['keywords'])}"
-                    confidence = event.get('confidence', 0)
-                    emoji = event.get('dominant_emoji', '')
-                    
-                    message += f"{i}. <b>{title}</b> {emoji}\n"
-                    if description:
-                        message += f"{description}\n"
-                    message += f"Достоверность: {confidence}%\n\n"
-                    
-                if len(events_data) > 5:
-                    message += f"...и еще {len(events_data) - 5} событий"
-            else:
-                message = "За последние 24 часа не обнаружено значимых событий."
-            
-            update.message.reply_html(
-                message,
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-        elif update.message.text == "🔄 Последняя геолокация":
-            # Если пользователь выбрал использовать последнюю геолокацию
-            location = UserRepository.get_user_location(user.id)
-            
-            if not location:
-                update.message.reply_text(
-                    "Не удалось найти вашу последнюю геолокацию. Пожалуйста, отправьте геолокацию.",
-                    reply_markup=get_location_keyboard(user.id)
-                )
-                return EVENTS
-                
-            latitude = location['latitude']
-            longitude = location['longitude']
-            
-            # Получаем события через API
-            events_data = get_api_data_with_auth(
-                user.id,
-                api_client.get_events,
-                context,
-                latitude=latitude,
-                longitude=longitude,
-                radius=5.0,  # По умолчанию радиус 5 км
-                hours=24  # За последние 24 часа
-            )
-            
-            if isinstance(events_data, dict) and 'error' in events_data:
-                update.message.reply_text(
-                    f"Ошибка при получении событий: {events_data['error']}",
-                    reply_markup=get_main_menu_keyboard()
-                )
-                return MAIN_MENU
-            
-            # Получаем адрес по координатам
-            address = get_address_from_coordinates(latitude, longitude)
-            
-            # Формируем сообщение о событиях
-            if events_data and isinstance(events_data, list) and len(events_data) > 0:
-                message = f"🎭 <b>События за последние 24 часа (последняя метка)</b>"
-                if address:
-                    message += f" <b>рядом с</b> {address}"
-                message += ":\n\n"
-                
-                for i, event in enumerate(events_data[:5], 1):  # Показываем только 5 важнейших событий
-                    title = event.get('type', 'Неизвестное событие')
-                    description = event.get('description', '')
-                    if not description and 'keywords' in event:
-                        description = f"Ключевые слова: {', '.join(event['keywords'])}"
-                    confidence = event.get('confidence', 0)
-                    emoji = event.get('dominant_emoji', '')
-                    
-                    message += f"{i}. <b>{title}</b> {emoji}\n"
-                    if description:
-                        message += f"{description}\n"
-                    message += f"Достоверность: {confidence}%\n\n"
-                    
-                if len(events_data) > 5:
-                    message += f"...и еще {len(events_data) - 5} событий"
-            else:
-                message = "За последние 24 часа не обнаружено значимых событий."
-            
-            update.message.reply_html(
-                message,
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-        elif update.message.text == "❌ Отмена":
-            update.message.reply_text(
-                "Операция отменена.",
-                reply_markup=get_main_menu_keyboard()
-            )
-            return MAIN_MENU
-        else:
-            update.message.reply_text(
-                "Пожалуйста, отправьте своё местоположение, чтобы узнать о событиях в вашем районе:",
-                reply_markup=get_location_keyboard(user.id)
-            )
-            return EVENTS
-    except Exception as e:
-        logger.error(f"Error in events handler: {e}")
+            return _send_events(update, context)
+        
+        action = _EVENTS_ACTIONS.get(update.message.text)
+        if action is not None:
+            return action(update, context)
+        
+        update.message.reply_text(
+            "Пожалуйста, отправьте своё местоположение, чтобы узнать о событиях в вашем районе:",
+            reply_markup=get_location_keyboard(update.effective_user.id)
+        )
+        return EVENTS
+    except Exception:
+        logger.exception("Error in events handler")
         update.message.reply_text(
             "Произошла ошибка при получении событий. Пожалуйста, попробуйте позже.",
             reply_markup=get_main_menu_keyboard()
@@ -1548,23 +2082,25 @@ def cancel(update: Update, context: CallbackContext) -> int:
             reply_markup=ReplyKeyboardRemove()
         )
         return ConversationHandler.END
-    except Exception as e:
-        logger.error(f"Error in cancel handler: {e}")
+    except Exception:
+        logger.exception("Error in cancel handler")
         update.message.reply_text(
             "Произошла ошибка при отмене действия. Пожалуйста, попробуйте позже или свяжитесь с администратором.",
             reply_markup=ReplyKeyboardRemove()
         )
         return ConversationHandler.END
 
+def please_wait(update: Update, context: CallbackContext) -> None:
+    """Answer messages sent while the previous conversation step is still running."""
+    # Обработчик вызывается в потоке диспетчера (run_async=False), чтобы не менять
+    # состояние диалога, поэтому сам ответ отправляется в пуле потоков
+    context.dispatcher.run_async(update.effective_message.reply_text, MSG_PLEASE_WAIT)
+
 def error_handler(update: Update, context: CallbackContext):
     """Log errors caused by updates."""
     try:
-        # Log the error
-        logger.error(f"Update {update} caused error {context.error}")
-        
-        # Log traceback info
-        import traceback
-        traceback.print_exc()
+        # Log the error with the traceback of the original exception
+        logger.error("Update %s caused error", update, exc_info=context.error)
         
         # Send message to the user if possible
         if update and update.effective_message:
@@ -1572,19 +2108,22 @@ def error_handler(update: Update, context: CallbackContext):
                 "Произошла ошибка при обработке запроса. Пожалуйста, попробуйте позже или свяжитесь с администратором.",
                 reply_markup=get_main_menu_keyboard()
             )
-    except Exception as e:
-        logger.error(f"Error in error handler: {e}")
+    except Exception:
+        logger.exception("Error in error handler")
 
-def show_profile_page(update: Update, context: CallbackContext) -> int:
-    """Show a specific page of user profile with moods."""
+def show_profile_page(update: Update, context: CallbackContext, page_data=None) -> int:
+    """
+    Show a specific page of user profile with moods.
+    
+    page_data - already known (moods, total, page) tuple; fetched from the API when omitted.
+    """
     try:
         query = update.callback_query
         user = query.from_user
-        api_user_id, _ = get_user_api_credentials(user.id)
+        api_user_id, _ = get_user_api_credentials(user.id, get_user_row(user.id, context))
         
         # Получаем текущую страницу из контекста
         current_page = context.user_data.get('profile_page', 1)
-        items_per_page = 5  # Количество меток на одной странице
         
         if not api_user_id:
             query.edit_message_text(
@@ -1592,84 +2131,28 @@ def show_profile_page(update: Update, context: CallbackContext) -> int:
             )
             return MAIN_MENU
         
-        # Получаем все настроения пользователя через API
-        moods = get_api_data_with_auth(
-            user.id, 
-            api_client.get_user_moods,
-            context,
-            user_id=api_user_id
-        )
-        
-        if isinstance(moods, dict) and 'error' in moods:
-            query.edit_message_text(
-                text=f"Ошибка при получении настроений: {moods['error']}"
-            )
-            return MAIN_MENU
+        # Получаем через API только метки текущей страницы и их общее количество
+        if page_data is None:
+            page_result = take_prefetched_profile_page(context, current_page) or \
+                fetch_profile_page(user.id, api_user_id, current_page, context)
+            if page_result.error:
+                query.edit_message_text(
+                    text=f"Ошибка при получении настроений: {page_result.error}"
+                )
+                return MAIN_MENU
+            page_data = page_result.data
         
-        if not moods:
+        page_moods, total_moods, current_page = page_data
+        if not total_moods:
             query.edit_message_text(
                 text="У вас пока нет меток настроения. Создайте первую метку в главном меню!"
             )
             return MAIN_MENU
         
-        # Рассчитываем общее количество страниц
-        total_pages = (len(moods) + items_per_page - 1) // items_per_page
-        
-        # Проверяем корректность текущей страницы
-        if current_page < 1:
-            current_page = 1
-        elif current_page > total_pages:
-            current_page = total_pages
-            
         # Сохраняем текущую страницу в контексте
         context.user_data['profile_page'] = current_page
         
-        # Вычисляем индексы для текущей страницы
-        start_idx = (current_page - 1) * items_per_page
-        end_idx = min(start_idx + items_per_page, len(moods))
-        
-        # Создаем сообщение с настроениями текущей страницы
-        message = f"📊 <b>Ваши метки настроения (страница {current_page}/{total_pages}):</b>\n\n"
-        
-        for i, mood in enumerate(moods[start_idx:end_idx], start_idx + 1):
-            emoji = mood['emoji']
-            text = mood['text'] if mood['text'] else "[без комментария]"
-            timestamp = datetime.fromisoformat(mood['timestamp'].replace('Z', '+00:00'))
-            formatted_time = timestamp.strftime("%d.%m.%Y %H:%M")
-            
-            message += f"{i}. {emoji} {text}\n   {formatted_time}\n\n"
-        
-        # Добавляем кнопки для управления настроениями
-        keyboard = []
-        
-        # Кнопки для удаления настроений на текущей странице
-        for mood in moods[start_idx:end_idx]:
-            mood_id = mood['id']
-            emoji = mood['emoji']
-            timestamp = datetime.fromisoformat(mood['timestamp'].replace('Z', '+00:00'))
-            formatted_time = timestamp.strftime("%d.%m.%Y %H:%M")
-            
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"Удалить {emoji} от {formatted_time}",
-                    callback_data=f"delete_mood_{mood_id}"
-                )
-            ])
-        
-        # Кнопки навигации по страницам
-        nav_buttons = []
-        
-        if current_page > 1:
-            nav_buttons.append(InlineKeyboardButton("◀️ Назад", callback_data="profile_prev"))
-        
-        if current_page < total_pages:
-            nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data="profile_next"))
-            
-        if nav_buttons:
-            keyboard.append(nav_buttons)
-            
-        keyboard.append([InlineKeyboardButton("Назад в меню", callback_data="profile_back")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message, reply_markup = build_profile_page(page_moods, total_moods, current_page)
         
         # Обновляем существующее сообщение
         query.edit_message_text(
@@ -1678,9 +2161,14 @@ def show_profile_page(update: Update, context: CallbackContext) -> int:
             parse_mode='HTML'
         )
         
+        # Запоминаем показанную страницу и заранее загружаем следующую
+        _profile_page_cache.put(user.id, (current_page, page_moods, total_moods))
+        if current_page * PROFILE_PAGE_SIZE < total_moods:
+            prefetch_profile_page(user.id, api_user_id, current_page + 1, context)
+        
         return MAIN_MENU
-    except Exception as e:
-        logger.error(f"Error in show_profile_page handler: {e}")
+    except Exception:
+        logger.exception("Error in show_profile_page handler")
         try:
             query.edit_message_text(
                 text="Произошла ошибка при загрузке профиля. Пожалуйста, попробуйте позже."
@@ -1689,17 +2177,105 @@ def show_profile_page(update: Update, context: CallbackContext) -> int:
             pass
         return MAIN_MENU
 
+# Ограничения Telegram на исходящие сообщения: около 30 сообщений в секунду на бота
+# и около 1 сообщения в секунду в один чат (короткие всплески допускаются)
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+TELEGRAM_CHAT_BURST = 3
+
+class TokenBucket:
+    """
+    Потокобезопасный ограничитель частоты по алгоритму token bucket.
+    """
+    def __init__(self, rate: float, capacity: float):
+        """
+        Аргументы:
+            rate: Скорость пополнения (токенов в секунду)
+            capacity: Максимальное число токенов (размер допустимого всплеска)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """Получение одного токена; при их отсутствии поток ждет пополнения."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class RateLimitedBot(ExtBot):
+    """
+    Бот, сглаживающий частоту отправки и редактирования сообщений.
+    
+    Запросы send*/edit* проходят через общий ограничитель и ограничитель чата,
+    поэтому всплеск ответов не упирается в ответ 429 от Telegram. Если Telegram
+    все же вернул RetryAfter, запрос повторяется один раз после указанной паузы.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        # Ограничители неактивных чатов вытесняются: за время жизни записи они все равно полностью пополняются
+        self._chat_buckets = TTLCache(60, 10000)
+        self._chat_buckets_lock = threading.Lock()
+    
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        """Получение ограничителя для чата (создается при первом обращении)."""
+        with self._chat_buckets_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+                self._chat_buckets.put(chat_id, bucket)
+            return bucket
+    
+    def _post(self, endpoint, data=None, *args, **kwargs):
+        if not endpoint.startswith(('send', 'edit')):
+            return super()._post(endpoint, data, *args, **kwargs)
+        
+        chat_id = data.get('chat_id') if data else None
+        if chat_id is not None:
+            self._chat_bucket(chat_id).acquire()
+        self._global_bucket.acquire()
+        try:
+            return super()._post(endpoint, data, *args, **kwargs)
+        except RetryAfter as e:
+            logger.warning("Telegram ограничил частоту запросов (%s), повтор через %s с", endpoint, e.retry_after)
+            time.sleep(e.retry_after)
+            return super()._post(endpoint, data, *args, **kwargs)
+
 def main():
     """
     Основная функция запуска бота.
     
     Эта функция создает экземпляр бота, настраивает обработчики команд и сообщений,
-    и запускает бота в режиме long polling (постоянного опроса сервера Telegram).
+    и запускает бота в режиме вебхука (если задан WEBHOOK_URL) или long polling
+    (постоянного опроса сервера Telegram).
     """
     try:
         # Создаем объект Updater и передаем ему токен бота
-        # Updater - это основной класс, который автоматически получает обновления от Telegram
-        updater = Updater(TOKEN)
+        # Updater - это основной класс, который автоматически получает обновления от Telegram.
+        # workers - число потоков для обработчиков; пул соединений с Telegram должен быть
+        # больше числа потоков (PTB дополнительно использует несколько соединений сам).
+        # run_async=True по умолчанию отдает обработчики в пул workers: иначе диспетчер
+        # выполняет их по одному в своем потоке, и запрос к API одного пользователя
+        # задерживает ответы всем остальным. Пока асинхронный обработчик шага диалога
+        # не завершился, ConversationHandler передает новые сообщения пользователя только
+        # обработчикам состояния WAITING (см. please_wait), а не обработчикам текущего шага
+        # Исходящие сообщения проходят через RateLimitedBot, чтобы не получать 429 при всплесках
+        bot = RateLimitedBot(
+            TOKEN,
+            request=Request(con_pool_size=32, read_timeout=10, connect_timeout=5),
+            defaults=Defaults(run_async=True)
+        )
+        updater = Updater(bot=bot, workers=16)
         
         # Получаем диспетчер для регистрации обработчиков
         # Диспетчер управляет обработчиками и вызывает их при получении соответствующих сообщений
@@ -1719,37 +2295,42 @@ def main():
                 MAIN_MENU: [MessageHandler(Filters.text, main_menu)],
                 MOOD_EMOJI: [MessageHandler(Filters.text, mood_emoji)],
                 MOOD_TEXT: [
-                    MessageHandler(Filters.text & ~Filters.regex('^(❌ Отмена|⏩ Пропустить)$'), mood_text),
-                    MessageHandler(Filters.regex('^⏩ Пропустить$'), skip_mood_text)
+                    MessageHandler(MOOD_TEXT_FILTER, mood_text),
+                    MessageHandler(SKIP_FILTER, skip_mood_text)
                 ],
                 MOOD_LOCATION: [
                     MessageHandler(Filters.location, mood_location),
-                    MessageHandler(Filters.regex('^🔄 Использовать последнюю геолокацию$'), mood_location),
-                    MessageHandler(Filters.regex('^❌ Отмена$'), cancel)
+                    MessageHandler(LAST_LOCATION_FILTER, mood_location),
+                    MessageHandler(CANCEL_FILTER, cancel)
                 ],
                 PROFILE: [MessageHandler(Filters.text, profile)],
                 VIEW_MOODS: [MessageHandler(Filters.text, profile)],
                 DELETE_MOOD: [MessageHandler(Filters.text, profile)],
                 AREA_MOOD: [
                     MessageHandler(Filters.location, area_mood),
-                    MessageHandler(Filters.regex('^🔄 Использовать последнюю геолокацию$'), area_mood),
-                    MessageHandler(Filters.regex('^❌ Отмена$'), area_mood),
+                    MessageHandler(LAST_LOCATION_FILTER, area_mood),
+                    MessageHandler(CANCEL_FILTER, area_mood),
                     MessageHandler(Filters.text, area_mood)
                 ],
                 AREA_RADIUS: [MessageHandler(Filters.text, area_mood)],
                 AREA_HOURS: [MessageHandler(Filters.text, area_mood)],
                 TRENDS: [
                     MessageHandler(Filters.location, trends),
-                    MessageHandler(Filters.regex('^🔄 Использовать последнюю геолокацию$'), trends),
-                    MessageHandler(Filters.regex('^❌ Отмена$'), trends),
+                    MessageHandler(LAST_LOCATION_FILTER, trends),
+                    MessageHandler(CANCEL_FILTER, trends),
                     MessageHandler(Filters.text, trends)
                 ],
                 EVENTS: [
                     MessageHandler(Filters.location, events),
-                    MessageHandler(Filters.regex('^🔄 Использовать последнюю геолокацию$'), events),
-                    MessageHandler(Filters.regex('^❌ Отмена$'), events),
+                    MessageHandler(LAST_LOCATION_FILTER, events),
+                    MessageHandler(CANCEL_FILTER, events),
                     MessageHandler(Filters.text, events)
-                ]
+                ],
+                # Сообщения, пришедшие, пока выполняется предыдущий шаг диалога (например,
+                # ждет ответа API). Без этого состояния они бы молча отбрасывались.
+                # Обработчик синхронный: асинхронный вернул бы Promise, и ConversationHandler
+                # сохранил бы его как новое состояние поверх еще не завершенного шага
+                ConversationHandler.WAITING: [MessageHandler(Filters.all, please_wait, run_async=False)]
             },
             # Точки выхода - обработчики, которые завершают диалог
             fallbacks=[CommandHandler('cancel', cancel)],
@@ -1761,24 +2342,48 @@ def main():
         dp.add_handler(conv_handler)
         
         # Добавляем обработчики для inline-кнопок (кнопок, встроенных в сообщения)
-        dp.add_handler(CallbackQueryHandler(delete_mood_callback, pattern='^delete_mood_'))
+        dp.add_handler(CallbackQueryHandler(delete_mood_callback, pattern=f'^({CB_DELETE_MOOD}[0-9a-f]+|delete_mood_\\d+)$'))
         dp.add_handler(CallbackQueryHandler(profile_action, pattern='^profile_'))
         
         # Регистрируем обработчик ошибок
         dp.add_error_handler(error_handler)
         
         # Запускаем бота
-        # start_polling() запускает бота в режиме long polling - 
-        # постоянного опроса серверов Telegram на наличие новых сообщений
-        updater.start_polling()
-        logger.info("Бот запущен и готов к работе")
+        if WEBHOOK_URL:
+            # start_webhook() поднимает встроенный веб-сервер и регистрирует вебхук в Telegram:
+            # обновления приходят сразу, без постоянных запросов getUpdates.
+            # Токен в пути не дает посторонним отправлять запросы на вебхук
+            updater.start_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=TOKEN,
+                webhook_url=f"{WEBHOOK_URL}/{TOKEN}",
+                allowed_updates=ALLOWED_UPDATES
+            )
+            logger.info("Бот запущен в режиме вебхука и готов к работе")
+        else:
+            # start_polling() запускает бота в режиме long polling - 
+            # постоянного опроса серверов Telegram на наличие новых сообщений
+            updater.start_polling(timeout=POLLING_TIMEOUT, allowed_updates=ALLOWED_UPDATES)
+            logger.info("Бот запущен и готов к работе")
         
         # Запускаем бота до нажатия Ctrl-C или получения сигнала остановки
         # idle() блокирует выполнение программы до получения сигнала остановки
         updater.idle()
         
-    except Exception as e:
-        logger.error(f"Ошибка в функции main: {e}")
+        # При остановке снимаем вебхук, чтобы бота можно было запустить и в режиме polling
+        if WEBHOOK_URL:
+            updater.bot.delete_webhook()
+        
+        # Закрываем пулы соединений с API и Nominatim и фоновые пулы потоков
+        api_client.close()
+        nominatim_session.close()
+        geocode_executor.shutdown(wait=False)
+        prefetch_executor.shutdown(wait=False)
+        db_executor.shutdown(wait=True)
+        
+    except Exception:
+        logger.exception("Ошибка в функции main")
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
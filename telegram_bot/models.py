@@ -1,10 +1,17 @@
 import os
 import logging
-from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime, func
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, ForeignKey, DateTime, Index, bindparam, cast, func, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, scoped_session
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
 
 # Настраиваем логгер
 logger = logging.getLogger(__name__)
@@ -12,14 +19,72 @@ logger = logging.getLogger(__name__)
 # Инициализируем базовый класс и движок SQLAlchemy
 Base = declarative_base()
 
-# Создаем движок базы данных
+# Создаем движок базы данных.
+# Соединения берутся из пула (QueuePool): обработчики бота и фоновые записи выполняются
+# в нескольких потоках (до 16 обработчиков и 8 потоков записи), поэтому пул рассчитан на них,
+# а не на размер по умолчанию (5 + 10). У переиспользуемых соединений sqlite3 сохраняется
+# кэш подготовленных выражений (cached_statements), а SQLAlchemy кэширует компиляцию запросов
 db_path = os.path.abspath("telegram_bot.db")
-engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+engine = create_engine(
+    f"sqlite:///{db_path}",
+    # timeout - сколько секунд ждать снятия блокировки записи, прежде чем вернуть
+    # "database is locked"
+    connect_args={"check_same_thread": False, "cached_statements": 256, "timeout": 30},
+    pool_size=16,
+    max_overflow=16
+)
 
-# Создаем фабрику сессий с областью видимости - потокобезопасную без явной многопоточности
-session_factory = sessionmaker(bind=engine)
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Настройка каждого нового соединения SQLite."""
+    cursor = dbapi_connection.cursor()
+    # SQLite проверяет внешние ключи только при явном включении: без этого запись
+    # о местоположении можно было бы создать для несуществующего пользователя
+    cursor.execute("PRAGMA foreign_keys=ON")
+    # WAL: читатели не блокируют писателя и наоборот; при WAL режим synchronous=NORMAL
+    # сохраняет целостность базы, а fsync выполняется при контрольной точке, а не на каждый commit
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    # Временные таблицы и индексы в памяти, файл читается через mmap (256 МиБ),
+    # кэш страниц соединения - 64 МБ (отрицательное значение задается в КиБ)
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.close()
+
+# Хешер паролей Argon2id с параметрами по рекомендации OWASP (46 МиБ памяти, 2 прохода,
+# 1 поток): память, нужная на каждую попытку подбора, делает перебор на GPU дорогим
+password_hasher = PasswordHasher(time_cost=2, memory_cost=46 * 1024, parallelism=1)
+
+# Создаем фабрику сессий с областью видимости - потокобезопасную без явной многопоточности.
+# expire_on_commit=False: session_scope фиксирует изменения и удаляет сессию при выходе из
+# блока, и без этого возвращенные из него объекты были бы отсоединенными с истекшими
+# атрибутами - любое обращение к ним вызывало бы DetachedInstanceError
+session_factory = sessionmaker(bind=engine, expire_on_commit=False)
 Session = scoped_session(session_factory)
 
+@contextmanager
+def session_scope():
+    """
+    Сессия для одной операции репозитория.
+    
+    При успешном выходе из блока изменения фиксируются, при исключении откатываются.
+    В конце сессия потока удаляется (Session.remove), а не только закрывается:
+    иначе объект сессии остается привязанным к потоку обработчика на все время работы бота.
+    
+    Возвращает:
+        Сессию SQLAlchemy
+    """
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        Session.remove()
+
 class User(Base):
     """
     Модель пользователя Telegram-бота.
@@ -37,6 +102,15 @@ class User(Base):
     password_hash = Column(String)
     created_at = Column(DateTime, default=func.current_timestamp())
     
+    __table_args__ = (
+        # Частичный индекс по пользователям с API ID для get_users_with_locations:
+        # содержит и telegram_id для соединения, поэтому таблица users не читается
+        Index(
+            'ix_users_api_user_id_nn', 'api_user_id', 'telegram_id',
+            sqlite_where=api_user_id.isnot(None)
+        ),
+    )
+    
     # Отношение один-к-одному с моделью UserLocation
     location = relationship("UserLocation", uselist=False, back_populates="user", cascade="all, delete-orphan")
     
@@ -47,12 +121,16 @@ class User(Base):
         Аргументы:
             password - пароль пользователя
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """
         Проверяет правильность пароля пользователя.
         
+        Хеши старого формата (pbkdf2 из werkzeug) и хеши Argon2 с устаревшими
+        параметрами после успешной проверки заменяются новым хешем; сохранить
+        изменение должен вызывающий код.
+        
         Аргументы:
             password - пароль для проверки
             
@@ -61,7 +139,21 @@ class User(Base):
         """
         if not self.password_hash:
             return False
-        return check_password_hash(self.password_hash, password)
+        
+        if not self.password_hash.startswith('$argon2'):
+            # Хеш, созданный werkzeug до перехода на Argon2
+            if not check_password_hash(self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+        
+        try:
+            password_hasher.verify(self.password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+        if password_hasher.check_needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
 
 class UserLocation(Base):
     """
@@ -74,21 +166,192 @@ class UserLocation(Base):
     telegram_id = Column(Integer, ForeignKey('users.telegram_id', ondelete='CASCADE'), unique=True, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
-    last_notification_time = Column(DateTime)
-    last_mood_location_time = Column(DateTime)  # Время последней метки настроения
+    # Время последнего уведомления и последней метки настроения - Unix-время в секундах:
+    # проверка актуальности метки сводится к сравнению целых чисел без разбора дат
+    last_notification_time = Column(Integer)
+    last_mood_location_time = Column(Integer)
     updated_at = Column(DateTime, default=func.current_timestamp(), onupdate=func.current_timestamp())
     
+    __table_args__ = (
+        # Покрывающий индекс: get_users_with_locations берет все нужные столбцы из индекса
+        Index(
+            'ix_user_locations_cover',
+            'telegram_id', 'latitude', 'longitude', 'last_notification_time'
+        ),
+    )
+    
     # Обратное отношение к модели User
     user = relationship("User", back_populates="location")
 
+# Столбцы, из которых репозиторий собирает словари пользователя и местоположения.
+# Запрос только столбцов возвращает строки без создания ORM-объектов и их отслеживания в сессии
+USER_COLUMNS = (
+    User.id, User.telegram_id, User.phone_number, User.username, User.first_name,
+    User.last_name, User.api_user_id, User.password_hash, User.created_at
+)
+USER_LOCATION_COLUMNS = (
+    UserLocation.id, UserLocation.telegram_id, UserLocation.latitude, UserLocation.longitude,
+    UserLocation.last_notification_time, UserLocation.last_mood_location_time, UserLocation.updated_at
+)
+
+# Поля пользователя, которые можно изменить через UserRepository.update_user
+# (пароль передается отдельно и сохраняется в виде хеша)
+USER_UPDATABLE_FIELDS = frozenset({'phone_number', 'username', 'first_name', 'last_name', 'api_user_id'})
+
+# Текущее Unix-время, вычисляемое SQLite при выполнении запроса (для столбцов времени
+# в user_locations): значение не создается в Python и не передается параметром
+EPOCH_NOW = cast(func.strftime('%s', 'now'), Integer)
+
+# Частые выборки по telegram_id, построенные один раз при импорте модуля.
+# При вызове передается только значение параметра :telegram_id, а выражение не
+# собирается заново - скомпилированный SQL берется из кэша SQLAlchemy
+_USER_BY_TELEGRAM_ID = select(User).where(User.telegram_id == bindparam('telegram_id'))
+_USER_ROW_BY_TELEGRAM_ID = select(*USER_COLUMNS).where(User.telegram_id == bindparam('telegram_id'))
+_LOCATION_ROW_BY_TELEGRAM_ID = select(*USER_LOCATION_COLUMNS).where(
+    UserLocation.telegram_id == bindparam('telegram_id')
+)
+_MOOD_LOCATION_TIME_BY_TELEGRAM_ID = select(UserLocation.last_mood_location_time).where(
+    UserLocation.telegram_id == bindparam('telegram_id')
+)
+
+class GeocodedAddress(Base):
+    """
+    Модель кэша адресов, полученных обратным геокодированием.
+    Хранит адрес для округленных координат, чтобы не запрашивать его повторно после перезапуска.
+    """
+    __tablename__ = 'geocode_cache'
+    
+    latitude = Column(Float, primary_key=True)
+    longitude = Column(Float, primary_key=True)
+    address = Column(String, nullable=False)
+    created_at = Column(DateTime, default=func.current_timestamp())
+
 # Создаем таблицы в базе данных, если они не существуют
 Base.metadata.create_all(engine)
 
+# create_all не добавляет индексы к уже существующим таблицам - создаем недостающие отдельно
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(engine, checkfirst=True)
+
+# Перевод меток времени, сохраненных ранее как DateTime (локальное время в виде строки),
+# в Unix-время. Модификатор 'utc' пересчитывает локальное время в UTC
+with engine.begin() as connection:
+    for column in ('last_notification_time', 'last_mood_location_time'):
+        connection.execute(text(
+            f"UPDATE user_locations SET {column} = CAST(strftime('%s', {column}, 'utc') AS INTEGER) "
+            f"WHERE typeof({column}) = 'text'"
+        ))
+
+class TTLCache:
+    """
+    Потокобезопасный кэш с ограниченным временем жизни и размером записей.
+    """
+    def __init__(self, ttl, maxsize):
+        """
+        Аргументы:
+            ttl - время жизни записи в секундах
+            maxsize - максимальное число записей
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}  # {ключ: (время истечения, значение)}
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        """
+        Получение значения из кэша.
+        
+        Аргументы:
+            key - ключ записи
+            default - значение, возвращаемое при отсутствии или устаревании записи
+            
+        Возвращает:
+            Сохраненное значение или default
+        """
+        with self._lock:
+            cached = self._data.get(key)
+            if cached is None:
+                return default
+            if cached[0] <= time.monotonic():
+                del self._data[key]
+                return default
+            return cached[1]
+    
+    def put(self, key, value):
+        """
+        Сохранение значения в кэше.
+        
+        Аргументы:
+            key - ключ записи
+            value - сохраняемое значение
+        """
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.maxsize:
+                # Сначала убираем устаревшие записи, затем при необходимости самую старую
+                for stale_key in [k for k, (expires_at, _) in self._data.items() if expires_at <= now]:
+                    del self._data[stale_key]
+                if len(self._data) >= self.maxsize:
+                    del self._data[next(iter(self._data))]
+            self._data[key] = (now + self.ttl, value)
+    
+    def pop(self, key):
+        """
+        Удаление записи из кэша.
+        
+        Аргументы:
+            key - ключ записи
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+# Признак отсутствия записи в кэше (None - допустимое сохраненное значение)
+_MISSING = object()
+
 class UserRepository:
     """
     Репозиторий для работы с пользователями в базе данных.
     Предоставляет методы для создания, обновления и получения информации о пользователях.
     """
+    # Общий для процесса кэш строк пользователей по telegram_id.
+    # Записи сбрасываются при любом изменении пользователя через репозиторий
+    USER_CACHE_TTL = 300
+    USER_CACHE_MAXSIZE = 50000
+    _user_cache = TTLCache(USER_CACHE_TTL, USER_CACHE_MAXSIZE)
+    
+    # Кэш времени последней метки настроения по telegram_id: проверка актуальности
+    # последней геолокации выполняется при каждом показе клавиатуры геолокации
+    MOOD_TIME_CACHE_TTL = 60
+    MOOD_TIME_CACHE_MAXSIZE = 10000
+    _mood_time_cache = TTLCache(MOOD_TIME_CACHE_TTL, MOOD_TIME_CACHE_MAXSIZE)
+    
+    # Кэш сохраненного местоположения по telegram_id (сбрасывается при каждой записи в UserLocation)
+    LOCATION_CACHE_TTL = 300
+    LOCATION_CACHE_MAXSIZE = 10000
+    _location_cache = TTLCache(LOCATION_CACHE_TTL, LOCATION_CACHE_MAXSIZE)
+    
+    @staticmethod
+    def invalidate_location(telegram_id):
+        """
+        Удаление данных о местоположении пользователя из кэшей.
+        
+        Аргументы:
+            telegram_id - ID пользователя в Telegram
+        """
+        UserRepository._location_cache.pop(telegram_id)
+        UserRepository._mood_time_cache.pop(telegram_id)
+    
+    @staticmethod
+    def invalidate_user(telegram_id):
+        """
+        Удаление строки пользователя из кэша.
+        
+        Аргументы:
+            telegram_id - ID пользователя в Telegram
+        """
+        UserRepository._user_cache.pop(telegram_id)
+    
     @staticmethod
     def create_user(telegram_id, phone_number=None, username=None, first_name=None, last_name=None, api_user_id=None, password=None):
         """
@@ -104,41 +367,45 @@ class UserRepository:
             password - пароль пользователя (необязательно)
             
         Возвращает:
-            Объект пользователя
+            Словарь с данными созданного или уже существующего пользователя,
+            либо None при ошибке
         """
-        session = Session()
         try:
-            # Проверяем, существует ли пользователь
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            
-            if user:
-                # Если пользователь существует, возвращаем его
-                return user
-            
-            # Создаем нового пользователя
-            user = User(
-                telegram_id=telegram_id,
-                phone_number=phone_number,
-                username=username,
-                first_name=first_name,
-                last_name=last_name,
-                api_user_id=api_user_id
-            )
-            
-            # Устанавливаем пароль, если он указан
-            if password:
-                user.set_password(password)
+            with session_scope() as session:
+                password_hash = None
+                if password:
+                    # Хеш Argon2 дорогой, поэтому вычисляем его, только если пользователя еще нет
+                    row = session.execute(_USER_ROW_BY_TELEGRAM_ID, {'telegram_id': telegram_id}).first()
+                    if row:
+                        return row._asdict()
+                    password_hash = password_hasher.hash(password)
+                
+                # Создаем пользователя, если его еще нет, одним запросом
+                # INSERT ... ON CONFLICT DO NOTHING RETURNING
+                row = session.execute(
+                    sqlite_insert(User).values(
+                        telegram_id=telegram_id,
+                        phone_number=phone_number,
+                        username=username,
+                        first_name=first_name,
+                        last_name=last_name,
+                        api_user_id=api_user_id,
+                        password_hash=password_hash
+                    ).on_conflict_do_nothing(index_elements=[User.telegram_id]).returning(*USER_COLUMNS)
+                ).first()
                 
-            session.add(user)
-            session.commit()
-            return user
+                if row is None:
+                    # Пользователь уже существует - возвращаем его
+                    row = session.execute(_USER_ROW_BY_TELEGRAM_ID, {'telegram_id': telegram_id}).first()
+                    return row._asdict()
+            
+            UserRepository.invalidate_user(telegram_id)
+            # Преобразуем строку в словарь (ключи совпадают с именами столбцов)
+            return row._asdict()
             
         except Exception as e:
-            session.rollback()
             logger.error(f"Error creating user: {e}")
             return None
-        finally:
-            session.close()
     
     @staticmethod
     def update_user(telegram_id, **kwargs):
@@ -148,35 +415,37 @@ class UserRepository:
         Аргументы:
             telegram_id - ID пользователя в Telegram
             **kwargs - пары ключ-значение с полями для обновления
+                (из USER_UPDATABLE_FIELDS и password; остальные игнорируются)
             
         Возвращает:
             True, если обновление выполнено успешно, иначе False
         """
-        session = Session()
+        values = {key: value for key, value in kwargs.items() if key in USER_UPDATABLE_FIELDS}
+        
+        # Обрабатываем специальный случай для пароля
+        if 'password' in kwargs:
+            values['password_hash'] = password_hasher.hash(kwargs['password'])
+        
+        if not values:
+            # Обновлять нечего - результат зависит только от наличия пользователя
+            return UserRepository.get_user_by_telegram_id(telegram_id) is not None
+        
         try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            with session_scope() as session:
+                # Одним запросом UPDATE, без загрузки объекта пользователя
+                result = session.execute(
+                    update(User).where(User.telegram_id == telegram_id).values(**values)
+                )
             
-            if not user:
+            if not result.rowcount:
                 return False
-                
-            # Обрабатываем специальный случай для пароля
-            if 'password' in kwargs:
-                user.set_password(kwargs.pop('password'))
-            
-            # Обновляем остальные атрибуты
-            for key, value in kwargs.items():
-                if hasattr(user, key):
-                    setattr(user, key, value)
-                    
-            session.commit()
+            
+            UserRepository.invalidate_user(telegram_id)
             return True
             
         except Exception as e:
-            session.rollback()
             logger.error(f"Error updating user: {e}")
             return False
-        finally:
-            session.close()
     
     @staticmethod
     def set_password(telegram_id, password):
@@ -190,23 +459,23 @@ class UserRepository:
         Возвращает:
             True, если обновление выполнено успешно, иначе False
         """
-        session = Session()
         try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            
-            if not user:
-                return False
+            with session_scope() as session:
+                user = session.execute(
+                    _USER_BY_TELEGRAM_ID, {'telegram_id': telegram_id}
+                ).scalar_one_or_none()
                 
-            user.set_password(password)
-            session.commit()
+                if not user:
+                    return False
+                    
+                user.set_password(password)
+            
+            UserRepository.invalidate_user(telegram_id)
             return True
             
         except Exception as e:
-            session.rollback()
             logger.error(f"Error setting password: {e}")
             return False
-        finally:
-            session.close()
     
     @staticmethod
     def check_password(telegram_id, password):
@@ -220,20 +489,29 @@ class UserRepository:
         Возвращает:
             True, если пароль верный, иначе False
         """
-        session = Session()
         try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            
-            if not user:
-                return False
+            with session_scope() as session:
+                user = session.execute(
+                    _USER_BY_TELEGRAM_ID, {'telegram_id': telegram_id}
+                ).scalar_one_or_none()
+                
+                if not user:
+                    return False
                 
-            return user.check_password(password)
+                old_hash = user.password_hash
+                if not user.check_password(password):
+                    return False
+                # Новый хеш (если пароль перехеширован в актуальном формате)
+                # сохраняется при выходе из блока
+                rehashed = user.password_hash != old_hash
+            
+            if rehashed:
+                UserRepository.invalidate_user(telegram_id)
+            return True
             
         except Exception as e:
             logger.error(f"Error checking password: {e}")
             return False
-        finally:
-            session.close()
     
     @staticmethod
     def get_user_by_telegram_id(telegram_id):
@@ -246,33 +524,26 @@ class UserRepository:
         Возвращает:
             Словарь с данными пользователя или None, если пользователь не найден
         """
-        session = Session()
+        cached = UserRepository._user_cache.get(telegram_id)
+        if cached is not None:
+            return dict(cached)
+        
         try:
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
+            with session_scope() as session:
+                row = session.execute(_USER_ROW_BY_TELEGRAM_ID, {'telegram_id': telegram_id}).first()
             
-            if not user:
+            if not row:
                 return None
                 
-            # Преобразуем объект пользователя в словарь
-            user_dict = {
-                'id': user.id,
-                'telegram_id': user.telegram_id,
-                'phone_number': user.phone_number,
-                'username': user.username,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'api_user_id': user.api_user_id,
-                'password_hash': user.password_hash,
-                'created_at': user.created_at
-            }
+            # Преобразуем строку в словарь (ключи совпадают с именами столбцов)
+            user_dict = row._asdict()
             
+            UserRepository._user_cache.put(telegram_id, dict(user_dict))
             return user_dict
             
         except Exception as e:
             logger.error(f"Error getting user: {e}")
             return None
-        finally:
-            session.close()
     
     @staticmethod
     def get_user_by_phone(phone_number):
@@ -285,33 +556,19 @@ class UserRepository:
         Возвращает:
             Словарь с данными пользователя или None, если пользователь не найден
         """
-        session = Session()
         try:
-            user = session.query(User).filter_by(phone_number=phone_number).first()
+            with session_scope() as session:
+                row = session.query(*USER_COLUMNS).filter_by(phone_number=phone_number).first()
             
-            if not user:
+            if not row:
                 return None
                 
-            # Преобразуем объект пользователя в словарь
-            user_dict = {
-                'id': user.id,
-                'telegram_id': user.telegram_id,
-                'phone_number': user.phone_number,
-                'username': user.username,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'api_user_id': user.api_user_id,
-                'password_hash': user.password_hash,
-                'created_at': user.created_at
-            }
-            
-            return user_dict
+            # Преобразуем строку в словарь (ключи совпадают с именами столбцов)
+            return row._asdict()
             
         except Exception as e:
             logger.error(f"Error getting user by phone: {e}")
             return None
-        finally:
-            session.close()
             
     @staticmethod
     def update_user_location(telegram_id, latitude, longitude):
@@ -326,40 +583,35 @@ class UserRepository:
         Возвращает:
             True, если операция выполнена успешно, иначе False
         """
-        session = Session()
+        # Создаем или обновляем запись одним запросом INSERT ... ON CONFLICT DO UPDATE.
+        # Существование пользователя проверяет внешний ключ
+        stmt = sqlite_insert(UserLocation).values(
+            telegram_id=telegram_id,
+            latitude=latitude,
+            longitude=longitude
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserLocation.telegram_id],
+            set_={
+                'latitude': stmt.excluded.latitude,
+                'longitude': stmt.excluded.longitude,
+                # onupdate столбца для ON CONFLICT не применяется, задаем явно
+                'updated_at': func.current_timestamp()
+            }
+        )
         try:
-            # Проверяем существование пользователя
-            user = session.query(User).filter_by(telegram_id=telegram_id).first()
-            if not user:
-                logger.error(f"User with telegram_id {telegram_id} not found")
-                return False
-                
-            # Проверяем существование записи о местоположении
-            location = session.query(UserLocation).filter_by(telegram_id=telegram_id).first()
-            
-            if location:
-                # Обновляем существующую запись
-                location.latitude = latitude
-                location.longitude = longitude
-                location.updated_at = func.current_timestamp()
-            else:
-                # Создаем новую запись
-                location = UserLocation(
-                    telegram_id=telegram_id,
-                    latitude=latitude,
-                    longitude=longitude
-                )
-                session.add(location)
-                
-            session.commit()
+            with session_scope() as session:
+                session.execute(stmt)
+            
+            UserRepository.invalidate_location(telegram_id)
             return True
             
+        except IntegrityError:
+            logger.error(f"User with telegram_id {telegram_id} not found")
+            return False
         except Exception as e:
-            session.rollback()
             logger.error(f"Error updating user location: {e}")
             return False
-        finally:
-            session.close()
             
     @staticmethod
     def update_mood_location_time(telegram_id, latitude=None, longitude=None):
@@ -374,42 +626,44 @@ class UserRepository:
         Возвращает:
             True, если обновление выполнено успешно, иначе False
         """
-        session = Session()
+        if latitude is None or longitude is None:
+            # Без координат можно только обновить время в существующей записи
+            stmt = (
+                update(UserLocation)
+                .where(UserLocation.telegram_id == telegram_id)
+                .values(last_mood_location_time=EPOCH_NOW)
+            )
+        else:
+            # С координатами создаем или обновляем запись одним запросом
+            stmt = sqlite_insert(UserLocation).values(
+                telegram_id=telegram_id,
+                latitude=latitude,
+                longitude=longitude,
+                last_mood_location_time=EPOCH_NOW
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[UserLocation.telegram_id],
+                set_={
+                    'latitude': stmt.excluded.latitude,
+                    'longitude': stmt.excluded.longitude,
+                    'last_mood_location_time': stmt.excluded.last_mood_location_time,
+                    'updated_at': func.current_timestamp()
+                }
+            )
+        
         try:
-            # Проверяем существование записи о местоположении
-            location = session.query(UserLocation).filter_by(telegram_id=telegram_id).first()
+            with session_scope() as session:
+                result = session.execute(stmt)
             
-            if not location:
-                # Если записи нет и не указаны координаты, не можем создать запись
-                if latitude is None or longitude is None:
-                    return False
-                    
-                # Создаем новую запись с указанными координатами
-                location = UserLocation(
-                    telegram_id=telegram_id,
-                    latitude=latitude,
-                    longitude=longitude,
-                    last_mood_location_time=datetime.now()
-                )
-                session.add(location)
-            else:
-                # Обновляем время последней метки настроения
-                location.last_mood_location_time = datetime.now()
-                
-                # Если указаны координаты, обновляем и их
-                if latitude is not None and longitude is not None:
-                    location.latitude = latitude
-                    location.longitude = longitude
-                    
-            session.commit()
+            if not result.rowcount:
+                return False
+            
+            UserRepository.invalidate_location(telegram_id)
             return True
             
         except Exception as e:
-            session.rollback()
             logger.error(f"Error updating mood location time: {e}")
             return False
-        finally:
-            session.close()
             
     @staticmethod
     def get_user_location(telegram_id):
@@ -422,31 +676,27 @@ class UserRepository:
         Возвращает:
             Словарь с данными о местоположении или None, если местоположение не найдено
         """
-        session = Session()
+        cached = UserRepository._location_cache.get(telegram_id, _MISSING)
+        if cached is not _MISSING:
+            return dict(cached) if cached is not None else None
+        
         try:
-            location = session.query(UserLocation).filter_by(telegram_id=telegram_id).first()
+            with session_scope() as session:
+                row = session.execute(_LOCATION_ROW_BY_TELEGRAM_ID, {'telegram_id': telegram_id}).first()
             
-            if not location:
+            if not row:
+                UserRepository._location_cache.put(telegram_id, None)
                 return None
                 
-            # Преобразуем объект местоположения в словарь
-            location_dict = {
-                'id': location.id,
-                'telegram_id': location.telegram_id,
-                'latitude': location.latitude,
-                'longitude': location.longitude,
-                'last_notification_time': location.last_notification_time,
-                'last_mood_location_time': location.last_mood_location_time,
-                'updated_at': location.updated_at
-            }
+            # Преобразуем строку в словарь (ключи совпадают с именами столбцов)
+            location_dict = row._asdict()
             
+            UserRepository._location_cache.put(telegram_id, dict(location_dict))
             return location_dict
             
         except Exception as e:
             logger.error(f"Error getting user location: {e}")
             return None
-        finally:
-            session.close()
             
     @staticmethod
     def update_notification_time(telegram_id):
@@ -459,23 +709,24 @@ class UserRepository:
         Возвращает:
             True, если обновление выполнено успешно, иначе False
         """
-        session = Session()
         try:
-            location = session.query(UserLocation).filter_by(telegram_id=telegram_id).first()
+            with session_scope() as session:
+                # Одним запросом UPDATE, без предварительного SELECT
+                result = session.execute(
+                    update(UserLocation)
+                    .where(UserLocation.telegram_id == telegram_id)
+                    .values(last_notification_time=EPOCH_NOW)
+                )
             
-            if not location:
+            if not result.rowcount:
                 return False
                 
-            location.last_notification_time = datetime.now()
-            session.commit()
+            UserRepository._location_cache.pop(telegram_id)
             return True
             
         except Exception as e:
-            session.rollback()
             logger.error(f"Error updating notification time: {e}")
             return False
-        finally:
-            session.close()
             
     @staticmethod
     def get_users_with_locations():
@@ -485,42 +736,26 @@ class UserRepository:
         Возвращает:
             Список словарей с данными пользователей и их местоположениями
         """
-        session = Session()
         try:
-            # Объединяем таблицы User и UserLocation
-            query = session.query(
-                User.telegram_id,
-                User.api_user_id,
-                UserLocation.latitude,
-                UserLocation.longitude,
-                UserLocation.last_notification_time
-            ).join(UserLocation, User.telegram_id == UserLocation.telegram_id)
-            
-            # Фильтруем только пользователей с API ID
-            query = query.filter(User.api_user_id != None)
-            
-            # Выполняем запрос и получаем результаты
-            results = query.all()
-            
-            # Преобразуем результаты в список словарей
-            users_with_locations = []
-            for row in results:
-                user_data = {
-                    'telegram_id': row[0],
-                    'api_user_id': row[1],
-                    'latitude': row[2],
-                    'longitude': row[3],
-                    'last_notification_time': row[4]
-                }
-                users_with_locations.append(user_data)
+            with session_scope() as session:
+                # Объединяем таблицы User и UserLocation
+                query = session.query(
+                    User.telegram_id,
+                    User.api_user_id,
+                    UserLocation.latitude,
+                    UserLocation.longitude,
+                    UserLocation.last_notification_time
+                ).join(UserLocation, User.telegram_id == UserLocation.telegram_id)
+                
+                # Фильтруем только пользователей с API ID
+                query = query.filter(User.api_user_id.isnot(None))
                 
-            return users_with_locations
+                # Выполняем запрос и преобразуем строки в словари (ключи совпадают с именами столбцов)
+                return [row._asdict() for row in query]
             
         except Exception as e:
             logger.error(f"Error getting users with locations: {e}")
             return []
-        finally:
-            session.close()
             
     @staticmethod
     def is_last_location_valid(telegram_id, max_minutes=5):
@@ -534,19 +769,88 @@ class UserRepository:
         Возвращает:
             True, если последняя метка актуальна (в пределах указанного времени), иначе False
         """
-        session = Session()
         try:
-            location = session.query(UserLocation).filter_by(telegram_id=telegram_id).first()
-            
-            if not location or not location.last_mood_location_time:
+            # Кэшируется само время последней метки, а не результат проверки,
+            # поэтому метка перестает быть актуальной вовремя и при наличии записи в кэше
+            last_mood_location_time = UserRepository._mood_time_cache.get(telegram_id, _MISSING)
+            if last_mood_location_time is _MISSING:
+                # Строка местоположения в кэше уже содержит время метки
+                cached = UserRepository._location_cache.get(telegram_id, _MISSING)
+                if cached is not _MISSING:
+                    last_mood_location_time = cached['last_mood_location_time'] if cached else None
+            if last_mood_location_time is _MISSING:
+                with session_scope() as session:
+                    last_mood_location_time = session.execute(
+                        _MOOD_LOCATION_TIME_BY_TELEGRAM_ID, {'telegram_id': telegram_id}
+                    ).scalar()
+                UserRepository._mood_time_cache.put(telegram_id, last_mood_location_time)
+            
+            if not last_mood_location_time:
                 return False
                 
             # Проверяем, прошло ли не более max_minutes с момента последней метки
-            time_diff = datetime.now() - location.last_mood_location_time
-            return time_diff.total_seconds() <= max_minutes * 60
+            return time.time() - last_mood_location_time <= max_minutes * 60
             
         except Exception as e:
             logger.error(f"Error checking last location validity: {e}")
             return False
-        finally:
-            session.close() 
\ No newline at end of file
+
+class GeocodeRepository:
+    """
+    Репозиторий для работы с кэшем адресов в базе данных.
+    """
+    @staticmethod
+    def get_address(latitude, longitude, max_age_days=30):
+        """
+        Получение сохраненного адреса для координат.
+        
+        Аргументы:
+            latitude - широта (округленная)
+            longitude - долгота (округленная)
+            max_age_days - максимальный возраст записи в днях
+            
+        Возвращает:
+            Строку с адресом или None, если адреса нет или он устарел
+        """
+        try:
+            with session_scope() as session:
+                row = session.query(GeocodedAddress.address, GeocodedAddress.created_at).filter_by(
+                    latitude=latitude, longitude=longitude
+                ).first()
+            
+            if not row or (row.created_at and datetime.now() - row.created_at > timedelta(days=max_age_days)):
+                return None
+                
+            return row.address
+            
+        except Exception as e:
+            logger.error(f"Error getting geocoded address: {e}")
+            return None
+    
+    @staticmethod
+    def save_address(latitude, longitude, address):
+        """
+        Сохранение адреса для координат (с заменой существующей записи).
+        
+        Аргументы:
+            latitude - широта (округленная)
+            longitude - долгота (округленная)
+            address - адрес
+            
+        Возвращает:
+            True, если операция выполнена успешно, иначе False
+        """
+        try:
+            with session_scope() as session:
+                session.merge(GeocodedAddress(
+                    latitude=latitude,
+                    longitude=longitude,
+                    address=address,
+                    created_at=datetime.now()
+                ))
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error saving geocoded address: {e}")
+            return False
+